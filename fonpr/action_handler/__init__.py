@@ -5,3 +5,9 @@ changes to value.yaml files.
 """
 
 from .action_handler import ActionHandler, get_token
+from .action_spec import ActionSpec, ACTION_SPECS, register_action_spec
+from .actuation_queue import ActuationQueue
+from .backends import GitHubBackend, LocalGitBackend, PushConflictError, ShadowBackend
+from .rate_limiter import RateLimitScheduler
+from .k8s_actuator import KubernetesActuator
+from .stabilizer import ActionStabilizer, parse_quantity
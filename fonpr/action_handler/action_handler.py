@@ -10,7 +10,13 @@ import copy
 import boto3
 import json
 import logging
+import random
+import time
+from contextlib import contextmanager
 from botocore.exceptions import ClientError
+from .yaml_patch import compose_yaml, patch_yaml_text, set_path
+from .action_spec import ACTION_SPECS
+from .backends import GitHubBackend, LocalGitBackend, PushConflictError, ShadowBackend
 
 
 class ActionHandler:
@@ -38,6 +44,18 @@ class ActionHandler:
                     'requests' : {'memory' : 1, 'cpu' : 1},
                     'limits' : {'memory' : 1,'cpu' : 1},
                 }
+        backend : GitHubBackend, LocalGitBackend or ShadowBackend
+            repository backend used to fetch and commit value files
+        timings : dict
+            time in seconds spent in each phase of the last update cycle
+            ('fetch', 'patch', 'serialize' and 'push')
+        max_push_retries : int
+            number of times an update cycle is retried after its push was
+            rejected because the value file changed since it was fetched
+        retry_backoff : float
+            base of the randomized exponential backoff between retries, in seconds
+        request_timeout : float
+            time in seconds after which a GitHub API request is abandoned
     Methods
     -------
         set_token(token:str):
@@ -72,10 +90,14 @@ class ActionHandler:
         get_value_file_contents():
             Connect to target repository, set repo object as attribute,
             and fetch the specified file as a dictionary. Retain file hash as
-            attribute for future push operations.
+            attribute for future push operations. Repeated fetches revalidate
+            the cached file with a conditional request.
 
             establish_github_connection must be called prior to use.
 
+        invalidate_cache():
+            Drop the cached value file so the next fetch downloads it in full.
+
         generate__updated_value_file_lim_req(current_values:dict):
             Update dictionary values with requested actions,
             and return in YAML file format.
@@ -84,24 +106,52 @@ class ActionHandler:
             Update dictionary values with requested actions,
             and return in YAML file format.
 
+        generate_updated_value_file(current_values:dict, action_type:str):
+            Update dictionary values with requested actions for any action type
+            registered in action_spec.ACTION_SPECS, and return in YAML file format.
+
         push_to_repository(updated_file:yaml.YAMLObject, message='auto-update'):
             Using connection to target repository, push the supplied updated file
             back out to GitHub,
 
             get_value_file_contents must be called prior to use.
 
+        get_value_files_contents(paths:list):
+            Fetch several value files from a single commit at the head of the
+            target branch. Retain the commit as the base for a batched push.
+
+        push_files_to_repository(updated_files:dict, message='auto-update'):
+            Push several updated files back out to the repository as a single
+            commit (through the Git Data API for GitHub: blobs, tree, commit, ref update).
+
+            get_value_files_contents must be called prior to use.
+
+        fetch_update_push(action_type='lim_req', message='auto-update'):
+            Execute complete file update process for any registered action type with a single command.
+            Pushes rejected because the file changed since the fetch are retried on fresh contents.
+
         fetch_update_push_lim_req():
             Execute complete file update process for limits and requests with a single command.
 
         fetch_update_push_upf_sizing():
             Execute complete file update process for upf sizing with a single command.
+
+        fetch_update_push_batch(batched_actions:list, message='auto-update'):
+            Execute complete update process for several targets across one or
+            more value files, producing a single commit.
     """
 
     def __init__(self, 
         repo_token="", 
         value_file_url="", 
         dir_name="", 
-        requested_actions={}
+        requested_actions={},
+        backend=None,
+        shadow_journal=None,
+        simulated_push_latency=0.0,
+        max_push_retries=3,
+        retry_backoff=0.5,
+        request_timeout=15,
     ):
         """
         Contstructor for the action-handler helper.
@@ -114,6 +164,8 @@ class ActionHandler:
             value_file_url : str
                 url to target value.yaml file
                 (e.g. 'https://github.com/DISHDevEx/openverso-charts/blob/matt/gh_api_test/charts/respons/5gSA_no_ues_values.yaml')
+                a 'file://' url targets a git repository on disk through LocalGitBackend
+                (e.g. 'file:///srv/git/openverso-charts.git/blob/main/charts/respons/5gSA_no_ues_values.yaml')
             dir_name : str
                 root directory within the repo (e.g. 'charts')
             requested_actions : dict
@@ -124,11 +176,45 @@ class ActionHandler:
                         'requests' : {'memory' : 1, 'cpu' : 1},
                         'limits' : {'memory' : 1,'cpu' : 1},
                     })
+            backend : GitHubBackend or LocalGitBackend
+                repository backend used to fetch and commit value files
+                (defaults to one chosen from value_file_url)
+            shadow_journal : str
+                path of a local JSON lines journal; when given, value files are
+                still fetched from the repository but updates are diffed and
+                journaled there instead of being pushed (shadow mode)
+            simulated_push_latency : float
+                time in seconds each shadow push sleeps for, standing in for a
+                real push when timing agent cycles in shadow mode
+            max_push_retries : int
+                number of times an update cycle is retried (refetch, re-patch,
+                push) after its push was rejected because the value file
+                changed since it was fetched
+            retry_backoff : float
+                base of the randomized exponential backoff between retries, in seconds
+            request_timeout : float
+                time in seconds after which a GitHub API request is abandoned,
+                so that a slow API cannot hang an agent cycle
         """
 
         self.repo_token = repo_token
+        self.value_file_url = value_file_url
         self.response_sha = ""
-        self.repo = ""
+        self.base = None
+        self.base_files = {}
+
+        # Cache of the last fetched value file, revalidated by the backend.
+        self.cached_sha = ""
+        self.cached_text = None
+        self.cached_values = None
+        self.cached_node = None
+
+        # Phase timings of the current cycle, shared with a shadow backend.
+        self.timings = {}
+
+        self.max_push_retries = max_push_retries
+        self.retry_backoff = retry_backoff
+        self.request_timeout = request_timeout
 
         if value_file_url != "":
             try:
@@ -156,6 +242,18 @@ class ActionHandler:
 
         self.session = self.establish_github_connection()
 
+        if backend is not None:
+            self.backend = backend
+        elif value_file_url.startswith("file://"):
+            self.backend = LocalGitBackend("/" + self.repo_name)
+        else:
+            self.backend = GitHubBackend(self.session, self.repo_name)
+
+        if shadow_journal is not None:
+            self.backend = ShadowBackend(
+                self.backend, shadow_journal, simulated_push_latency, self.timings
+            )
+
     def set_token(self, token: str) -> None:
         # TODO: This method needs to be updated with prod credential handling
         self.repo_token = token
@@ -165,6 +263,10 @@ class ActionHandler:
 
     def set_repo_name(self, repo_name: str) -> None:
         self.repo_name = repo_name
+        # A shadow backend reads through the backend it wraps.
+        backend = getattr(self.backend, "backend", self.backend)
+        if isinstance(backend, GitHubBackend):
+            backend.repo_name = repo_name
 
     def get_branch_name(self) -> str:
         return self.branch_name
@@ -190,6 +292,17 @@ class ActionHandler:
     def set_requested_actions(self, requested_actions: dict) -> None:
         self.requested_actions = requested_actions
 
+    @contextmanager
+    def _timed(self, phase: str):
+        """
+        Add the time spent in the body of the with statement to timings[phase].
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
     def establish_github_connection(self) -> github.MainClass.Github:
         """
         Instantiate access to Github API v3 wih token.
@@ -202,7 +315,7 @@ class ActionHandler:
         -------
             None
         """
-        return Github(self.repo_token)
+        return Github(self.repo_token, timeout=self.request_timeout)
 
     def list_repos(self) -> [str]:
         """
@@ -236,6 +349,13 @@ class ActionHandler:
         and fetch the specified file as a dictionary. Retain file hash as
         attribute for future push operations.
 
+        The fetched file, its blob hash and its parsed contents are cached on
+        the instance. Subsequent calls only ask the backend whether the blob
+        changed: GitHubBackend sends a conditional request carrying the cached
+        ETag, and a 304 response (which GitHub does not count against the
+        rate limit) reuses the cached contents. A blob hash matching the cache
+        (e.g. after our own push) also skips parsing.
+
         establish_github_connection must be called prior to use.
 
         Parameters
@@ -246,32 +366,65 @@ class ActionHandler:
         -------
             contents : dict
                 Dictionary representation of existing target YAML file contents.
+                The dictionary is shared with the cache and must not be
+                modified in place.
         """
         try:
             logging.info(
                 f"Attempting fetch of contents from {self.value_file_dir}/{self.value_file_name}:"
             )
-            # Fetch contents
-            self.repo = self.session.get_repo(self.repo_name)
-            response = self.repo.get_contents(
-                f"{self.value_file_dir}/{self.value_file_name}", ref=self.branch_name
-            )
+            # A fetch starts a new update cycle.
+            self.timings.clear()
+            with self._timed("fetch"):
+                # Fetch contents
+                text, blob_sha = self.backend.fetch_file(
+                    f"{self.value_file_dir}/{self.value_file_name}",
+                    self.branch_name,
+                    self.cached_sha,
+                )
+
+                if text is None:
+                    logging.info("File unchanged since last fetch; using cached contents.")
+                else:
+                    self.cached_text = text
+                    self.cached_values = None
+                    self.cached_sha = blob_sha
+
+                if self.cached_values is None:
+                    self.cached_values, self.cached_node = compose_yaml(self.cached_text)
 
             # Collect and retain file hash for push operation
-            self.response_sha = response.sha
+            self.response_sha = self.cached_sha
             logging.info("Fetch successful.")
-            contents = yaml.safe_load(response.decoded_content)
-            return contents
+            return self.cached_values
 
         except Exception as excp:
             logging.error(f"Failed to fetch file with the following exception: {excp}")
             raise excp
 
+    def invalidate_cache(self) -> None:
+        """
+        Drop the cached value file so the next fetch downloads it in full.
+
+        Parameters
+        ---------
+            None
+
+        Returns
+        -------
+            None
+        """
+        self.cached_sha = ""
+        self.cached_text = None
+        self.cached_values = None
+        self.cached_node = None
+
     def generate__updated_value_file_lim_req(
         self, current_values: dict
     ) -> yaml.YAMLObject:
         """
         Update dictionary values with requested actions for limits and requests, and return in YAML file format.
+        See generate_updated_value_file.
 
         Parameters
         ---------
@@ -283,57 +436,60 @@ class ActionHandler:
             updated_yaml : YAML Object
                 Target file containing updated values, output in YAML format.
         """
-        try:
-            # TODO: Automate key-value population based on requested_actions dict
-            logging.info("Updating YAML values:")
-            new_values = copy.deepcopy(current_values)
-            new_values[self.requested_actions["target_pod"]]["resources"] = {
-                "requests": self.requested_actions["requests"],
-                "limits": self.requested_actions["limits"],
-            }
-            logging.info("Update complete.")
-            updated_yaml = yaml.dump(new_values)
-            return updated_yaml
-
-        except Exception as excp:
-            logging.error(
-                f"Failed to update target values with the following exception: {excp}"
-            )
-            raise excp
+        return self.generate_updated_value_file(current_values, "lim_req")
 
     def generate_updated_value_file_upf_sizing(
         self, current_values: dict
     ) -> yaml.YAMLObject:
         """
         Update dictionary values with requested actions for upf sizing, and return in YAML file format.
+        See generate_updated_value_file.
 
         Parameters
         ---------
             current_values : dict
                 The dictionary representation of the target file fetched from GitHub
 
+        Returns
+        -------
+            updated_yaml : YAML Object
+                Target file containing updated values, output in YAML format.
+        """
+        return self.generate_updated_value_file(current_values, "upf_sizing")
+
+    def generate_updated_value_file(
+        self, current_values: dict, action_type: str
+    ) -> yaml.YAMLObject:
+        """
+        Update dictionary values with requested actions for any registered action
+        type, and return in YAML file format. The paths updated for each action
+        type are declared in action_spec.ACTION_SPECS, and are checked against
+        current_values before any change is made.
+
+        When current_values is the document last fetched by get_value_file_contents,
+        only the target nodes of the fetched text are rewritten, preserving the
+        rest of the file (key order, formatting and comments) byte for byte.
+
+        Parameters
+        ---------
+            current_values : dict
+                The dictionary representation of the target file fetched from GitHub
+            action_type : str
+                Name of the action type to apply (e.g. 'lim_req', 'upf_sizing', 'replicas')
+
         Returns
         -------
             updated_yaml : YAML Object
                 Target file containing updated values, output in YAML format.
         """
         try:
-            # TODO: Automate key-value population based on requested_actions dict
             logging.info("Updating YAML values:")
-            new_values = copy.deepcopy(current_values)
-            new_values[self.requested_actions["target_pod"]]["affinity"][
-                "nodeAffinity"
-            ]["requiredDuringSchedulingIgnoredDuringExecution"]["nodeSelectorTerms"][0][
-                "matchExpressions"
-            ][
-                0
-            ][
-                "values"
-            ] = [
-                self.requested_actions["values"]
-            ]
+            with self._timed("patch"):
+                spec = ACTION_SPECS[action_type]
+                spec.check(current_values, self.requested_actions)
+                patches = spec.patches(self.requested_actions)
+            updated_yaml = self._apply_patches(current_values, patches)
             logging.info("Update complete.")
-            updated_yaml = yaml.dump(new_values)
             return updated_yaml
 
         except Exception as excp:
@@ -342,9 +498,24 @@ class ActionHandler:
             )
             raise excp
 
+    def _apply_patches(self, current_values: dict, patches: list) -> str:
+        """
+        Apply (path, value) patches and return the updated file in YAML format.
+        The fetched text is patched in place when current_values came from it;
+        otherwise a copy of current_values is updated and dumped.
+        """
+        with self._timed("serialize"):
+            if self.cached_text is not None and current_values is self.cached_values:
+                return patch_yaml_text(self.cached_text, patches, root=self.cached_node)
+
+            new_values = copy.deepcopy(current_values)
+            for path, value in patches:
+                set_path(new_values, path, value)
+            return yaml.dump(new_values)
+
     def push_to_repository(
         self, updated_file: yaml.YAMLObject, message="auto-update"
-    ) -> None:
+    ) -> str:
         """
         Using connection to target repository, push the supplied updated file
         back out to GitHub,
@@ -361,26 +532,67 @@ class ActionHandler:
 
         Returns
         -------
-            None
+            commit_sha : str
+                Hash of the newly created commit.
         """
         try:
             logging.info(
                 f"Attempting push to {self.value_file_dir}/{self.value_file_name}:"
             )
-            self.repo.update_file(
-                path=f"{self.value_file_dir}/{self.value_file_name}",
-                message=message,
-                content=updated_file,
-                sha=self.response_sha,
-                branch=self.branch_name,
-            )
+            with self._timed("push"):
+                commit_sha, blob_sha = self.backend.update_file(
+                    f"{self.value_file_dir}/{self.value_file_name}",
+                    self.branch_name,
+                    updated_file,
+                    self.response_sha,
+                    message,
+                )
+            # Keep the pushed contents so a refetch with a matching blob hash can reuse them.
+            self.cached_sha = blob_sha
+            self.cached_text = updated_file
+            self.cached_values = None
+            self.cached_node = None
+            self.response_sha = self.cached_sha
             logging.info("Push complete.")
+            return commit_sha
         except Exception as excp:
             logging.error(
                 f"Failed to push to repo with the following exception: {excp}"
             )
             raise excp
 
+    def fetch_update_push(self, action_type="lim_req", message="auto-update") -> None:
+        """
+        Execute complete file update process for any registered action type
+        with a single command.
+
+        If the push is rejected because the value file changed since it was
+        fetched (another agent or a person edited it), the file is fetched
+        again and the same requested actions are applied to the new contents,
+        up to max_push_retries times.
+
+        Parameters
+        ---------
+            action_type : str
+                Name of the action type to apply (e.g. 'lim_req', 'upf_sizing', 'replicas')
+            message : str
+                Commit message to be included with the push event.
+
+        Returns
+        -------
+            None
+        """
+        def cycle():
+            current_values = self.get_value_file_contents()
+            updated_file = self.generate_updated_value_file(current_values, action_type)
+            self.push_to_repository(updated_file, message)
+
+        self._retry_on_conflict(cycle)
+        logging.info(
+            "Cycle timings: "
+            + ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in self.timings.items())
+        )
+
     def fetch_update_push_upf_sizing(self) -> None:
         """
         Execute complete file update process with a single command.
@@ -393,9 +605,7 @@ class ActionHandler:
         -------
             None
         """
-        current_values = self.get_value_file_contents()
-        updated_file = self.generate_updated_value_file_upf_sizing(current_values)
-        self.push_to_repository(updated_file)
+        self.fetch_update_push("upf_sizing")
 
     def fetch_update_push_lim_req(self) -> None:
         """
@@ -409,9 +619,194 @@ class ActionHandler:
         -------
             None
         """
-        current_values = self.get_value_file_contents()
-        updated_file = self.generate__updated_value_file_lim_req(current_values)
-        self.push_to_repository(updated_file)
+        self.fetch_update_push("lim_req")
+
+    def get_value_files_contents(self, paths: list) -> dict:
+        """
+        Fetch several value files from the commit currently at the head of the
+        target branch. The branch reference and commit are retained as
+        attributes so that push_files_to_repository can build on top of them.
+
+        establish_github_connection must be called prior to use.
+
+        Parameters
+        ---------
+            paths : list of str
+                Paths of the target files within the repo
+                (e.g. ['napp/open5gs_values/test.yaml'])
+
+        Returns
+        -------
+            contents : dict
+                Dictionary mapping each path to the dictionary representation
+                of that file's contents.
+        """
+        try:
+            logging.info(f"Attempting fetch of contents from {', '.join(paths)}:")
+            self.timings.clear()
+            with self._timed("fetch"):
+                # Read every file from the same commit so the batch is consistent.
+                self.base, texts = self.backend.fetch_files(paths, self.branch_name)
+
+                contents = {}
+                self.base_files = {}
+                for path, text in texts.items():
+                    contents[path], root = compose_yaml(text)
+                    self.base_files[path] = (text, root)
+            logging.info("Fetch successful.")
+            return contents
+
+        except Exception as excp:
+            logging.error(f"Failed to fetch files with the following exception: {excp}")
+            raise excp
+
+    def push_files_to_repository(self, updated_files: dict, message="auto-update") -> str:
+        """
+        Push several updated files back out to the repository as a single commit.
+        A blob is created for every file, then a tree on top of the base
+        commit's tree, then a commit whose parent is the base commit. Finally
+        the branch reference is fast-forwarded to the new commit.
+
+        get_value_files_contents must be called prior to use.
+
+        Parameters
+        ---------
+            updated_files : dict
+                Dictionary mapping each path within the repo to its updated
+                contents, in YAML format.
+
+            message : str
+                Commit message to be included with the push event.
+
+        Returns
+        -------
+            commit_sha : str
+                Hash of the newly created commit.
+        """
+        try:
+            logging.info(f"Attempting batched push to {', '.join(updated_files)}:")
+            # Rejected if the branch moved since the fetch.
+            with self._timed("push"):
+                commit_sha = self.backend.commit_files(
+                    self.base, self.branch_name, updated_files, message
+                )
+            logging.info("Push complete.")
+            return commit_sha
+        except Exception as excp:
+            logging.error(
+                f"Failed to push to repo with the following exception: {excp}"
+            )
+            raise excp
+
+    def fetch_update_push_batch(self, batched_actions: list, message="auto-update") -> str:
+        """
+        Execute complete update process for several targets across one or more
+        value files, producing a single commit regardless of the number of targets.
+        Conflicting pushes are retried on fresh contents as for fetch_update_push.
+
+        Parameters
+        ---------
+            batched_actions : list of dict
+                Changes to apply, in order. Each change names its action type
+                (any key of action_spec.ACTION_SPECS), the requested actions for that type, and optionally the path of
+                the value file to update (defaults to the handler's value file).
+                (e.g.:
+                    batched_actions = [
+                        {
+                            'action_type' : 'lim_req',
+                            'requested_actions' : {
+                                'target_pod' : 'amf',
+                                'requests' : {'memory' : '64Mi', 'cpu' : '100m'},
+                                'limits' : {'memory' : '128Mi', 'cpu' : '200m'},
+                            },
+                        },
+                        {
+                            'value_file' : 'napp/open5gs_values/other.yaml',
+                            'action_type' : 'upf_sizing',
+                            'requested_actions' : {'target_pod' : 'upf', 'values' : 'Small'},
+                        },
+                    ])
+            message : str
+                Commit message to be included with the push event.
+
+        Returns
+        -------
+            commit_sha : str
+                Hash of the newly created commit, or None if the requested
+                values were already in place.
+        """
+        return self._retry_on_conflict(
+            lambda: self._fetch_update_push_batch(batched_actions, message)
+        )
+
+    def _fetch_update_push_batch(self, batched_actions: list, message: str) -> str:
+        """
+        Single attempt of fetch_update_push_batch.
+        """
+        default_path = f"{self.value_file_dir}/{self.value_file_name}"
+        grouped_actions = {}
+        for change in batched_actions:
+            path = change.get("value_file", default_path)
+            grouped_actions.setdefault(path, []).append(change)
+
+        if list(grouped_actions) == [default_path]:
+            # Only the handler's own file is involved: one conditional fetch
+            # and one contents update are cheaper than the Git Data API calls.
+            current_values = self.get_value_file_contents()
+            patches = []
+            with self._timed("patch"):
+                for change in batched_actions:
+                    spec = ACTION_SPECS[change["action_type"]]
+                    spec.check(current_values, change["requested_actions"])
+                    patches += spec.patches(change["requested_actions"])
+            updated_file = self._apply_patches(current_values, patches)
+            if updated_file == self.cached_text:
+                logging.info("Requested actions are already in place; nothing to push.")
+                return None
+            return self.push_to_repository(updated_file, message)
+
+        current_values = self.get_value_files_contents(list(grouped_actions))
+
+        updated_files = {}
+        for path, changes in grouped_actions.items():
+            patches = []
+            with self._timed("patch"):
+                for change in changes:
+                    spec = ACTION_SPECS[change["action_type"]]
+                    spec.check(current_values[path], change["requested_actions"])
+                    patches += spec.patches(change["requested_actions"])
+            text, root = self.base_files[path]
+            with self._timed("serialize"):
+                updated_file = patch_yaml_text(text, patches, root=root)
+            if updated_file != text:
+                updated_files[path] = updated_file
+
+        if not updated_files:
+            logging.info("Requested actions are already in place; nothing to push.")
+            return None
+        return self.push_files_to_repository(updated_files, message)
+
+    def _retry_on_conflict(self, cycle):
+        """
+        Run an update cycle (fetch, patch, push), running it again on fresh
+        contents when its push is rejected with PushConflictError, up to
+        max_push_retries times with randomized exponential backoff.
+        Return the result of the successful cycle.
+        """
+        attempt = 0
+        while True:
+            try:
+                return cycle()
+            except PushConflictError as excp:
+                if attempt >= self.max_push_retries:
+                    logging.error(f"Giving up after {attempt} retries: {excp}")
+                    raise excp
+                attempt += 1
+                logging.warning(
+                    f"Push conflict ({excp}); refetching and retrying ({attempt}/{self.max_push_retries})."
+                )
+                self.invalidate_cache()
+                time.sleep(random.uniform(0, self.retry_backoff * 2 ** (attempt - 1)))
 
 
 def get_token(token_key="token") -> str:
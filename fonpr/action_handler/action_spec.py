@@ -0,0 +1,178 @@
+"""
+Module to contain declarative action specifications for the action handler.
+
+An action specification maps JSON Pointer (RFC 6901) style paths into a
+value.yaml file onto value templates filled from an agent's requested actions.
+Specifications are compiled once into lists of path and value builders, so
+producing the patches for a cycle is a handful of lookups rather than a
+dedicated code path per action type.
+
+e.g.:
+    spec = ActionSpec({"/{target_pod}/replicaCount": "{replicas}"})
+    spec.patches({"target_pod": "amf", "replicas": 2})
+    # [(("amf", "replicaCount"), 2)]
+"""
+
+from operator import itemgetter
+
+
+class ActionSpec:
+    """
+    Declarative description of how one action type updates a value file.
+
+    Attributes
+    ----------
+        targets : dict
+            Mapping of path templates to value templates.
+            Path templates are JSON Pointers whose tokens may be placeholders
+            such as '{target_pod}'; numeric tokens index into sequences.
+            Value templates are YAML-like structures whose strings of the form
+            '{key}' are replaced by requested_actions[key].
+        create_missing : bool
+            Whether the last key of a path may be absent from the value file,
+            in which case it is added. Every other element must exist.
+
+    Methods
+    -------
+        patches(requested_actions:dict):
+            Build the (path, value) patches for one set of requested actions.
+
+        check(values:dict, requested_actions:dict):
+            Check that every target path exists in a fetched value file.
+    """
+
+    def __init__(self, targets: dict, create_missing=False):
+        """
+        Compile the path and value templates of the specification.
+
+        Parameters
+        ----------
+            targets : dict
+                Mapping of path templates to value templates.
+            create_missing : bool
+                Whether the last key of a path may be absent from the value file.
+        """
+        self.targets = targets
+        self.create_missing = create_missing
+        self._compiled = [
+            (_compile_pointer(pointer), _compile_value(template))
+            for pointer, template in targets.items()
+        ]
+
+    def patches(self, requested_actions: dict) -> list:
+        """
+        Build the (path, value) patches for one set of requested actions.
+
+        Parameters
+        ----------
+            requested_actions : dict
+                Requested actions supplying every placeholder used by the specification.
+
+        Returns
+        -------
+            patches : list of tuple
+                (path, value) pairs to apply to the value file.
+        """
+        return [
+            (tuple(token(requested_actions) for token in path), build(requested_actions))
+            for path, build in self._compiled
+        ]
+
+    def check(self, values: dict, requested_actions: dict) -> None:
+        """
+        Check that every target path exists in a fetched value file.
+
+        Parameters
+        ----------
+            values : dict
+                Dictionary representation of the fetched value file.
+            requested_actions : dict
+                Requested actions supplying every placeholder used by the specification.
+
+        Returns
+        -------
+            None
+        """
+        for path, _ in self.patches(requested_actions):
+            node = values
+            last = len(path) - 1
+            for depth, key in enumerate(path):
+                if isinstance(node, dict) and key in node:
+                    node = node[key]
+                elif isinstance(node, list) and isinstance(key, int) and -len(node) <= key < len(node):
+                    node = node[key]
+                elif depth == last and self.create_missing and isinstance(node, dict):
+                    break
+                else:
+                    raise KeyError(
+                        f"Path /{'/'.join(map(str, path[:depth + 1]))} not found in value file."
+                    )
+
+
+def _compile_pointer(pointer: str) -> list:
+    """
+    Split a JSON Pointer into per-token getters of requested_actions.
+    """
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid pointer {pointer!r}: must start with '/'.")
+    tokens = []
+    for token in pointer[1:].split("/"):
+        token = token.replace("~1", "/").replace("~0", "~")
+        if token.startswith("{") and token.endswith("}"):
+            tokens.append(itemgetter(token[1:-1]))
+        elif token.isdigit():
+            tokens.append(lambda _, index=int(token): index)
+        else:
+            tokens.append(lambda _, key=token: key)
+    return tokens
+
+
+def _compile_value(template):
+    """
+    Turn a value template into a function of requested_actions.
+    """
+    if isinstance(template, str) and template.startswith("{") and template.endswith("}"):
+        return itemgetter(template[1:-1])
+    if isinstance(template, dict):
+        builders = [(key, _compile_value(item)) for key, item in template.items()]
+        return lambda actions: {key: build(actions) for key, build in builders}
+    if isinstance(template, list):
+        builders = [_compile_value(item) for item in template]
+        return lambda actions: [build(actions) for build in builders]
+    return lambda _: template
+
+
+ACTION_SPECS = {
+    # Requests and limits replace the pod's whole resources block, which is added if absent.
+    "lim_req": ActionSpec(
+        {"/{target_pod}/resources": {"requests": "{requests}", "limits": "{limits}"}},
+        create_missing=True,
+    ),
+    "upf_sizing": ActionSpec(
+        {
+            "/{target_pod}/affinity/nodeAffinity/requiredDuringSchedulingIgnoredDuringExecution"
+            "/nodeSelectorTerms/0/matchExpressions/0/values": ["{values}"]
+        }
+    ),
+    "replicas": ActionSpec({"/{target_pod}/replicaCount": "{replicas}"}),
+    "hpa": ActionSpec(
+        {
+            "/{target_pod}/autoscaling/minReplicas": "{min_replicas}",
+            "/{target_pod}/autoscaling/maxReplicas": "{max_replicas}",
+        }
+    ),
+}
+
+
+def register_action_spec(action_type: str, spec: ActionSpec) -> None:
+    """
+    Make a new action type available to the action handler.
+
+    Parameters
+    ----------
+        action_type : str
+            Name used to request the action (e.g. 'replicas').
+        spec : ActionSpec
+            Specification of the paths the action updates.
+    """
+    ACTION_SPECS[action_type] = spec
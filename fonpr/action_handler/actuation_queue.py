@@ -0,0 +1,242 @@
+"""
+Module to contain an asynchronous actuation queue on top of the action handler.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ActuationQueue:
+    """
+    Background worker that pushes requested actions through an ActionHandler
+    while the caller carries on observing and training.
+
+    Changes are submitted without blocking and a Future is returned for each.
+    While a push is in flight or the coalescing window is open, pending changes
+    are merged: a newer change for the same value file, action type and target
+    replaces the older one, and every pending change is pushed together in a
+    single commit. Futures of superseded changes resolve with the commit that
+    carried their replacement.
+
+    Low priority changes are held back (and keep coalescing) while the rate
+    limit scheduler of the handler's backend would have them wait or dip into
+    the budget reserved for high priority pushes; a high priority change
+    releases everything pending with it.
+
+    Attributes
+    ----------
+        hndl : ActionHandler
+            Handler used by the worker to fetch, update and push value files.
+        coalesce_window : float
+            Time in seconds to wait after the first pending change before
+            pushing, so that bursts of actions land in one commit.
+        message : str
+            Commit message to be included with every push event.
+        scheduler : RateLimitScheduler
+            Rate limit scheduler consulted before pushing low priority changes
+            (None to push them as soon as the coalescing window closes).
+
+    Methods
+    -------
+        submit(requested_actions:dict, action_type='lim_req', value_file=None, priority='high') -> Future:
+            Enqueue a change; the Future resolves with the hash of the commit carrying it.
+
+        get_value_file_contents() -> dict:
+            Read the handler's value file, never while the worker is pushing through it.
+
+        flush(timeout=None):
+            Block until every change submitted so far has been pushed.
+
+        close(wait=True):
+            Stop accepting changes, push what is pending and stop the worker.
+    """
+
+    def __init__(self, hndl, coalesce_window=0.5, message="auto-update", scheduler=None):
+        """
+        Start the background worker.
+
+        Parameters
+        ----------
+            hndl : ActionHandler
+                Handler used by the worker to fetch, update and push value files.
+            coalesce_window : float
+                Time in seconds to wait after the first pending change before pushing.
+            message : str
+                Commit message to be included with every push event.
+            scheduler : RateLimitScheduler
+                Rate limit scheduler consulted before pushing low priority
+                changes (defaults to the one of the handler's backend, if any).
+        """
+        self.hndl = hndl
+        self.coalesce_window = coalesce_window
+        self.message = message
+        if scheduler is None:
+            scheduler = getattr(hndl.backend, "scheduler", None)
+        self.scheduler = scheduler
+
+        self._pending = {}
+        self._in_flight = []
+        # Held by whoever uses the handler (the worker while pushing), whose
+        # cached value file is not safe to read and write concurrently.
+        self._handler_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name="actuation-queue", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, requested_actions: dict, action_type="lim_req", value_file=None, priority="high") -> Future:
+        """
+        Enqueue a change to be pushed by the background worker.
+
+        Parameters
+        ----------
+            requested_actions : dict
+                Requested actions for the action type (e.g. {'target_pod' : 'upf', 'values' : 'Small'}).
+            action_type : str
+                Name of the action type to apply (any key of action_spec.ACTION_SPECS).
+            value_file : str
+                Path of the value file within the repo (defaults to the handler's value file).
+            priority : str
+                'high' to push as soon as the coalescing window closes, or 'low'
+                to wait until the rate limit budget comfortably allows it.
+
+        Returns
+        -------
+            future : concurrent.futures.Future
+                Resolves with the hash of the commit carrying the change
+                (None if the values were already in place), or with the
+                exception raised while pushing it.
+        """
+        if value_file is None:
+            value_file = f"{self.hndl.value_file_dir}/{self.hndl.value_file_name}"
+        change = {
+            "value_file": value_file,
+            "action_type": action_type,
+            "requested_actions": requested_actions,
+        }
+        key = (value_file, action_type, requested_actions.get("target_pod"))
+        future = Future()
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a closed actuation queue.")
+            if key in self._pending:
+                logging.info(f"Coalescing pending {action_type} change for {key[2]}.")
+                _, futures, pending_priority = self._pending[key]
+                futures = futures + [future]
+                if pending_priority == "high":
+                    priority = "high"
+            else:
+                futures = [future]
+            self._pending[key] = (change, futures, priority)
+            self._condition.notify_all()
+        return future
+
+    def get_value_file_contents(self) -> dict:
+        """
+        Read the contents of the handler's value file. The handler is shared
+        with the worker, so the read waits for any push in flight to finish.
+
+        Returns
+        -------
+            values : dict
+                Contents of the value file, as returned by ActionHandler.get_value_file_contents.
+        """
+        with self._handler_lock:
+            return self.hndl.get_value_file_contents()
+
+    def flush(self, timeout=None) -> None:
+        """
+        Block until every change submitted so far has been pushed.
+
+        Parameters
+        ----------
+            timeout : float
+                Maximum time in seconds to wait (None waits indefinitely).
+
+        Returns
+        -------
+            None
+        """
+        with self._condition:
+            futures = [f for _, fs, _ in self._pending.values() for f in fs] + self._in_flight
+        for future in futures:
+            future.exception(timeout=timeout)
+
+    def close(self, wait=True) -> None:
+        """
+        Stop accepting changes, push what is pending and stop the worker.
+
+        Parameters
+        ----------
+            wait : bool
+                Block until the worker has pushed the pending changes and exited.
+
+        Returns
+        -------
+            None
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            self._worker.join()
+
+    def _run(self) -> None:
+        """
+        Worker loop: wait for changes, let a burst accumulate, push it as one commit.
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                closing = self._closed
+
+            if not closing and self.coalesce_window > 0:
+                time.sleep(self.coalesce_window)
+
+            with self._condition:
+                wait = self._low_priority_delay()
+                if wait > 0:
+                    logging.info(f"Deferring low priority actions for {wait:.1f}s to stay within the rate limit.")
+                    # Woken early by new (possibly high priority) changes or by close.
+                    self._condition.wait(timeout=wait)
+                    continue
+                batch, self._pending = self._pending, {}
+                self._in_flight = [f for _, fs, _ in batch.values() for f in fs]
+
+            changes = [change for change, _, _ in batch.values()]
+            try:
+                with self._handler_lock:
+                    commit_sha = self.hndl.fetch_update_push_batch(changes, self.message)
+            except Exception as excp:
+                logging.error(f"Failed to push queued actions with the following exception: {excp}")
+                for future in self._in_flight:
+                    future.set_exception(excp)
+            else:
+                for future in self._in_flight:
+                    future.set_result(commit_sha)
+
+    def _low_priority_delay(self) -> float:
+        """
+        Return how long pending changes should be held back; 0 unless every one
+        of them is low priority and the scheduler would delay their push.
+        Must be called with the condition held.
+        """
+        if (
+            self._closed
+            or self.scheduler is None
+            or any(priority == "high" for _, _, priority in self._pending.values())
+        ):
+            return 0.0
+        files = {change["value_file"] for change, _, _ in self._pending.values()}
+        # Conditional fetch and update for one file; ref, commit, a read and a
+        # blob per file, tree, commit and ref update for a batch.
+        cost = 2 if len(files) == 1 else 2 * len(files) + 5
+        return self.scheduler.delay(cost, priority="low")
@@ -0,0 +1,429 @@
+"""
+Module to contain the repository backends used by the action handler.
+
+A backend reads value files from a branch and commits updated files back to it.
+GitHubBackend goes through the GitHub REST API; LocalGitBackend commits straight
+into a git repository on disk (bare or with a working tree), which serves GitOps
+setups mirroring from a local repository, offline runs of the agent loop, and
+fast integration tests of the actuation path. ShadowBackend wraps either of
+them to read from the real repository but journal the would-be commits locally.
+"""
+
+import difflib
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import time
+
+from github import GithubException, InputGitTreeElement
+
+from .rate_limiter import RateLimitScheduler
+
+
+class PushConflictError(RuntimeError):
+    """
+    Raised by a backend when a push is rejected because the file or branch
+    changed since it was fetched (stale blob hash, or the branch moved).
+    """
+
+
+class GitHubBackend:
+    """
+    Repository backend built on the GitHub REST API through PyGithub.
+
+    Single files are fetched with the contents API and revalidated with
+    conditional requests carrying the ETag of the previous response (a 304 is
+    not counted against the rate limit). Batches are committed through the
+    Git Data API as one commit.
+
+    Every request first takes a token from a RateLimitScheduler, which is kept
+    in step with the rate limit reported by GitHub, so that bursts of pushes
+    are paced to the remaining budget rather than failing once it runs out.
+
+    Attributes
+    ----------
+        session : github.MainClass.Github
+            Authenticated GitHub API session.
+        repo_name : str
+            target GitHub repository (e.g. 'DISHDevEx/response-ml')
+        repo : github.Repository.Repository
+            Repository object, fetched on first use.
+        scheduler : RateLimitScheduler
+            Token bucket pacing the requests sent to GitHub.
+
+    Methods
+    -------
+        fetch_file(path:str, branch:str, cached_sha:str) -> tuple:
+            Return (text, blob_sha) of a file at the head of a branch; text is
+            None when the blob hash equals cached_sha.
+
+        update_file(path:str, branch:str, content:str, blob_sha:str, message:str) -> tuple:
+            Commit new contents for a single file whose current blob hash is
+            blob_sha. Return (commit_sha, new_blob_sha).
+
+        fetch_files(paths:list, branch:str) -> tuple:
+            Return (base, texts) for several files read from the commit at the
+            head of a branch, where base is passed on to commit_files.
+
+        commit_files(base, branch:str, files:dict, message:str) -> str:
+            Commit several files on top of base as a single commit and advance
+            the branch to it. Return the commit hash.
+    """
+
+    def __init__(self, session, repo_name, scheduler=None):
+        self.session = session
+        self.repo_name = repo_name
+        self.repo = None
+        self.content_files = {}
+        self.scheduler = scheduler if scheduler is not None else RateLimitScheduler()
+
+    def _get_repo(self):
+        if self.repo is None or self.repo.full_name != self.repo_name:
+            self.repo = self._request(1, self.session.get_repo, self.repo_name)
+            self.content_files = {}
+        return self.repo
+
+    def _request(self, cost, call, *args, **kwargs):
+        """
+        Send cost requests through call once the scheduler allows it, then
+        reconcile the scheduler with the rate limit reported by GitHub.
+        """
+        self.scheduler.acquire(cost)
+        try:
+            result = call(*args, **kwargs)
+        except GithubException as excp:
+            if excp.status in (403, 429):
+                logging.warning(f"GitHub rate limit hit (status {excp.status}).")
+                self.scheduler.update_from_headers(excp.headers)
+            raise excp
+        remaining, limit = self.session.rate_limiting
+        self.scheduler.update(remaining, limit, self.session.rate_limiting_resettime)
+        return result
+
+    def fetch_file(self, path: str, branch: str, cached_sha="") -> tuple:
+        """
+        Return (text, blob_sha) of a file at the head of a branch. Repeated
+        fetches of a file revalidate the previous response with its ETag.
+        text is None when the blob hash equals cached_sha.
+        """
+        repo = self._get_repo()
+        content_file = self.content_files.get((path, branch))
+        if content_file is None:
+            content_file = self._request(1, repo.get_contents, path, ref=branch)
+            self.content_files[(path, branch)] = content_file
+        elif not self._request(1, content_file.update):
+            logging.info("File unchanged since last fetch (304).")
+
+        if content_file.sha == cached_sha:
+            return None, content_file.sha
+        return content_file.decoded_content.decode("utf-8"), content_file.sha
+
+    def update_file(self, path: str, branch: str, content: str, blob_sha: str, message: str) -> tuple:
+        """
+        Commit new contents for a single file whose current blob hash is
+        blob_sha. Return (commit_sha, new_blob_sha). Raise PushConflictError
+        if the file changed since it was fetched.
+        """
+        try:
+            response = self._request(
+                1,
+                self._get_repo().update_file,
+                path=path,
+                message=message,
+                content=content,
+                sha=blob_sha,
+                branch=branch,
+            )
+        except GithubException as excp:
+            if excp.status in (409, 422):
+                # Drop the stale response so the next fetch downloads the file in full.
+                self.content_files.pop((path, branch), None)
+                raise PushConflictError(f"{path} changed since it was fetched.") from excp
+            raise excp
+        return response["commit"].sha, response["content"].sha
+
+    def fetch_files(self, paths: list, branch: str) -> tuple:
+        """
+        Return (base, texts) for several files read from the commit at the head
+        of a branch. base (the branch reference and commit) is passed on to commit_files.
+        """
+        repo = self._get_repo()
+        ref = self._request(1, repo.get_git_ref, f"heads/{branch}")
+        commit = self._request(1, repo.get_git_commit, ref.object.sha)
+        texts = {
+            path: self._request(1, repo.get_contents, path, ref=commit.sha).decoded_content.decode("utf-8")
+            for path in paths
+        }
+        return (ref, commit), texts
+
+    def commit_files(self, base, branch: str, files: dict, message: str) -> str:
+        """
+        Commit several files on top of base as a single commit built from new
+        blobs and a new tree, then fast-forward the branch to it. Return the commit
+        hash. Raise PushConflictError if the branch moved since base was read.
+        """
+        repo = self._get_repo()
+        ref, base_commit = base
+        tree_elements = []
+        for path, content in files.items():
+            blob = self._request(1, repo.create_git_blob, content, "utf-8")
+            tree_elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob.sha))
+        tree = self._request(1, repo.create_git_tree, tree_elements, base_commit.tree)
+        commit = self._request(1, repo.create_git_commit, message, tree, [base_commit])
+
+        # Not forced: the update is rejected if the branch moved since the fetch.
+        try:
+            self._request(1, ref.edit, commit.sha)
+        except GithubException as excp:
+            if excp.status in (409, 422):
+                raise PushConflictError(f"{branch} moved since it was fetched.") from excp
+            raise excp
+        return commit.sha
+
+
+class LocalGitBackend:
+    """
+    Repository backend committing straight into a git repository on disk,
+    using git plumbing commands so that bare repositories and working trees are
+    handled alike. When the target branch is checked out in a working tree, the
+    index and working tree are moved along with the branch.
+
+    Attributes
+    ----------
+        repo_path : str
+            Path to the repository (the .git directory of a bare repository,
+            or the top of a working tree).
+        author_name : str
+            Name recorded as author and committer of the commits.
+        author_email : str
+            Email recorded as author and committer of the commits.
+
+    Methods
+    -------
+        Same as GitHubBackend; blob hashes are compared locally instead of
+        through conditional requests.
+    """
+
+    def __init__(self, repo_path, author_name="FONPR Agent", author_email="fonpr-agent@localhost"):
+        self.repo_path = repo_path
+        self.author_name = author_name
+        self.author_email = author_email
+
+    def _git(self, *args, stdin=None, env=None) -> str:
+        completed = subprocess.run(
+            ["git", "-C", self.repo_path, *args],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            env=env,
+            check=False,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"git {' '.join(args)} failed: {completed.stderr.strip()}")
+        return completed.stdout.strip()
+
+    def _head(self, branch: str) -> str:
+        return self._git("rev-parse", "--verify", f"refs/heads/{branch}^{{commit}}")
+
+    def fetch_file(self, path: str, branch: str, cached_sha="") -> tuple:
+        """
+        Return (text, blob_sha) of a file at the head of a branch; text is None
+        when the blob hash equals cached_sha, without reading the blob.
+        """
+        blob_sha = self._git("rev-parse", "--verify", f"refs/heads/{branch}:{path}")
+        if blob_sha == cached_sha:
+            return None, blob_sha
+        return self._read_blob(blob_sha), blob_sha
+
+    def update_file(self, path: str, branch: str, content: str, blob_sha: str, message: str) -> tuple:
+        """
+        Commit new contents for a single file whose current blob hash is
+        blob_sha. Return (commit_sha, new_blob_sha).
+        """
+        head = self._head(branch)
+        current_sha = self._git("rev-parse", "--verify", f"{head}:{path}")
+        if current_sha != blob_sha:
+            raise PushConflictError(f"{path} does not match {blob_sha}; it was changed since it was fetched.")
+        commit_sha = self.commit_files(head, branch, {path: content}, message)
+        return commit_sha, self._git("rev-parse", "--verify", f"{commit_sha}:{path}")
+
+    def fetch_files(self, paths: list, branch: str) -> tuple:
+        """
+        Return (base, texts) for several files read from the commit at the head
+        of a branch. base (the commit hash) is passed on to commit_files.
+        """
+        head = self._head(branch)
+        texts = {
+            path: self._read_blob(self._git("rev-parse", "--verify", f"{head}:{path}"))
+            for path in paths
+        }
+        return head, texts
+
+    def commit_files(self, base, branch: str, files: dict, message: str) -> str:
+        """
+        Commit several files on top of base as a single commit, then move the
+        branch to it only if it still points at base. Return the commit hash.
+        Raise PushConflictError if the branch moved since base was read.
+        """
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=self.author_name,
+            GIT_AUTHOR_EMAIL=self.author_email,
+            GIT_COMMITTER_NAME=self.author_name,
+            GIT_COMMITTER_EMAIL=self.author_email,
+        )
+        # Build the tree in a scratch index so the repository's own index is untouched.
+        with tempfile.TemporaryDirectory() as scratch:
+            env["GIT_INDEX_FILE"] = os.path.join(scratch, "index")
+            self._git("read-tree", base, env=env)
+            for path, content in files.items():
+                blob_sha = self._git("hash-object", "-w", "--stdin", stdin=content)
+                self._git("update-index", "--add", "--cacheinfo", f"100644,{blob_sha},{path}", env=env)
+            tree_sha = self._git("write-tree", env=env)
+        commit_sha = self._git("commit-tree", tree_sha, "-p", base, "-m", message, env=env)
+
+        # Compare-and-swap: fails if the branch moved since base was read.
+        try:
+            self._git("update-ref", f"refs/heads/{branch}", commit_sha, base)
+        except RuntimeError as excp:
+            raise PushConflictError(f"{branch} moved since it was fetched: {excp}") from excp
+        self._sync_working_tree(branch, base, commit_sha)
+        return commit_sha
+
+    def _read_blob(self, blob_sha: str) -> str:
+        completed = subprocess.run(
+            ["git", "-C", self.repo_path, "cat-file", "blob", blob_sha],
+            capture_output=True,
+            check=True,
+        )
+        return completed.stdout.decode("utf-8")
+
+    def _sync_working_tree(self, branch: str, old_commit: str, new_commit: str) -> None:
+        if self._git("rev-parse", "--is-bare-repository") == "true":
+            return
+        try:
+            checked_out = self._git("symbolic-ref", "-q", "HEAD")
+        except RuntimeError:
+            return  # Detached HEAD
+        if checked_out == f"refs/heads/{branch}":
+            # Two-way merge of the index and working tree from the old commit to the new one.
+            self._git("read-tree", "-m", "-u", old_commit, new_commit)
+
+
+class ShadowBackend:
+    """
+    Repository backend for shadow (dry-run) actuation: files are read through
+    a real backend, but instead of committing, the updated files are diffed
+    against what was read and the diffs are appended to a local JSON lines
+    journal. Nothing is ever written to the repository.
+
+    Every journal entry holds the time, branch, commit message, the unified
+    diff of each file, and the phase timings of the handler cycle that
+    produced it (when shared through timings), including the simulated push.
+
+    Attributes
+    ----------
+        backend : GitHubBackend or LocalGitBackend
+            Backend the files are read from.
+        journal_path : str
+            Path of the JSON lines journal the diffs are appended to.
+        simulated_push_latency : float
+            Time in seconds each shadow push sleeps for, to stand in for the
+            latency of a real push when timing whole agent cycles.
+        timings : dict
+            Phase timings of the current handler cycle, copied into each entry.
+
+    Methods
+    -------
+        Same as GitHubBackend; update_file and commit_files return hashes of
+        the journaled contents instead of real commit hashes.
+    """
+
+    def __init__(self, backend, journal_path, simulated_push_latency=0.0, timings=None):
+        self.backend = backend
+        self.journal_path = journal_path
+        self.simulated_push_latency = simulated_push_latency
+        self.timings = timings if timings is not None else {}
+        self.texts = {}
+
+    def fetch_file(self, path: str, branch: str, cached_sha="") -> tuple:
+        """
+        Return (text, blob_sha) of a file at the head of a branch through the
+        wrapped backend, retaining the text as the base of the next diff.
+        """
+        text, blob_sha = self.backend.fetch_file(path, branch, cached_sha)
+        if text is not None:
+            self.texts[(path, branch)] = text
+        return text, blob_sha
+
+    def update_file(self, path: str, branch: str, content: str, blob_sha: str, message: str) -> tuple:
+        """
+        Journal new contents for a single file instead of committing them.
+        Return (entry_sha, new_blob_sha), the latter computed as git would.
+        """
+        entry_sha = self._journal(branch, {path: (self.texts.get((path, branch), ""), content)}, message)
+        return entry_sha, _blob_sha(content)
+
+    def fetch_files(self, paths: list, branch: str) -> tuple:
+        """
+        Return (base, texts) for several files through the wrapped backend.
+        """
+        base, texts = self.backend.fetch_files(paths, branch)
+        for path, text in texts.items():
+            self.texts[(path, branch)] = text
+        return base, texts
+
+    def commit_files(self, base, branch: str, files: dict, message: str) -> str:
+        """
+        Journal several files as a single shadow commit. Return the entry hash.
+        """
+        return self._journal(
+            branch,
+            {path: (self.texts.get((path, branch), ""), content) for path, content in files.items()},
+            message,
+        )
+
+    def _journal(self, branch: str, files: dict, message: str) -> str:
+        start = time.perf_counter()
+        if self.simulated_push_latency > 0:
+            time.sleep(self.simulated_push_latency)
+        diffs = [
+            {
+                "path": path,
+                "diff": "".join(
+                    difflib.unified_diff(
+                        old.splitlines(keepends=True),
+                        new.splitlines(keepends=True),
+                        fromfile=f"a/{path}",
+                        tofile=f"b/{path}",
+                    )
+                ),
+            }
+            for path, (old, new) in files.items()
+        ]
+        entry_sha = hashlib.sha1(
+            json.dumps([branch, message, diffs, time.time()]).encode("utf-8")
+        ).hexdigest()
+        entry = {
+            "sha": entry_sha,
+            "time": time.time(),
+            "branch": branch,
+            "message": message,
+            "files": diffs,
+            "timings": dict(self.timings, push=time.perf_counter() - start),
+        }
+        with open(self.journal_path, "a") as journal:
+            journal.write(json.dumps(entry) + "\n")
+        logging.info(f"Shadow push journaled to {self.journal_path} ({len(diffs)} file(s)).")
+        return entry_sha
+
+
+def _blob_sha(content: str) -> str:
+    """
+    Return the git blob hash of content.
+    """
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
@@ -0,0 +1,315 @@
+"""
+Module to contain an actuator applying actions directly through the Kubernetes API.
+
+Going through GitHub means waiting for a GitOps sync and a rollout before an
+action takes effect. KubernetesActuator instead patches the target Deployments
+with server-side apply, so resources, node affinity and replica changes reach
+the cluster in seconds. The same action can optionally be queued on an
+ActuationQueue so the value files in git are reconciled afterwards (otherwise
+the next GitOps sync would revert the change).
+"""
+
+import logging
+import os
+import time
+
+import requests
+
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+
+
+def _lim_req_manifest(requested_actions: dict, actuator) -> dict:
+    container = {
+        "name": actuator.container_template.format(**requested_actions),
+        "resources": {
+            "requests": requested_actions["requests"],
+            "limits": requested_actions["limits"],
+        },
+    }
+    return {"spec": {"template": {"spec": {"containers": [container]}}}}
+
+
+def _upf_sizing_manifest(requested_actions: dict, actuator) -> dict:
+    match_expression = {
+        "key": actuator.node_selector_key,
+        "operator": "In",
+        "values": [requested_actions["values"]],
+    }
+    affinity = {
+        "nodeAffinity": {
+            "requiredDuringSchedulingIgnoredDuringExecution": {
+                "nodeSelectorTerms": [{"matchExpressions": [match_expression]}]
+            }
+        }
+    }
+    return {"spec": {"template": {"spec": {"affinity": affinity}}}}
+
+
+def _replicas_manifest(requested_actions: dict, actuator) -> dict:
+    return {"spec": {"replicas": requested_actions["replicas"]}}
+
+
+# Partial Deployment manifests applied for each action type; the action types
+# mirror those of action_spec.ACTION_SPECS that map onto a Deployment.
+MANIFEST_BUILDERS = {
+    "lim_req": _lim_req_manifest,
+    "upf_sizing": _upf_sizing_manifest,
+    "replicas": _replicas_manifest,
+}
+
+
+class KubernetesActuator:
+    """
+    Actuator applying an agent's requested actions to Deployments directly
+    through the Kubernetes API, as a low latency alternative to ActionHandler.
+
+    Each action is sent as a server-side apply patch holding only the fields
+    the action sets, under a dedicated field manager, so fields owned by other
+    managers (the GitOps controller, an HPA) are left alone unless they are the
+    ones being set, in which case ownership is forced over to this actuator.
+
+    The actuator is interchangeable with an ActionHandler in agent code: it
+    exposes requested_actions, fetch_update_push and fetch_update_push_batch.
+
+    Attributes
+    ----------
+        api_server : str
+            Base url of the Kubernetes API server (e.g. 'https://10.100.0.1:443').
+        namespace : str
+            Namespace holding the target Deployments.
+        field_manager : str
+            Field manager recorded for the applied fields.
+        deployment_template : str
+            Template of the Deployment name for a target pod (e.g. 'open5gs-{target_pod}').
+        container_template : str
+            Template of the container name for a target pod (e.g. '{target_pod}').
+        node_selector_key : str
+            Node label matched by the upf_sizing node affinity.
+        requested_actions : dict
+            Dictionary containing the requested actions, as for ActionHandler.
+        reconcile : ActuationQueue
+            Queue the applied actions are submitted to (with low priority) so
+            the value files in git follow the cluster; None to skip.
+        timings : dict
+            Time in seconds spent applying the last action ('push').
+
+    Methods
+    -------
+        apply(action_type:str, requested_actions:dict) -> str:
+            Apply one action to its Deployment and return the new resourceVersion.
+
+        fetch_update_push(action_type='lim_req', message='auto-update') -> str:
+            Apply the requested actions for an action type.
+
+        fetch_update_push_lim_req():
+            Apply the requested limits and requests.
+
+        fetch_update_push_upf_sizing():
+            Apply the requested upf sizing.
+
+        fetch_update_push_batch(batched_actions:list, message='auto-update') -> str:
+            Apply several actions, in order.
+    """
+
+    def __init__(
+        self,
+        api_server=None,
+        namespace=None,
+        token=None,
+        ca_cert=None,
+        field_manager="fonpr",
+        deployment_template="open5gs-{target_pod}",
+        container_template="{target_pod}",
+        node_selector_key="size",
+        requested_actions={},
+        reconcile=None,
+        timeout=10,
+    ):
+        """
+        Constructor for the Kubernetes actuator. Connection settings default to
+        the in-cluster service account of the pod the agent runs in.
+
+        Parameters
+        ----------
+            api_server : str
+                Base url of the Kubernetes API server
+                (defaults to KUBERNETES_SERVICE_HOST and KUBERNETES_SERVICE_PORT).
+            namespace : str
+                Namespace holding the target Deployments
+                (defaults to the service account namespace).
+            token : str
+                Bearer token (defaults to the service account token, if any).
+            ca_cert : str
+                Path of the CA bundle to verify the API server with
+                (defaults to the service account CA, if any).
+            field_manager : str
+                Field manager recorded for the applied fields.
+            deployment_template : str
+                Template of the Deployment name for a target pod.
+            container_template : str
+                Template of the container name for a target pod.
+            node_selector_key : str
+                Node label matched by the upf_sizing node affinity.
+            requested_actions : dict
+                Dictionary containing the requested actions.
+            reconcile : ActuationQueue
+                Queue the applied actions are submitted to so git is reconciled.
+            timeout : float
+                Timeout in seconds of each API request.
+        """
+        if api_server is None:
+            api_server = "https://{}:{}".format(
+                os.environ.get("KUBERNETES_SERVICE_HOST", "kubernetes.default.svc"),
+                os.environ.get("KUBERNETES_SERVICE_PORT", "443"),
+            )
+        if namespace is None:
+            namespace = _read_service_account_file("namespace") or "openverso"
+        if token is None:
+            token = _read_service_account_file("token")
+        if ca_cert is None and os.path.exists(os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt")):
+            ca_cert = os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt")
+
+        self.api_server = api_server.rstrip("/")
+        self.namespace = namespace
+        self.field_manager = field_manager
+        self.deployment_template = deployment_template
+        self.container_template = container_template
+        self.node_selector_key = node_selector_key
+        self.requested_actions = requested_actions
+        self.reconcile = reconcile
+        self.timeout = timeout
+        self.timings = {}
+
+        self.session = requests.Session()
+        self.session.verify = ca_cert if ca_cert else True
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def get_requested_actions(self) -> dict:
+        return self.requested_actions
+
+    def set_requested_actions(self, requested_actions: dict) -> None:
+        self.requested_actions = requested_actions
+
+    def apply(self, action_type: str, requested_actions: dict) -> str:
+        """
+        Apply one action to the Deployment of its target pod with server-side apply.
+
+        Parameters
+        ----------
+            action_type : str
+                Name of the action type to apply (any key of MANIFEST_BUILDERS).
+            requested_actions : dict
+                Requested actions for the action type (e.g. {'target_pod' : 'upf', 'values' : 'Small'}).
+
+        Returns
+        -------
+            resource_version : str
+                resourceVersion of the Deployment after the apply.
+        """
+        try:
+            name = self.deployment_template.format(**requested_actions)
+            manifest = {
+                "apiVersion": "apps/v1",
+                "kind": "Deployment",
+                "metadata": {"name": name, "namespace": self.namespace},
+            }
+            manifest.update(MANIFEST_BUILDERS[action_type](requested_actions, self))
+
+            logging.info(f"Applying {action_type} to deployment {self.namespace}/{name}:")
+            start = time.perf_counter()
+            # JSON is valid YAML, so the manifest can be sent as an apply patch as is.
+            response = self.session.patch(
+                f"{self.api_server}/apis/apps/v1/namespaces/{self.namespace}/deployments/{name}",
+                params={"fieldManager": self.field_manager, "force": "true"},
+                json=manifest,
+                headers={"Content-Type": "application/apply-patch+yaml"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            self.timings["push"] = time.perf_counter() - start
+            logging.info("Apply complete.")
+            return response.json()["metadata"].get("resourceVersion")
+
+        except Exception as excp:
+            logging.error(f"Failed to apply action with the following exception: {excp}")
+            raise excp
+
+    def fetch_update_push(self, action_type="lim_req", message="auto-update") -> str:
+        """
+        Apply the requested actions for an action type, then queue the same
+        change for git if a reconcile queue is set.
+
+        Parameters
+        ----------
+            action_type : str
+                Name of the action type to apply (e.g. 'lim_req', 'upf_sizing', 'replicas')
+            message : str
+                Unused; kept for interchangeability with ActionHandler.
+
+        Returns
+        -------
+            resource_version : str
+                resourceVersion of the Deployment after the apply.
+        """
+        resource_version = self.apply(action_type, self.requested_actions)
+        if self.reconcile is not None:
+            self.reconcile.submit(self.requested_actions, action_type, priority="low")
+        return resource_version
+
+    def fetch_update_push_lim_req(self) -> str:
+        """
+        Apply the requested limits and requests.
+        """
+        return self.fetch_update_push("lim_req")
+
+    def fetch_update_push_upf_sizing(self) -> str:
+        """
+        Apply the requested upf sizing.
+        """
+        return self.fetch_update_push("upf_sizing")
+
+    def fetch_update_push_batch(self, batched_actions: list, message="auto-update") -> str:
+        """
+        Apply several actions, in order, queueing each for git as soon as it is
+        applied; if an apply fails, the changes applied before it are still
+        reconciled, and the error is raised. See ActionHandler.fetch_update_push_batch
+        for the format of batched_actions; value_file entries only matter to the
+        reconcile queue.
+
+        Parameters
+        ----------
+            batched_actions : list of dict
+                Changes to apply, in order.
+            message : str
+                Unused; kept for interchangeability with ActionHandler.
+
+        Returns
+        -------
+            resource_version : str
+                resourceVersion of the last Deployment applied to.
+        """
+        resource_version = None
+        for change in batched_actions:
+            resource_version = self.apply(change["action_type"], change["requested_actions"])
+            # Queue each change as soon as it is live, so that a later failing
+            # apply does not leave applied changes for the GitOps sync to revert.
+            if self.reconcile is not None:
+                self.reconcile.submit(
+                    change["requested_actions"],
+                    change["action_type"],
+                    change.get("value_file"),
+                    priority="low",
+                )
+        return resource_version
+
+
+def _read_service_account_file(name: str) -> str:
+    """
+    Return the contents of a mounted service account file, or None outside a cluster.
+    """
+    try:
+        with open(os.path.join(SERVICE_ACCOUNT_DIR, name)) as file:
+            return file.read().strip()
+    except OSError:
+        return None
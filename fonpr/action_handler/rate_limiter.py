@@ -0,0 +1,217 @@
+"""
+Module to contain a rate-limit-aware scheduler for GitHub API requests.
+"""
+
+import logging
+import threading
+import time
+
+
+class RateLimitScheduler:
+    """
+    Token bucket pacing GitHub API requests to the budget left in the current
+    rate limit window.
+
+    The bucket refills at the sustainable rate, i.e. the remaining budget spread
+    evenly over the time left until the window resets, and holds at most
+    `burst` tokens. The budget, limit and reset time are reconciled with the
+    X-RateLimit-* headers of every response, and a Retry-After header (secondary
+    rate limits) holds all requests for the time it asks for.
+
+    High priority requests wait for a token; low priority requests are refused
+    (so that the caller can defer and merge them) whenever they would have to
+    wait, or would eat into the reserve kept for high priority requests.
+
+    Attributes
+    ----------
+        limit : int
+            Number of requests allowed per window (X-RateLimit-Limit).
+        remaining : int
+            Requests left in the current window (X-RateLimit-Remaining).
+        reset_time : float
+            Epoch time at which the current window resets (X-RateLimit-Reset).
+        burst : int
+            Maximum number of requests sent back to back.
+        reserve : float
+            Fraction of the limit kept for high priority requests.
+
+    Methods
+    -------
+        delay(cost=1, priority='high') -> float:
+            Seconds to wait before cost requests may be sent.
+
+        acquire(cost=1, priority='high', block=True) -> bool:
+            Take cost tokens, waiting for them if block is set.
+
+        update(remaining:int, limit:int, reset_time:float):
+            Reconcile the budget with the values reported by GitHub.
+
+        update_from_headers(headers:dict):
+            Reconcile the budget with the rate limit headers of a response.
+    """
+
+    def __init__(
+        self,
+        limit=5000,
+        window=3600,
+        burst=10,
+        reserve=0.2,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        """
+        Parameters
+        ----------
+            limit : int
+                Number of requests allowed per window, until GitHub reports it.
+            window : float
+                Length in seconds of a rate limit window, until GitHub reports its reset time.
+            burst : int
+                Maximum number of requests sent back to back.
+            reserve : float
+                Fraction of the limit kept for high priority requests.
+            clock : callable
+                Returns the current epoch time in seconds.
+            sleep : callable
+                Waits for the given number of seconds.
+        """
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.burst = burst
+        self.reserve = reserve
+        self.clock = clock
+        self.sleep = sleep
+
+        now = clock()
+        self.reset_time = now + window
+        self.tokens = float(burst)
+        self.last_refill = now
+        self.hold_until = 0.0
+        self._lock = threading.Lock()
+
+    def _rate(self, now) -> float:
+        """Sustainable requests per second for the rest of the window."""
+        return max(self.remaining, 0) / max(self.reset_time - now, 1.0)
+
+    def _refill(self, now) -> None:
+        if now >= self.reset_time:
+            # A new window started without a response telling us about it.
+            self.remaining = self.limit
+            self.reset_time = now + self.window
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self._rate(now))
+        self.last_refill = now
+
+    def _delay(self, now, cost, priority) -> float:
+        wait = max(0.0, self.hold_until - now)
+        if priority == "low" and self.remaining - cost < self.reserve * self.limit:
+            wait = max(wait, self.reset_time - now)
+        if self.tokens < cost:
+            rate = self._rate(now)
+            wait = max(wait, (cost - self.tokens) / rate if rate > 0 else self.reset_time - now)
+        return wait
+
+    def delay(self, cost=1, priority="high") -> float:
+        """
+        Return the number of seconds to wait before cost requests may be sent.
+
+        Parameters
+        ----------
+            cost : int
+                Number of requests about to be sent.
+            priority : str
+                'high' or 'low'; low priority requests may not use the reserve.
+
+        Returns
+        -------
+            wait : float
+                Seconds to wait (0 when the requests may be sent now).
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            return self._delay(now, cost, priority)
+
+    def acquire(self, cost=1, priority="high", block=True) -> bool:
+        """
+        Take cost tokens from the bucket.
+
+        Parameters
+        ----------
+            cost : int
+                Number of requests about to be sent.
+            priority : str
+                'high' or 'low'; low priority requests may not use the reserve.
+            block : bool
+                Wait for the tokens rather than returning False.
+
+        Returns
+        -------
+            acquired : bool
+                Whether the tokens were taken.
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                wait = self._delay(now, cost, priority)
+                if wait <= 0:
+                    self.tokens -= cost
+                    self.remaining -= cost
+                    return True
+            if not block:
+                return False
+            logging.info(f"Pacing GitHub requests: waiting {wait:.1f}s for the rate limit budget.")
+            self.sleep(wait)
+
+    def update(self, remaining: int, limit: int, reset_time: float) -> None:
+        """
+        Reconcile the budget with the values reported by GitHub.
+
+        Parameters
+        ----------
+            remaining : int
+                Requests left in the current window.
+            limit : int
+                Number of requests allowed per window.
+            reset_time : float
+                Epoch time at which the current window resets.
+
+        Returns
+        -------
+            None
+        """
+        with self._lock:
+            if limit > 0:
+                self.limit = limit
+            if remaining >= 0:
+                self.remaining = remaining
+            if reset_time:
+                self.reset_time = float(reset_time)
+            if self.remaining <= 0:
+                self.hold_until = max(self.hold_until, self.reset_time)
+
+    def update_from_headers(self, headers: dict) -> None:
+        """
+        Reconcile the budget with the rate limit headers of a response.
+
+        Parameters
+        ----------
+            headers : dict
+                Response headers (e.g. from a github.GithubException).
+
+        Returns
+        -------
+            None
+        """
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        self.update(
+            int(headers.get("x-ratelimit-remaining", -1)),
+            int(headers.get("x-ratelimit-limit", -1)),
+            float(headers.get("x-ratelimit-reset", 0)),
+        )
+        if "retry-after" in headers:
+            with self._lock:
+                self.hold_until = max(
+                    self.hold_until, self.clock() + float(headers["retry-after"])
+                )
@@ -0,0 +1,281 @@
+"""
+Module to contain a stabilization layer between agent policies and actuation.
+
+Every applied action costs a commit and a pod restart, which hurts the data
+plane more than a slightly off size does. ActionStabilizer drops changes that
+are too small to be worth a rollout (dead-bands), that come too soon after the
+previous change of the same target (minimum dwell time), or that would exceed
+a budget of changes per hour.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+# Multipliers of the Kubernetes quantity suffixes.
+QUANTITY_SUFFIXES = {
+    "m": 1e-3,
+    "": 1.0,
+    "k": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "Ki": 2**10,
+    "Mi": 2**20,
+    "Gi": 2**30,
+    "Ti": 2**40,
+}
+
+_QUANTITY = re.compile(r"^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(m|k|M|G|T|Ki|Mi|Gi|Ti)?\s*$")
+
+
+def parse_quantity(value) -> float:
+    """
+    Convert a Kubernetes quantity (e.g. '250m', '512Mi', 2) to a number.
+
+    Parameters
+    ----------
+        value : str or number
+            Quantity to convert.
+
+    Returns
+    -------
+        number : float
+            Value of the quantity in base units (cores, bytes), or None if value is not a quantity.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _QUANTITY.match(str(value))
+    if match is None:
+        return None
+    return float(match.group(1)) * QUANTITY_SUFFIXES[match.group(2) or ""]
+
+
+class ActionStabilizer:
+    """
+    Hysteresis and change budget applied to requested actions before they are actuated.
+
+    A change to a target is let through only if all of the following hold:
+        - it differs from the last change let through for that target by more
+          than the dead-bands: for numeric values (including quantities such as
+          '250m' or '512Mi'), by more than relative_band times the last value and
+          more than the absolute band of the resource; other values must differ;
+        - the last change of the target is at least min_dwell seconds old, unless
+          a numeric value changes by more than urgent_band (relative), e.g. limits
+          that must grow now; changes of other values (e.g. a Small/Large sizing)
+          always wait for min_dwell;
+        - fewer than max_changes_per_hour changes were let through in the last hour.
+
+    The first change seen for a target only counts against the budget.
+
+    Attributes
+    ----------
+        relative_band : float
+            Relative change below which numeric values are considered unchanged.
+        absolute_bands : dict
+            Absolute change, in base units, below which the values of a resource
+            key (e.g. 'cpu', 'memory') are considered unchanged.
+        min_dwell : float
+            Minimum time in seconds between two changes of the same target.
+        urgent_band : float
+            Relative change above which min_dwell is waived (None to never waive it).
+        max_changes_per_hour : int
+            Budget of changes let through per rolling hour (None for no budget).
+        applied : dict
+            Last change let through and its time, for each target.
+
+    Methods
+    -------
+        allow(action_type:str, requested_actions:dict, value_file=None, record=True) -> bool:
+            Decide whether one change is actuated, recording it if so.
+
+        record(action_type:str, requested_actions:dict, value_file=None):
+            Record a change as actuated.
+
+        filter_batch(batched_actions:list, record=True) -> list:
+            Keep the changes of a batch that may be actuated.
+
+        record_batch(batched_actions:list):
+            Record every change of an actuated batch.
+    """
+
+    def __init__(
+        self,
+        relative_band=0.1,
+        absolute_bands=None,
+        min_dwell=1800,
+        urgent_band=0.5,
+        max_changes_per_hour=None,
+        clock=time.time,
+    ):
+        """
+        Parameters
+        ----------
+            relative_band : float
+                Relative change below which numeric values are considered unchanged.
+            absolute_bands : dict
+                Absolute change below which the values of a resource key are considered unchanged
+                (defaults to 50 millicores of cpu and 32Mi of memory).
+            min_dwell : float
+                Minimum time in seconds between two changes of the same target.
+            urgent_band : float
+                Relative change above which min_dwell is waived (None to never waive it).
+            max_changes_per_hour : int
+                Budget of changes let through per rolling hour (None for no budget).
+            clock : callable
+                Returns the current epoch time in seconds.
+        """
+        self.relative_band = relative_band
+        self.absolute_bands = (
+            {"cpu": 0.05, "memory": 32 * 2**20} if absolute_bands is None else dict(absolute_bands)
+        )
+        self.min_dwell = min_dwell
+        self.urgent_band = urgent_band
+        self.max_changes_per_hour = max_changes_per_hour
+        self.clock = clock
+        self.applied = {}
+        self._changes = deque()
+        self._lock = threading.Lock()
+
+    def _change(self, old, new, key=None) -> tuple:
+        """
+        Return whether the change from old to new is beyond the dead-bands, and
+        its largest relative numeric change (0 for non numeric changes, so that
+        they are never urgent).
+        """
+        if isinstance(old, dict) and isinstance(new, dict):
+            changes = [self._change(old.get(k), new.get(k), k) for k in set(old) | set(new)]
+            return (
+                any(changed for changed, _ in changes),
+                max([relative for changed, relative in changes if changed], default=0.0),
+            )
+        old_number, new_number = parse_quantity(old), parse_quantity(new)
+        if old_number is None or new_number is None:
+            return old != new, 0.0
+        delta = abs(new_number - old_number)
+        if delta <= self.absolute_bands.get(key, 0.0):
+            return False, 0.0
+        relative = delta / abs(old_number) if old_number else float("inf")
+        return relative > self.relative_band, relative
+
+    def _target(self, action_type, requested_actions, value_file) -> tuple:
+        return (value_file, action_type, requested_actions.get("target_pod"))
+
+    def _check(self, action_type, requested_actions, value_file, now, planned=0) -> bool:
+        while self._changes and self._changes[0] <= now - 3600:
+            self._changes.popleft()
+
+        target = self._target(action_type, requested_actions, value_file)
+        if target in self.applied:
+            last, last_time = self.applied[target]
+            changed, relative = self._change(last, requested_actions)
+            if not changed:
+                logging.info(f"Suppressing {action_type} change of {target[2]}: within the dead-band.")
+                return False
+            urgent = self.urgent_band is not None and relative > self.urgent_band
+            if now - last_time < self.min_dwell and not urgent:
+                logging.info(f"Suppressing {action_type} change of {target[2]}: minimum dwell time not reached.")
+                return False
+
+        if (
+            self.max_changes_per_hour is not None
+            and len(self._changes) + planned >= self.max_changes_per_hour
+        ):
+            logging.warning(f"Suppressing {action_type} change of {target[2]}: hourly change budget spent.")
+            return False
+        return True
+
+    def record(self, action_type: str, requested_actions: dict, value_file=None) -> None:
+        """
+        Record a change as actuated: it becomes the target's current state, and
+        counts against the change budget.
+
+        Parameters
+        ----------
+            action_type : str
+                Name of the action type (e.g. 'lim_req', 'upf_sizing').
+            requested_actions : dict
+                Requested actions for the action type.
+            value_file : str
+                Value file the change went to, if several are updated.
+
+        Returns
+        -------
+            None
+        """
+        with self._lock:
+            now = self.clock()
+            self.applied[self._target(action_type, requested_actions, value_file)] = (requested_actions, now)
+            self._changes.append(now)
+
+    def allow(self, action_type: str, requested_actions: dict, value_file=None, record=True) -> bool:
+        """
+        Decide whether a change is actuated.
+
+        Parameters
+        ----------
+            action_type : str
+                Name of the action type (e.g. 'lim_req', 'upf_sizing').
+            requested_actions : dict
+                Requested actions for the action type.
+            value_file : str
+                Value file the change goes to, if several are updated.
+            record : bool
+                Record an allowed change right away; otherwise call record once
+                it is actuated, so that a failed push is not taken as applied.
+
+        Returns
+        -------
+            allowed : bool
+                Whether the change should be actuated.
+        """
+        with self._lock:
+            allowed = self._check(action_type, requested_actions, value_file, self.clock())
+        if allowed and record:
+            self.record(action_type, requested_actions, value_file)
+        return allowed
+
+    def filter_batch(self, batched_actions: list, record=True) -> list:
+        """
+        Keep the changes of a batch that may be actuated (see
+        ActionHandler.fetch_update_push_batch for the format of a batch).
+
+        Parameters
+        ----------
+            batched_actions : list of dict
+                Changes requested by the agent.
+            record : bool
+                Record the allowed changes right away; otherwise call record_batch
+                once they are actuated.
+
+        Returns
+        -------
+            allowed_actions : list of dict
+                Changes to actuate, in order.
+        """
+        with self._lock:
+            now = self.clock()
+            allowed = []
+            for change in batched_actions:
+                if self._check(
+                    change["action_type"],
+                    change["requested_actions"],
+                    change.get("value_file"),
+                    now,
+                    planned=len(allowed),
+                ):
+                    allowed.append(change)
+        if record:
+            self.record_batch(allowed)
+        return allowed
+
+    def record_batch(self, batched_actions: list) -> None:
+        """
+        Record every change of an actuated batch (see record).
+        """
+        for change in batched_actions:
+            self.record(change["action_type"], change["requested_actions"], change.get("value_file"))
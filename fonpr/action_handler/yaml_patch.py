@@ -0,0 +1,287 @@
+"""
+Module to contain helpers for patching value.yaml files in place.
+
+Rather than loading a document, modifying a copy of it and dumping it back out,
+the helpers here locate the target nodes in the composed node graph of the
+original text and splice new values into that text. Everything outside the
+target nodes (key order, formatting, comments) is left untouched, so pushes
+produce minimal diffs.
+"""
+
+import yaml
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+# Prefer the libyaml backed loader when PyYAML was built with it.
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(text: str):
+    """
+    Parse a YAML document into Python objects with the fastest available loader.
+
+    Parameters
+    ---------
+        text : str
+            YAML document.
+
+    Returns
+    -------
+        values : Any
+            Python representation of the document.
+    """
+    return yaml.load(text, Loader=Loader)
+
+
+def compose_yaml(text: str) -> tuple:
+    """
+    Parse a YAML document once, returning both its Python representation and
+    its node graph. The node graph keeps the position of every node in the
+    original text and can be handed to patch_yaml_text to avoid parsing again.
+
+    Parameters
+    ---------
+        text : str
+            YAML document.
+
+    Returns
+    -------
+        values : Any
+            Python representation of the document.
+        root : yaml.Node
+            Root of the composed node graph (None for an empty document).
+    """
+    loader = Loader(text)
+    try:
+        root = loader.get_single_node()
+        values = loader.construct_document(root) if root is not None else None
+    finally:
+        loader.dispose()
+    return values, root
+
+
+def get_path(values, path: tuple):
+    """
+    Return the value found at path within a Python representation of a document.
+
+    Parameters
+    ---------
+        values : dict or list
+            Python representation of a document.
+        path : tuple
+            Sequence of mapping keys and sequence indices.
+
+    Returns
+    -------
+        value : Any
+            Value found at path.
+    """
+    for key in path:
+        values = values[key]
+    return values
+
+
+def set_path(values, path: tuple, value) -> None:
+    """
+    Set the value at path within a Python representation of a document, in place.
+    Every element of path but the last must already exist.
+
+    Parameters
+    ---------
+        values : dict or list
+            Python representation of a document.
+        path : tuple
+            Sequence of mapping keys and sequence indices.
+        value : Any
+            New value.
+    """
+    get_path(values, path[:-1])[path[-1]] = value
+
+
+def patch_yaml_text(text: str, patches: list, root=None, verify=True) -> str:
+    """
+    Apply patches to a YAML document, changing only the text of the target nodes.
+
+    Every element of a patch path but the last must exist in the document; a
+    missing last key is appended to its (block style) parent mapping, mirroring
+    the semantics of set_path.
+
+    Parameters
+    ---------
+        text : str
+            YAML document.
+        patches : list of tuple
+            (path, value) pairs, where path is a tuple of mapping keys and
+            sequence indices. A later patch on the same path supersedes an earlier one.
+        root : yaml.Node
+            Node graph of text as returned by compose_yaml; composed here if not supplied.
+        verify : bool
+            Reload the patched document and check every patched path holds its new value.
+
+    Returns
+    -------
+        patched_text : str
+            YAML document with the patches applied.
+    """
+    if root is None:
+        _, root = compose_yaml(text)
+
+    # Later patches on the same path win.
+    latest = {}
+    for path, value in patches:
+        latest[tuple(path)] = value
+
+    edits = []
+    for path, value in latest.items():
+        _collect_path_edits(text, root, path, value, edits)
+
+    # Splice from the end of the document so earlier offsets stay valid.
+    edits.sort(key=lambda edit: (edit[0], edit[1]))
+    for previous, current in zip(edits, edits[1:]):
+        if current[0] < previous[1]:
+            raise ValueError("Patches target overlapping nodes.")
+    patched_text = text
+    for start, end, replacement in reversed(edits):
+        patched_text = patched_text[:start] + replacement + patched_text[end:]
+
+    if verify:
+        patched_values = load_yaml(patched_text)
+        for path, value in latest.items():
+            if get_path(patched_values, path) != value:
+                raise ValueError(f"Patched document does not hold the new value at {path}.")
+
+    return patched_text
+
+
+def _collect_path_edits(text, root, path, value, edits) -> None:
+    """
+    Walk the node graph along path and record the text edits setting value there.
+    """
+    node, key_node = root, None
+    for depth, key in enumerate(path):
+        if isinstance(node, MappingNode):
+            for candidate_key, candidate_value in node.value:
+                if candidate_key.value == str(key):
+                    key_node, node = candidate_key, candidate_value
+                    break
+            else:
+                if depth == len(path) - 1:
+                    edits.append(_insert_key(text, node, key, value))
+                    return
+                raise KeyError(f"Path {path} not found: missing key {key!r}.")
+        elif isinstance(node, SequenceNode) and isinstance(key, int):
+            if not -len(node.value) <= key < len(node.value):
+                raise KeyError(f"Path {path} not found: index {key} out of range.")
+            key_node, node = None, node.value[key]
+        else:
+            raise KeyError(f"Path {path} not found: cannot index {node.tag} with {key!r}.")
+
+    _collect_node_edits(text, node, key_node, value, edits)
+
+
+def _collect_node_edits(text, node, key_node, value, edits) -> None:
+    """
+    Record the text edits setting node to value, descending into collections
+    whose shape is unchanged so that comments within them are preserved.
+    """
+    if (
+        isinstance(node, MappingNode)
+        and isinstance(value, dict)
+        and value
+        and len(node.value) == len(value)
+        and {key.value for key, _ in node.value} == {str(key) for key in value}
+    ):
+        by_key = {str(key): item for key, item in value.items()}
+        for child_key, child_node in node.value:
+            _collect_node_edits(text, child_node, child_key, by_key[child_key.value], edits)
+        return
+
+    if (
+        isinstance(node, SequenceNode)
+        and isinstance(value, list)
+        and value
+        and len(node.value) == len(value)
+    ):
+        for child_node, item in zip(node.value, value):
+            _collect_node_edits(text, child_node, None, item, edits)
+        return
+
+    start, end = node.start_mark.index, _node_end(node)
+    if isinstance(node, ScalarNode) and not node.value and not node.style and key_node is not None:
+        # An empty value: write it right after the colon following its key.
+        start = end = text.index(":", key_node.end_mark.index) + 1
+        edits.append((start, end, " " + _render_flow(value)))
+        return
+
+    if isinstance(node, ScalarNode) and not isinstance(value, (dict, list)):
+        # Keep the quoting style of string scalars.
+        quoted = isinstance(value, str) and node.style in ("'", '"')
+        replacement = _render_flow(value, style=node.style if quoted else None)
+        if replacement != text[start:end]:
+            edits.append((start, end, replacement))
+        return
+
+    block = isinstance(node, (MappingNode, SequenceNode)) and not node.flow_style
+    if block and isinstance(value, (dict, list)) and value:
+        replacement = _render_block(value, node.start_mark.column)
+    else:
+        replacement = _render_flow(value)
+    edits.append((start, end, replacement))
+
+
+def _insert_key(text, node, key, value) -> tuple:
+    """
+    Return the text edit appending key: value to a block style mapping node.
+    """
+    if node.flow_style or not node.value:
+        raise KeyError(f"Cannot add key {key!r} to a flow style or empty mapping.")
+    column = node.start_mark.column
+    if isinstance(value, (dict, list)) and value:
+        entry = f"{_render_flow(key)}:\n{' ' * (column + 2)}{_render_block(value, column + 2)}"
+    else:
+        entry = f"{_render_flow(key)}: {_render_flow(value)}"
+
+    # Insert after the end of the line holding the mapping's last value,
+    # so any trailing comment stays where it was.
+    end_of_line = text.find("\n", _node_end(node))
+    if end_of_line == -1:
+        return (len(text), len(text), f"\n{' ' * column}{entry}")
+    return (end_of_line, end_of_line, f"\n{' ' * column}{entry}")
+
+
+def _node_end(node) -> int:
+    """
+    Return the offset just past the last character belonging to node.
+    Block collections end after their last value rather than at the start of
+    the next token, which would swallow any following comments.
+    """
+    while isinstance(node, (MappingNode, SequenceNode)) and not node.flow_style and node.value:
+        node = node.value[-1][1] if isinstance(node, MappingNode) else node.value[-1]
+    return node.end_mark.index
+
+
+def _render_flow(value, style=None) -> str:
+    """
+    Render value as a single line of YAML.
+    """
+    rendered = yaml.dump(
+        value,
+        Dumper=yaml.SafeDumper,
+        default_flow_style=True,
+        default_style=style,
+        sort_keys=False,
+        width=float("inf"),
+    )
+    # Scalars are dumped as a document with an explicit end marker.
+    if rendered.endswith("\n...\n"):
+        rendered = rendered[: -len("\n...\n")]
+    return rendered.rstrip("\n")
+
+
+def _render_block(value, column) -> str:
+    """
+    Render a non-empty collection in block style, starting at the given column.
+    """
+    rendered = yaml.dump(
+        value, Dumper=yaml.SafeDumper, default_flow_style=False, sort_keys=False
+    ).rstrip("\n")
+    return rendered.replace("\n", "\n" + " " * column)
@@ -17,9 +17,11 @@ class PromClient:
     Attributes:
         prom_endpoint: String
             "ip:port" for the prometheus server endpoint.
+        timeout: float
+            Time in seconds after which a request attempt to the server is abandoned.
     """
 
-    def __init__(self, prom_endpoint="http://10.0.101.236:9090"):
+    def __init__(self, prom_endpoint="http://10.0.101.236:9090", timeout=30):
         """
         Initalize the instance based on prometheus server endpoint.
 
@@ -28,13 +30,18 @@ class PromClient:
         ---------
             prom_endpoint: string (formatted typically as http://ip:port)
                 Ip address or host name from where the data originates.
+            timeout: float
+                Time in seconds after which a request attempt to the server is abandoned;
+                once its few retries have timed out too, the query raises a
+                requests.RequestException, so that a slow server cannot hang a cycle.
 
         Returns
         ---------
             None
         """
         self.prom_endpoint = prom_endpoint
-        self.prom = PrometheusConnect(url=prom_endpoint)
+        self.timeout = timeout
+        self.prom = PrometheusConnect(url=prom_endpoint, timeout=timeout)
         self.queries = []
         self.query_results = []
 
@@ -66,7 +73,7 @@ class PromClient:
                 Ip address or host name from where the data originates.
         """
         self.prom_endpoint = new_prom_endpoint
-        self.prom = PrometheusConnect(url=self.prom_endpoint)
+        self.prom = PrometheusConnect(url=self.prom_endpoint, timeout=self.timeout)
 
     def set_queries_by_function(self, query_building_function):
         """
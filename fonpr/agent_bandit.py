@@ -0,0 +1,197 @@
+"""
+Module to contain the bandit agent: it sizes the upf with a discounted
+multi-armed bandit (utilities.DiscountedBandit), using the same throughput,
+cost, reward and action as the BBO agent. It imports neither Vizier nor JAX,
+so its container starts in under a second, and a decision takes microseconds.
+"""
+import argparse
+import logging
+import time
+
+import sys
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from utilities import DiscountedBandit, CycleScheduler
+from upf_sizing import reward_function, live_slot, simulator_slot
+from simulation import UpfSimulator, load_trace
+
+
+def load_bandit(path, arms=("Small", "Large"), **options) -> DiscountedBandit:
+    """
+    Restores the bandit statistics from its state file, or starts from none if there is no file.
+    The settings are always those given: restored settings that differ are overridden, with a warning.
+
+    Parameters
+    ----------
+        path : str
+            Path of the state file (None for no persistence).
+        arms : tuple
+            Sizes to choose from; they must match those of the state file.
+        **options
+            Other DiscountedBandit arguments.
+
+    Returns
+    -------
+        bandit : DiscountedBandit
+            Bandit with the given settings and the restored statistics.
+    """
+    bandit = DiscountedBandit(arms, **options)
+    if not (path and os.path.exists(path)):
+        return bandit
+
+    restored = DiscountedBandit.load(path)
+    if restored.arms != bandit.arms:
+        excp = ValueError(f"The state file {path} holds arms {restored.arms}, not {bandit.arms}.")
+        logging.error(excp)
+        raise excp
+    for setting in ("strategy", "discount", "exploration", "min_scale"):
+        if getattr(restored, setting) != getattr(bandit, setting):
+            logging.warning(
+                f"Overriding the restored {setting} {getattr(restored, setting)} with {getattr(bandit, setting)}."
+            )
+    bandit.counts, bandit.sums, bandit.squares = restored.counts, restored.sums, restored.squares
+    bandit.pending = restored.pending
+    logging.info(f"Restored the bandit from {path}: mean rewards {bandit.means()}, pending {bandit.pending}")
+    return bandit
+
+
+def execute_bandit_cycle(bandit, slot, wait_time=3600, state_path=None, cancel=None) -> str:
+    """
+    Credits the size applied on the previous cycle with the reward observed
+    since, then selects and applies the next size. The state is saved after
+    every change, so a restarted agent neither loses rewards nor credits them
+    to the wrong size.
+
+    Parameters
+    ----------
+        bandit : DiscountedBandit
+            Bandit choosing the size.
+        slot : dict
+            UPF to size (see upf_sizing.live_slot and upf_sizing.simulator_slot).
+        wait_time : float
+            Time in seconds between two cycles, which the throughput is averaged over.
+        state_path : str
+            Path of the state file (None for no persistence).
+        cancel : threading.Event
+            Set when the cycle is cancelled; a cancelled cycle applies no size.
+
+    Returns
+    -------
+        size : str
+            Size applied (None if the cycle was cancelled).
+    """
+    if bandit.pending is not None:
+        throughput = slot["observe_throughput"](wait_time)
+        reward = reward_function(throughput, slot["observe_cost"](bandit.pending))
+        logging.info(f"{slot['name']}: size {bandit.pending} earned reward {reward}")
+        bandit.update(bandit.pending, reward)
+        if state_path:
+            bandit.save(state_path)
+
+    if cancel is not None and cancel.is_set():
+        logging.warning("Cycle cancelled; no size applied.")
+        return None
+
+    start = time.perf_counter()
+    size = bandit.select()
+    logging.info(f"{slot['name']}: selected size {size} in {(time.perf_counter() - start) * 1e6:.0f}us")
+    # Wait for the size to be applied, so that the reward is not credited to a size that never ran.
+    slot["apply_size"](size).result()
+    bandit.pending = size
+    if state_path:
+        bandit.save(state_path)
+    return size
+
+
+if __name__ == "__main__":
+    """
+    Bandit agent logic: every hour, reward the size applied with the profit it made, and apply the next size the bandit selects.
+    """
+
+    # Instantiate some logging
+    logging.basicConfig(level=logging.INFO)
+    logging.info("Launching FONPR Bandit Agent")
+
+    parser = argparse.ArgumentParser(
+        prog="FONPR_Bandit_Agent",
+        description="Sizes the upf with a discounted multi-armed bandit.",
+    )
+    parser.add_argument(
+        "--strategy",
+        type=str,
+        default="thompson",
+        choices=["thompson", "ucb"],
+        required=False,
+        help="How the bandit trades exploration for exploitation.",
+    )
+    parser.add_argument(
+        "--discount",
+        type=float,
+        default=0.98,
+        required=False,
+        help="Weight kept by past rewards at every cycle; lower values follow changing load faster, 1.0 never forgets.",
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default="/data/bandit.json",
+        required=False,
+        help="File the bandit state is saved to after every cycle and restored from on start (settings given on the command line win); empty for no persistence, which is always the case with --simulate_trace.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=60,
+        required=False,
+        help="Time in minutes between two sizing decisions.",
+    )
+    parser.add_argument(
+        "--num_cycles",
+        type=int,
+        default=None,
+        required=False,
+        help="Number of cycles to run (runs until stopped by default).",
+    )
+    parser.add_argument(
+        "--simulate_trace",
+        type=str,
+        default=None,
+        required=False,
+        help="Run in simulated time against this csv throughput trace (epoch time, bytes per second) instead of the live cluster.",
+    )
+    args = parser.parse_args()
+
+    #################DEFINE ADVISOR AND ACTION HANDLER PARAMETERS#################
+
+    # prometheus server endpoint to gather data from
+    prom_endpoint = "http://10.0.114.131:9090"
+
+    # github yml file url that controls app to be modified
+    gh_url = "https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml"
+
+    wait_time = args.interval * 60
+    ############################################################################
+
+    # A simulation starts afresh and never touches the state of the live bandit.
+    state_path = None if args.simulate_trace else args.state
+    if state_path:
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    bandit = load_bandit(state_path, strategy=args.strategy, discount=args.discount)
+
+    if args.simulate_trace:
+        times, load = load_trace(args.simulate_trace)
+        simulator = UpfSimulator(times, load)
+        slot = simulator_slot(simulator)
+        scheduler = CycleScheduler(wait_time, clock=simulator.time, sleep=simulator.sleep)
+    else:
+        slot = live_slot(prom_endpoint, gh_url)
+        scheduler = CycleScheduler(wait_time)
+
+    scheduler.run(
+        lambda cancel: execute_bandit_cycle(bandit, slot, wait_time, state_path, cancel),
+        args.num_cycles,
+    )
+    logging.info(f"Mean rewards: {bandit.means()}")
@@ -1,8 +1,13 @@
 """
 Module to contain respons agent. it is also the module that runs as a container in eks.
 """
-import time
+import argparse
 import logging
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import yaml
 
 import sys
 import os
@@ -11,10 +16,19 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 from advisors import PromClient
-from utilities import prom_network_upf_query, ec2_cost_calculator
-from action_handler import ActionHandler, get_token
+from utilities import prom_upf_history_queries, sizing_windows, CycleScheduler
+from upf_sizing import (
+    reward_function,
+    get_throughput,
+    get_infra_cost,
+    update_yml,
+    live_slot,
+    simulator_slot,
+)
+from simulation import UpfSimulator, load_trace
 
 from vizier.service import clients
+from vizier.service import servers
 from vizier.service import pyvizier as vz
 
 from absl.flags import FLAGS
@@ -22,108 +36,335 @@ from absl.flags import FLAGS
 FLAGS([""])
 
 
-def reward_function(throughput, infra_cost) -> float:
+def start_datastore(path: str):
     """
-    Calculates the reward for the agent to receive based off of throughput and infrastructure cost.
+    Starts a local Vizier service backed by a SQLite file, and points the Vizier
+    clients at it, so studies and their trials survive a restart of the agent.
 
     Parameters
     ----------
-        throughput : float
-            The average network transmitted for the last hour from UPF pod.
-        infra_cost : float
-            The cost of running the ec2 sizing for the UPF pod.
+        path : str
+            Path of the SQLite database file (created if missing).
 
     Returns
     -------
-        avg_upf_network: float
-            The average network transmitted for the last hour from UPF pod.
+        server : vizier.service.servers.DefaultVizierServer
+            Running Vizier service; keep a reference to it for the life of the agent.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    server = servers.DefaultVizierServer(database_url=f"sqlite:///{os.path.abspath(path)}")
+    clients.environment_variables.server_endpoint = server.endpoint
+    logging.info(f"Vizier datastore: {path}")
+    return server
 
-    Notes
-    -------
-    How the math works:
-    (1) Throughput is in bytes/second.
-    (2) Cost conversion translates dollars to bytes.
-    (3) Multiplying 1 and 2: Bytes/Second * Dollars/Bytes --> Dollars/Second.
-    (4) Now we have to convert the Dollers/Second to Dollars/Hour by using a seconds_to_hours_conversion variable.
-    (5) Subtract the result of (4) (which is revenue) by the infra cost (Dollars/Hour) to yield profit.
+
+def build_study(study_id="smallProblemUPFSizing"):
     """
+    Creates (or loads) the Vizier study searching for the best upf sizing.
 
-    # All cost is calculated on an hourly basis
-    # Throughput must be in bytes per second.
-    # The cost conversion converts 1 gigabyte to 3.33$(https://newsdirect.com/news/mobile-phone-data-costs-7x-more-in-the-us-than-the-uk-158885004?category=Communications).
-    cost_conversion = 3.33 / (10**9)  # 3.33 dollars per 10^9 bytes
-    seconds_to_hours_conversion = 3600 / 1  # 3600 seconds per
+    Parameters
+    ----------
+        study_id : str
+            Identifier of the study.
 
-    revenue = throughput * cost_conversion * seconds_to_hours_conversion
+    Returns
+    -------
+        study : vizier.service.clients.Study
+            Study maximizing the reward over the categorical size parameter.
+    """
+    problem = vz.ProblemStatement()
 
-    reward = revenue - infra_cost
+    problem.search_space.root.add_categorical_param("size", ["Small", "Large"])
+    problem.metric_information.append(
+        vz.MetricInformation(name="reward", goal=vz.ObjectiveMetricGoal.MAXIMIZE)
+    )
 
-    return reward
+    study_config = vz.StudyConfig.from_problem(problem)
+    study_config.algorithm = "GAUSSIAN_PROCESS_BANDIT"
+    # Lets trials reporting intermediate measurements be stopped early.
+    study_config.automated_stopping_config = vz.AutomatedStoppingConfig.default_stopping_spec()
 
+    return clients.Study.from_study_config(study_config, owner="respons", study_id=study_id)
 
-def get_throughput(prom_endpoint="http://10.0.104.52:9090"):
+
+def seed_study(study, windows: list) -> int:
     """
-    Calculates the average network bytes transmitted from the UPF pod for the last hour.
+    Adds past windows during which a single size was active to a study as
+    completed trials, rewarded with reward_function as live trials are, so that
+    the first live suggestions are already informed. Seeding is idempotent: a
+    window already in the study (from an earlier seeding) is skipped.
+
+    Parameters
+    ----------
+        study : vizier.service.clients.Study
+            Study to seed.
+        windows : list of dict
+            Windows with 'start' (epoch seconds), 'size' and 'throughput' (average
+            bytes/second) entries, e.g. from utilities.sizing_windows.
 
     Returns
     -------
-        avg_upf_network: float
-            The average network transmitted for the last hour from UPF pod.
+        seeded : int
+            Number of trials added.
     """
-
-    # Set the prometheus client endpoint for the prometheus server in Respons-Nuances.
-    prom_client_advisor = PromClient(prom_endpoint)
-    prom_client_advisor.set_queries_by_function(prom_network_upf_query)
-    avg_upf_network = prom_client_advisor.run_queries()
-    avg_upf_network = float(avg_upf_network[0][0]["value"][1])
-    return avg_upf_network
-
-
-def get_infra_cost(size="Large"):
+    seeded_windows = {
+        trial.materialize().metadata.ns("fonpr").get("seed_window") for trial in study.trials()
+    }
+    seeded = 0
+    for window in windows:
+        key = f"{int(window['start'])}:{window['size']}"
+        if key in seeded_windows:
+            continue
+        reward = reward_function(window["throughput"], get_infra_cost(window["size"]))
+        trial = vz.Trial(parameters={"size": window["size"]})
+        trial.metadata.ns("fonpr")["seed_window"] = key
+        trial.complete(vz.Measurement({"reward": reward}))
+        # The client has no public call to add a completed trial.
+        study._add_trial(trial)
+        seeded_windows.add(key)
+        seeded += 1
+    logging.info(f"Seeded the study with {seeded} past windows ({len(windows) - seeded} already in it).")
+    return seeded
+
+
+def history_windows(prom_endpoint, lookback="30d", pod_regex="open5gs-upf.*") -> list:
     """
-    Calculates the hourly cost of the infrastructure based off the categorical value of size.
+    Reads the past hourly windows during which a single upf size was active from Prometheus.
 
     Parameters
     ----------
-        size : str
-            Specify the nodegroup sizing for upf.
+        prom_endpoint : str
+            IP and port for the Prometheus server.
+        lookback : str
+            How far back to look (e.g. '30d').
+        pod_regex : str
+            Regular expression matching the name of the UPF pod.
+
     Returns
     -------
-        cost: int
-            The hourly cost of running the ec2 sizing for the UPF pod.
+        windows : list of dict
+            Windows as returned by utilities.sizing_windows.
     """
-
-    if size == "Small":
-        return ec2_cost_calculator("t3.medium")
-    if size == "Large":
-        return ec2_cost_calculator("m4.large")
+    prom_client_advisor = PromClient(prom_endpoint)
+    prom_client_advisor.set_queries_by_list(
+        prom_upf_history_queries(lookback, "1h", "5m", pod_regex)
+    )
+    throughput_result, sizing_result = prom_client_advisor.run_queries()
+    return sizing_windows(throughput_result, sizing_result, window=3600, resolution=300)
 
 
-def update_yml(
-    size="Large",
-    gh_url="https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml",
-    dir_name="napp",
-) -> None:
+def resume_trials(study, slots) -> tuple:
     """
-    Updates the controlling document in its remote repo using the action handler.
+    Finds the trials of a study left in progress by a previous run of the agent.
 
     Parameters
     ----------
-        size : str
-            Specify the nodegroup sizing for upf.
-        gh_url : str
-            URL pointing to the target value.yaml file in GitHub (e.g. 'https://github.com/DISHDevEx/openverso-charts/blob/matt/gh_api_test/charts/respons/test.yaml')
-        dir_name : str
-            Name of first directory in path to the yaml file (empty string if the file is at the root of the repo)
+        study : vizier.service.clients.Study
+            Study to resume.
+        slots : list of dict
+            Slots of this run (see run_study); trials are matched to slots by name.
+
+    Returns
+    -------
+        pending : dict
+            (trial, size, future, applied_at) of the trial running on each slot index.
+        unapplied : list
+            Active trials that were suggested but never applied to a slot.
+        started : int
+            Number of trials already completed or applied to a slot (seeded trials excluded).
     """
+    slot_indices = {slot["name"]: index for index, slot in enumerate(slots)}
+    pending, unapplied, started = {}, [], 0
+    for trial in study.trials():
+        materialized = trial.materialize()
+        metadata = materialized.metadata.ns("fonpr")
+        if materialized.status != vz.TrialStatus.ACTIVE:
+            started += "seed_window" not in metadata
+            continue
+        index = slot_indices.get(metadata.get("slot"))
+        if "applied_at" in metadata and index is not None and index not in pending:
+            # Already applied: the slot is running it.
+            applied = Future()
+            applied.set_result(None)
+            pending[index] = (trial, trial.parameters["size"], applied, float(metadata["applied_at"]))
+            started += 1
+        else:
+            unapplied.append(trial)
+    return pending, unapplied, started
+
+
+def run_study(
+    study,
+    slots,
+    num_trials=15,
+    scheduler=None,
+    wait_time=3600,
+    clock=time.time,
+    measurement_interval=600,
+) -> list:
+    """
+    Runs the trials of a study on slots. Every slot runs one trial at a time:
+    a suggested size is applied to it and observed for wait_time, then the
+    reward is reported to the study and the slot takes the next suggestion.
+    N slots cut the study time by about N.
+
+    Every measurement_interval (one scheduler tick), the running trials report
+    an intermediate reward, computed over the time since they were applied, and
+    ask Vizier whether to stop early; a trial that is clearly worse than the
+    others is completed with its intermediate reward, freeing its slot within
+    minutes rather than an hour. Ticks are fixed-rate, so measurements keep
+    their cadence however long observing and pushing take.
+
+    Slots are measured in parallel, and each measurement is reported to the
+    study as soon as it is available; a slot whose final measurement fails
+    loses its trial (it is completed as infeasible) without affecting the
+    other slots.
+
+    The environment is injected through the slots, so the same loop runs
+    against the live cluster (live_slot) or simulators (simulator_slot).
+
+    The study is resumed where it stopped (e.g. with a persistent datastore, see
+    start_datastore): num_trials counts the trials already run, trials still
+    being measured on a slot when the agent stopped carry on from the time they
+    were applied, and trials suggested but never applied are applied before any
+    new suggestion is asked for. No trial is paid for twice.
 
-    # Requested actions is a dictionary specifying the pod to modify, and the sizing for that pod.
-    requested_actions = {"target_pod": "upf", "values": size}
+    Parameters
+    ----------
+        study : vizier.service.clients.Study
+            Study to suggest sizes and record rewards.
+        slots : list of dict
+            Independent environments the trials run on, each with:
+            'name' (str), 'apply_size' (applies a size, returning a future resolving once it is applied),
+            'observe_throughput' (returns the throughput over the last given number of seconds) and
+            'observe_cost' (returns the hourly cost of a size).
+        num_trials : int
+            Number of trials to run.
+        scheduler : CycleScheduler
+            Scheduler of the measurement ticks (defaults to one tick every
+            measurement_interval seconds of real time).
+        wait_time : float
+            Time in seconds each trial is observed for, unless stopped early.
+        clock : callable
+            Returns the current epoch time (simulated time with simulators); the
+            time each trial is applied at is recorded in its metadata.
+        measurement_interval : float
+            Time in seconds between intermediate measurements, when no scheduler is given
+            (wait_time measures each trial once, without early stopping).
 
-    # Update remote repository with requested values.
-    hndl = ActionHandler(get_token(), gh_url, dir_name, requested_actions)
-    hndl.fetch_update_push_upf_sizing()
-    logging.info("Agent update complete!")
+    Returns
+    -------
+        results : list of dict
+            Slot, size, reward and observation time of each completed trial, in completion order.
+    """
+    if scheduler is None:
+        scheduler = CycleScheduler(measurement_interval, deadline=measurement_interval / 2)
+    pending, unapplied, started = resume_trials(study, slots)
+    trials = {"pending": pending, "unapplied": unapplied, "started": started}
+    results = []
+    if pending:
+        # Resumed trials carry on measuring on their own tick grid.
+        now = clock()
+        due = min(
+            applied_at + math.ceil((now - applied_at) / scheduler.interval) * scheduler.interval
+            for _, _, _, applied_at in pending.values()
+        )
+        logging.info(f"Resuming {len(pending)} trials in progress; measuring in {max(0.0, due - now):.0f}s.")
+        scheduler.sleep(max(0.0, due - now))
+    executor = ThreadPoolExecutor(max_workers=len(slots))
+
+    def measure(slot, size, update, window) -> float:
+        update.result()
+
+        # Get the observations for the system to build out reward function.
+        # Build observed throughput.
+        observed_throughput = slot["observe_throughput"](window)
+        logging.info(f"Slot {slot['name']}: observed throughput {observed_throughput}")
+
+        # Build cost.
+        observed_cost = slot["observe_cost"](size)
+        logging.info(f"Slot {slot['name']}: observed cost {observed_cost}")
+
+        # Build reward.
+        return reward_function(observed_throughput, observed_cost)
+
+    def complete(index, suggestion, size, measurement):
+        del trials["pending"][index]
+        suggestion.complete(measurement)
+        results.append(
+            {
+                "slot": slots[index]["name"],
+                "size": size,
+                "reward": measurement.metrics["reward"].value,
+                "elapsed": measurement.elapsed_secs,
+            }
+        )
+
+    def cycle(cancel):
+        logging.info("Executing update cycle.")
+        now = clock()
+        measurements = {}
+        for index, (suggestion, size, update, applied_at) in trials["pending"].items():
+            elapsed = max(now - applied_at, 1.0)
+            measurement = executor.submit(measure, slots[index], size, update, min(elapsed, wait_time))
+            measurements[measurement] = (index, suggestion, size, elapsed)
+
+        for measurement in as_completed(measurements):
+            index, suggestion, size, elapsed = measurements[measurement]
+            final = elapsed >= wait_time - scheduler.interval / 2
+            try:
+                reward = measurement.result()
+            except Exception as excp:
+                logging.error(f"Slot {slots[index]['name']}: measurement failed with the following exception: {excp}")
+                if final:
+                    # The trial cannot be measured any more; an intermediate failure waits for the next tick.
+                    del trials["pending"][index]
+                    suggestion.complete(infeasible_reason=str(excp))
+                continue
+            logging.info(f"Slot {slots[index]['name']}: observed reward {reward} after {elapsed:.0f}s")
+            observation = vz.Measurement(
+                {"reward": reward}, elapsed_secs=elapsed, steps=int(elapsed // scheduler.interval)
+            )
+
+            if final:
+                # Complete the interaction.
+                complete(index, suggestion, size, observation)
+            else:
+                suggestion.add_measurement(observation)
+                if suggestion.check_early_stopping():
+                    logging.info(f"Slot {slots[index]['name']}: stopping the {size} trial early.")
+                    complete(index, suggestion, size, observation)
+
+        if trials["started"] >= num_trials:
+            if not trials["pending"]:
+                scheduler.stop()
+            return
+        if cancel.is_set():
+            return
+
+        # Trials suggested before a restart but never applied go first.
+        free = [index for index in range(len(slots)) if index not in trials["pending"]]
+        count = min(len(free), num_trials - trials["started"])
+        suggestions, trials["unapplied"] = trials["unapplied"][:count], trials["unapplied"][count:]
+        if count > len(suggestions):
+            suggestions += list(study.suggest(count=count - len(suggestions)))
+        for index, suggestion in zip(free, suggestions):
+            size = suggestion.parameters["size"]
+            update = slots[index]["apply_size"](size)
+            applied_at = clock()
+            logging.info(f"Slot {slots[index]['name']}: agent changing upf size to: {size}")
+            # Record where and when the trial runs, so that it can be resumed after a restart.
+            metadata = vz.Metadata()
+            metadata.ns("fonpr").update({"slot": slots[index]["name"], "applied_at": str(applied_at)})
+            suggestion.update_metadata(metadata)
+            trials["pending"][index] = (suggestion, size, update, applied_at)
+            trials["started"] += 1
+
+    try:
+        scheduler.run(cycle)
+    finally:
+        executor.shutdown(wait=False)
+    return results
 
 
 if __name__ == "__main__":
@@ -135,6 +376,68 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     logging.info("Launching FONPR BBO Agent")
 
+    parser = argparse.ArgumentParser(
+        prog="FONPR_BBO_Agent",
+        description="Searches for the best upf sizing with black box optimization.",
+    )
+    parser.add_argument(
+        "--simulate_trace",
+        type=str,
+        default=None,
+        required=False,
+        help="Run the study in simulated time against this csv throughput trace (epoch time, bytes per second) instead of the live cluster.",
+    )
+    parser.add_argument(
+        "--num_trials",
+        type=int,
+        default=15,
+        required=False,
+        help="Number of trials to run.",
+    )
+    parser.add_argument(
+        "--slots",
+        type=str,
+        default=None,
+        required=False,
+        help="Yaml file listing independent UPFs to run trials on in parallel, each a mapping of live_slot arguments (prom_endpoint, gh_url, and optionally dir_name, target_pod, pod_regex, name).",
+    )
+    parser.add_argument(
+        "--num_slots",
+        type=int,
+        default=1,
+        required=False,
+        help="Number of simulated UPFs running trials in parallel, with --simulate_trace.",
+    )
+    parser.add_argument(
+        "--measurement_interval",
+        type=float,
+        default=600,
+        required=False,
+        help="Time in seconds between intermediate measurements of a trial, used to stop clearly worse trials early; 3600 measures each trial once.",
+    )
+    parser.add_argument(
+        "--datastore",
+        type=str,
+        default="/data/vizier.db",
+        required=False,
+        help="SQLite file the Vizier studies are kept in, so that a restarted agent resumes its study; empty for an in-memory datastore (always used with --simulate_trace).",
+    )
+    parser.add_argument(
+        "--seed_lookback",
+        type=str,
+        default=None,
+        required=False,
+        help="Seed the study with the past windows (e.g. '30d') during which a single upf size was active, before live trials start.",
+    )
+    parser.add_argument(
+        "--simulate_noise",
+        type=float,
+        default=0.0,
+        required=False,
+        help="Standard deviation of the relative noise of simulated throughput measurements.",
+    )
+    args = parser.parse_args()
+
     #################DEFINE ADVISOR AND ACTION HANDLER PARAMETERS#################
 
     # prometheus server endpoint to gather data from
@@ -146,47 +449,43 @@ if __name__ == "__main__":
     wait_time = 3600
     ############################################################################
 
-    # Setup google vizier for BBO
-    problem = vz.ProblemStatement()
-
-    problem.search_space.root.add_categorical_param("size", ["Small", "Large"])
-    problem.metric_information.append(
-        vz.MetricInformation(name="reward", goal=vz.ObjectiveMetricGoal.MAXIMIZE)
-    )
-
-    study_config = vz.StudyConfig.from_problem(problem)
-    study_config.algorithm = "GAUSSIAN_PROCESS_BANDIT"
-
-    study = clients.Study.from_study_config(
-        study_config, owner="respons", study_id="smallProblemUPFSizing"
-    )
-
-    ##Run BBO
-    for i in range(15):
-        logging.info("Executing update cycle.")
-
-        suggestions = study.suggest(count=1)
-        for suggestion in suggestions:
-            params = suggestion.parameters
-            update_yml(size=params["size"], gh_url=gh_url)
-
-            logging.info(f"Agent changing upf size to: {params['size']}")
-
-            ##Sleep for 3600 seconds, to see the impact of changing sizing. (Update hourly).
-            time.sleep(wait_time)
-
-            # Get the observations for the system to build out reward function.
-            # Build observed throughput.
-            observed_throughput = get_throughput(prom_endpoint)
-            logging.info(f"Observed throughput {observed_throughput}")
-
-            # Build cost.
-            observed_cost = get_infra_cost(params["size"])
-            logging.info(f"Observed cost {observed_cost}")
-
-            # Build reward.
-            reward = reward_function(observed_throughput, observed_cost)
-            logging.info(f"Observed reward {reward}")
-
-            # Complete the interaction.
-            suggestion.complete(vz.Measurement({"reward": reward}))
+    # Simulated studies stay in memory: resuming one would replay trials timed on
+    # the clock of an earlier simulation, and a finished one would never run again.
+    if args.datastore and not args.simulate_trace:
+        vizier_server = start_datastore(args.datastore)
+
+    if args.simulate_trace:
+        # Screen the study in simulated time: an hourly trial takes milliseconds.
+        times, load = load_trace(args.simulate_trace)
+        simulators = [UpfSimulator(times, load, noise=args.simulate_noise, seed=slot) for slot in range(args.num_slots)]
+        # The simulators share one clock: the scheduler advances them all.
+        def sleep(seconds):
+            for simulator in simulators:
+                simulator.sleep(seconds)
+
+        results = run_study(
+            build_study("smallProblemUPFSizing-simulated"),
+            [simulator_slot(simulator, f"simulated-{slot}") for slot, simulator in enumerate(simulators)],
+            args.num_trials,
+            CycleScheduler(args.measurement_interval, clock=simulators[0].time, sleep=sleep),
+            wait_time,
+            clock=simulators[0].time,
+        )
+        for trial, result in enumerate(results):
+            logging.info(f"Simulated trial {trial} ({result['slot']}): size {result['size']}, reward {result['reward']} after {result['elapsed']:.0f}s")
+    else:
+        if args.slots:
+            with open(args.slots) as file:
+                slots = [live_slot(**slot) for slot in yaml.safe_load(file)]
+        else:
+            slots = [live_slot(prom_endpoint, gh_url)]
+        study = build_study()
+        if args.seed_lookback:
+            seed_study(study, history_windows(prom_endpoint, args.seed_lookback))
+        run_study(
+            study,
+            slots,
+            args.num_trials,
+            wait_time=wait_time,
+            measurement_interval=args.measurement_interval,
+        )
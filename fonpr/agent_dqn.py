@@ -13,6 +13,7 @@ import logging
 from tf_infrastructure import FonprDqn
 from tf_infrastructure import ReplayBuffer
 from tf_infrastructure import Driver
+from tf_infrastructure import BatchedDriver
 
 import numpy as np
 import tensorflow as tf
@@ -40,6 +41,22 @@ if __name__ == "__main__":
     # github yml file url that controls app to be modified
     gh_url = "https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml"
 
+    # 'gitops' pushes actions to the yml file; 'k8s' applies them through the Kubernetes API first
+    actuator = "gitops"
+
+    # Optional factory of action_handler.ActionStabilizer suppressing resize churn (e.g.
+    # lambda: ActionStabilizer(min_dwell=1800)); each deployment gets its own, so that
+    # one does not spend the change budget of another.
+    # Suppressed actions still reach the replay buffer as taken, so it is off while training.
+    make_stabilizer = lambda: None
+
+    # Overlap the push, the wait and the observation query of a step, and write to the replay buffer in the background.
+    pipelined = True
+
+    # Further deployments (clusters or nodegroups) to collect experience from at once, each a dict
+    # with 'prom_endpoint' and 'gh_url'; with any, a BatchedDriver runs one policy call per step for all.
+    extra_deployments = []
+
     #################DEFINE AGENT HYPERPERAMETERS#################
 
     ##TRAINING HYPERPERAMETERS
@@ -136,24 +153,51 @@ if __name__ == "__main__":
 
     #################CREATE DRIVER#################
 
-    driver = Driver(
-        prom_endpoint=prom_endpoint,
-        wait_period=wait_period_between_interactions,
-        gh_url=gh_url,
-    )
-
-    logging.info("Driver Established Successfully")
+    drivers = [
+        Driver(
+            prom_endpoint=deployment["prom_endpoint"],
+            wait_period=wait_period_between_interactions,
+            gh_url=deployment["gh_url"],
+            actuator=actuator,
+            stabilizer=make_stabilizer(),
+            pipelined=pipelined,
+        )
+        for deployment in [{"prom_endpoint": prom_endpoint, "gh_url": gh_url}] + extra_deployments
+    ]
+
+    if len(drivers) == 1:
+        driver = drivers[0]
+
+        def collect(policy, max_steps):
+            return driver.drive(
+                max_steps=max_steps,
+                policy=py_tf_eager_policy.PyTFEagerPolicy(policy, use_tf_function=True),
+                observer=replay_buffer.rb_observer,
+            )
+
+    else:
+        driver = BatchedDriver(drivers)
+        observers = [replay_buffer.rb_observer] + [
+            replay_buffer.create_observer() for _ in extra_deployments
+        ]
+
+        def collect(policy, max_steps):
+            return driver.drive(
+                max_steps=max_steps,
+                policy=py_tf_eager_policy.PyTFEagerPolicy(
+                    policy, use_tf_function=True, batch_time_steps=False
+                ),
+                observers=observers,
+            )
+
+    logging.info(f"Driver Established Successfully ({len(drivers)} deployments)")
 
     #################RUN DRIVERS#################
 
     logging.info("Running Random Policy")
 
     # Run random policy to fill up replay buffer.
-    driver.drive(
-        max_steps=initial_collect_steps,
-        policy=py_tf_eager_policy.PyTFEagerPolicy(random_policy, use_tf_function=True),
-        observer=replay_buffer.rb_observer,
-    )
+    collect(random_policy, initial_collect_steps)
 
     logging.info("Random Policy Finished Running")
 
@@ -166,13 +210,7 @@ if __name__ == "__main__":
     logging.info("Running DQN Actions and training sequence")
     for episode in range(num_episodes):
         # Run driver to collect experience.
-        ts = driver.drive(
-            max_steps=number_of_interactions,
-            policy=py_tf_eager_policy.PyTFEagerPolicy(
-                agent.collect_policy, use_tf_function=True
-            ),
-            observer=replay_buffer.rb_observer,
-        )
+        ts = collect(agent.collect_policy, number_of_interactions)
 
         experience, unused_info = next(iterator)
 
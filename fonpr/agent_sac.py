@@ -68,6 +68,28 @@ if __name__ == "__main__":
         required=False,
         help="Specify root directory of value.yaml path in repo.",
     )
+    parser.add_argument(
+        "--actuator",
+        type=str,
+        choices=["gitops", "k8s"],
+        default="gitops",
+        required=False,
+        help="Push actions to the value.yaml file (gitops), or apply them through the Kubernetes API and reconcile the file afterwards (k8s).",
+    )
+    parser.add_argument(
+        "--min_dwell",
+        type=float,
+        default=None,
+        required=False,
+        help="Minimum time in minutes between two UPF resizes; resizes requested sooner are not actuated.",
+    )
+    parser.add_argument(
+        "--max_changes_per_hour",
+        type=int,
+        default=None,
+        required=False,
+        help="Budget of UPF resizes actuated per hour.",
+    )
     
     args = parser.parse_args()
     
@@ -78,7 +100,10 @@ if __name__ == "__main__":
         'obs_period': args.obs_period,
         'prom_endpoint': args.prom_endpoint,
         'gh_url': args.gh_url,
-        'dir_name': args.dir_name
+        'dir_name': args.dir_name,
+        'actuator': args.actuator,
+        'min_dwell': args.min_dwell,
+        'max_changes_per_hour': args.max_changes_per_hour
     }
 
     # Updating default configs for initial training and evaluation
@@ -10,74 +10,387 @@ sys.path.append(os.path.dirname(SCRIPT_DIR))
 import time
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+import yaml
+import numpy as np
 import pandas as pd
 from advisors import PromClient
-from utilities import prom_cpu_mem_queries
-from action_handler import ActionHandler, get_token
+from utilities import prom_cpu_mem_queries, prom_cpu_mem_range_queries, SketchStore, CycleScheduler
+from action_handler import ActionHandler, ActionStabilizer, ActuationQueue, KubernetesActuator, get_token
 import argparse
 import logging
 
 
+USAGE_COLUMNS = ["max_cpu", "avg_cpu", "max_memory", "avg_memory"]
+
+# Characters Kubernetes uses for generated name suffixes (no vowels, no look-alike digits).
+_HASH_CHARS = "[bcdfghjklmnpqrstvwxz2456789]"
+
+# Time in seconds between two checks of the cancel event of a fleet cycle.
+_FLEET_POLL_INTERVAL = 0.05
+
+
+def usage_table(query_results: list, columns=USAGE_COLUMNS) -> pd.DataFrame:
+    """
+    Join instant query results into one table indexed by the 'pod' label.
+
+    Each query result is matched to the others by pod name rather than by its
+    position in the response, so pods missing from (or ordered differently in)
+    some of the results still line up; missing values are NaN.
+
+    Parameters
+    ----------
+        query_results : list
+            Results of the queries, in the order of columns; each result is a list
+            of {'metric' : {'pod' : ...}, 'value' : [timestamp, value]} records.
+        columns : list of str
+            Name of the column holding each query result.
+
+    Returns
+    -------
+        table : pandas.DataFrame
+            One row per pod, one float column per query.
+    """
+    series = []
+    for column, result in zip(columns, query_results):
+        records = [record for record in result if "pod" in record["metric"]]
+        series.append(
+            pd.Series(
+                [record["value"][1] for record in records],
+                index=[record["metric"]["pod"] for record in records],
+                name=column,
+                dtype=float,
+            )
+        )
+    table = pd.concat(series, axis=1, join="outer")
+    table.index.name = "pod"
+    return table
+
+
+def collect_usage_table(prom_endpoint="http://10.0.102.84:8080") -> pd.DataFrame:
+    """
+    Create a prometheus client, connect to server, make queries, and join the
+    max/avg of CPU and memory for all pods into one table.
+
+    Parameters
+    ----------
+        prom_endpoint : str
+            IP and port for the Prometheus server (e.g. 'http://10.0.101.236:9090')
+
+    Returns
+    -------
+        table : pandas.DataFrame
+            One row per pod with columns max_cpu, avg_cpu (CPUs), max_memory and avg_memory (bytes).
+    """
+    # Init promclient, and pass it the queries (list).
+    prom_client_advisor = PromClient(prom_endpoint)
+    prom_client_advisor.set_queries_by_function(prom_cpu_mem_queries)
+    logging.info("making prometheus requests!!")
+    return usage_table(prom_client_advisor.run_queries())
+
+
 def collect_lim_reqs(prom_endpoint="http://10.0.102.84:8080") -> dict:
     """
     Create a prometheus client, connect to server, make queries, and print limits and requests for all pods.
     V0 logic for the respons agent.
     For V0 the agent will use the max/avg of CPU and Memory as the limits/requests.
+    Kept for compatibility; see collect_usage_table.
 
     Returns
     -------
         dict_lim_request : dict
             Dictionary containing limits and requests for each pod
+            (dict_lim_req[pod_name] = [max_cpu, avg_cpu, max_memory, avg_memory], as strings).
     """
+    table = collect_usage_table(prom_endpoint).dropna()
+    return defaultdict(
+        list, zip(table.index, table.astype(str).values.tolist())
+    )
 
-    # Init promclient, and pass it the queries (list).
-    prom_client_advisor = PromClient(prom_endpoint)
-    prom_client_advisor.set_queries_by_function(prom_cpu_mem_queries)
 
-    (
-        max_cpu_data,
-        avg_cpu_data,
-        max_memory_data,
-        avg_memory_data,
-    ) = prom_client_advisor.run_queries()
+def pod_to_target(pod_names) -> pd.Index:
+    """
+    Map pod names to the target names used in the value file, by stripping the
+    'open5gs-' prefix and the ReplicaSet and pod hash suffixes
+    (e.g. 'open5gs-amf-5f8d9c7b6-x2x7z' -> 'amf').
 
-    # Init an empty dict to hold the limits and requests for all pods.
-    # Key:Value pairs will look like the following --> dict_lim_req[pod_name] = [max_cpu,avg_cpu_data,max_memory,avg_memory].
-    # Max(cpu) and max(memory) serve as the new limits to be set.
-    # Avg(cpu) and avg(memory) serve as the new requests to be set.
+    Parameters
+    ----------
+        pod_names : array-like of str
+            Pod names.
 
-    dict_lim_req = defaultdict(list)
-    logging.info("making prometheus requests!!")
+    Returns
+    -------
+        targets : pandas.Index
+            Target name of each pod.
+    """
+    return (
+        pd.Index(pod_names)
+        .str.replace(r"^open5gs-", "", regex=True)
+        .str.replace(rf"(-{_HASH_CHARS}{{6,10}})?-{_HASH_CHARS}{{5}}$", "", regex=True)
+    )
 
-    # The output for a single query from prometheus is a list of nested dictionaries.
-    # The following code block processes the query results into a dataframe.
-    # Processing query in O(n) time complexity.
-    for step in range(len(max_cpu_data)):
-        try:
-            dict_lim_req[max_cpu_data[step]["metric"]["pod"]].append(
-                max_cpu_data[step]["value"][1]
-            )
-            dict_lim_req[avg_cpu_data[step]["metric"]["pod"]].append(
-                avg_cpu_data[step]["value"][1]
-            )
-            dict_lim_req[max_memory_data[step]["metric"]["pod"]].append(
-                max_memory_data[step]["value"][1]
-            )
-            dict_lim_req[avg_memory_data[step]["metric"]["pod"]].append(
-                avg_memory_data[step]["value"][1]
+
+def recommend_lim_reqs(table: pd.DataFrame, min_millicores_cpu=100, headroom=1.05) -> pd.DataFrame:
+    """
+    Compute requests and limits for every pod of a usage table in one pass.
+    Requests follow the average usage, limits the maximum usage plus headroom so
+    they don't squash over time. Pods of the same target (e.g. replicas) are
+    merged by keeping the largest recommendation.
+
+    Parameters
+    ----------
+        table : pandas.DataFrame
+            Usage table as returned by collect_usage_table.
+        min_millicores_cpu : int
+            Floor of the CPU requests and limits, in millicores.
+        headroom : float
+            Factor applied to the maximum usage to set the limits.
+
+    Returns
+    -------
+        recommendations : pandas.DataFrame
+            One row per target with columns req_cpu, req_mem, lim_cpu and lim_mem
+            formatted as quantities (e.g. '100m', '64Mi'). Pods missing any
+            usage value are skipped.
+    """
+    table = table.dropna()
+    return _format_recommendations(
+        table.index,
+        req_cpu=table["avg_cpu"].to_numpy(),
+        lim_cpu=table["max_cpu"].to_numpy() * headroom,
+        req_mem=table["avg_memory"].to_numpy(),
+        lim_mem=table["max_memory"].to_numpy() * headroom,
+        min_millicores_cpu=min_millicores_cpu,
+    )
+
+
+def _format_recommendations(pods, req_cpu, lim_cpu, req_mem, lim_mem, min_millicores_cpu) -> pd.DataFrame:
+    """
+    Convert per pod CPU (in CPUs) and memory (in bytes) arrays into per target
+    quantities, keeping the largest recommendation among pods of a target.
+    """
+    millicores = pd.DataFrame(
+        {
+            "req_cpu": np.maximum(np.floor(req_cpu * 1000), min_millicores_cpu),
+            "lim_cpu": np.maximum(np.floor(lim_cpu * 1000), min_millicores_cpu),
+            "req_mem": np.floor(req_mem / 1_000_000),
+            "lim_mem": np.floor(lim_mem / 1_000_000),
+        },
+        index=pod_to_target(pods),
+    ).astype(np.int64)
+    merged = millicores.groupby(level=0, sort=False).max()
+
+    recommendations = pd.DataFrame(index=merged.index)
+    for column, unit in (("req_cpu", "m"), ("req_mem", "Mi"), ("lim_cpu", "m"), ("lim_mem", "Mi")):
+        recommendations[column] = merged[column].astype(str) + unit
+    return recommendations
+
+
+def quantile_table(query_results: list, quantiles=(0.5, 0.9, 0.99), resources=("cpu", "memory")) -> pd.DataFrame:
+    """
+    Compute usage quantiles for every pod from range query results, in one
+    vectorized NumPy call per resource.
+
+    Parameters
+    ----------
+        query_results : list
+            Results of prom_cpu_mem_range_queries, in the order of resources; each
+            result is a list of {'metric' : {'pod' : ...}, 'values' : [[timestamp, value], ...]} records.
+        quantiles : tuple of float
+            Quantiles to compute, between 0 and 1.
+        resources : tuple of str
+            Name of the resource of each query result.
+
+    Returns
+    -------
+        table : pandas.DataFrame
+            One row per pod, one column per resource and quantile (e.g. 'cpu_p90'),
+            joined by pod name; NaN where a pod has no samples.
+    """
+    columns = []
+    for resource, result in zip(resources, query_results):
+        records = [record for record in result if "pod" in record["metric"]]
+        # Series may differ in length (pods started during the window): pad with NaN.
+        samples = np.full((len(records), max((len(r["values"]) for r in records), default=0)), np.nan)
+        for row, record in enumerate(records):
+            samples[row, : len(record["values"])] = [value for _, value in record["values"]]
+        if samples.size:
+            values = np.nanquantile(samples, quantiles, axis=1).T
+        else:
+            values = np.empty((0, len(quantiles)))
+        columns.append(
+            pd.DataFrame(
+                values,
+                index=[record["metric"]["pod"] for record in records],
+                columns=[f"{resource}_p{q * 100:g}" for q in quantiles],
             )
-        except KeyError:
-            print("empty records found, ignoring")
+        )
+    table = pd.concat(columns, axis=1, join="outer")
+    table.index.name = "pod"
+    return table
+
+
+def collect_quantile_table(
+    prom_endpoint="http://10.0.102.84:8080", window="3h", resolution="1m", quantiles=(0.5, 0.9, 0.99)
+) -> pd.DataFrame:
+    """
+    Create a prometheus client, fetch one range of per pod CPU and memory usage,
+    and compute usage quantiles for all pods client side.
+
+    Parameters
+    ----------
+        prom_endpoint : str
+            IP and port for the Prometheus server (e.g. 'http://10.0.101.236:9090')
+        window : str
+            How far back the samples go (e.g. '3h').
+        resolution : str
+            Time between two samples (e.g. '1m').
+        quantiles : tuple of float
+            Quantiles to compute, between 0 and 1.
+
+    Returns
+    -------
+        table : pandas.DataFrame
+            One row per pod with columns such as cpu_p90 (CPUs) and memory_p99 (bytes).
+    """
+    prom_client_advisor = PromClient(prom_endpoint)
+    prom_client_advisor.set_queries_by_list(prom_cpu_mem_range_queries(window, resolution))
+    logging.info("making prometheus requests!!")
+    return quantile_table(prom_client_advisor.run_queries(), quantiles)
+
+
+def collect_sketch_table(
+    sketch_store: SketchStore, prom_endpoint="http://10.0.102.84:8080", resolution="1m", quantiles=(0.5, 0.9, 0.99)
+) -> pd.DataFrame:
+    """
+    Fetch only the per pod CPU and memory samples newer than those already in
+    sketch_store, add them to its sketches, and read usage quantiles for all
+    pods from the sketches. After the first cycle, each cycle queries the time
+    since the previous one rather than the whole window.
+
+    Parameters
+    ----------
+        sketch_store : SketchStore
+            Store holding the sketches, updated in place.
+        prom_endpoint : str
+            IP and port for the Prometheus server (e.g. 'http://10.0.101.236:9090')
+        resolution : str
+            Time between two samples (e.g. '1m').
+        quantiles : tuple of float
+            Quantiles to compute, between 0 and 1.
+
+    Returns
+    -------
+        table : pandas.DataFrame
+            Same format as collect_quantile_table, over the window of sketch_store.
+    """
+    seconds = sketch_store.pending_seconds(time.time())
+    prom_client_advisor = PromClient(prom_endpoint)
+    prom_client_advisor.set_queries_by_list(prom_cpu_mem_range_queries(f"{seconds}s", resolution))
+    logging.info(f"making prometheus requests for the last {seconds}s!!")
+    for resource, result in zip(("cpu", "memory"), prom_client_advisor.run_queries()):
+        sketch_store.update(resource, result)
+    return sketch_store.quantile_table(quantiles)
+
+
+def recommend_lim_reqs_quantile(
+    table: pd.DataFrame, request_quantile=0.9, limit_quantile=0.99, headroom=1.1, min_millicores_cpu=100
+) -> pd.DataFrame:
+    """
+    Compute requests and limits for every pod from usage quantiles. Unlike the
+    max/avg recommender, a single spike does not inflate the limits, and
+    requests cover most of the usage rather than its mean.
+
+    Parameters
+    ----------
+        table : pandas.DataFrame
+            Quantile table as returned by collect_quantile_table; must hold the
+            request and limit quantiles.
+        request_quantile : float
+            Usage quantile the requests are set to.
+        limit_quantile : float
+            Usage quantile the limits are set to, before headroom.
+        headroom : float
+            Factor applied to the limit quantile to set the limits.
+        min_millicores_cpu : int
+            Floor of the CPU requests and limits, in millicores.
+
+    Returns
+    -------
+        recommendations : pandas.DataFrame
+            Same format as recommend_lim_reqs.
+    """
+    request, limit = f"p{request_quantile * 100:g}", f"p{limit_quantile * 100:g}"
+    columns = [f"cpu_{request}", f"cpu_{limit}", f"memory_{request}", f"memory_{limit}"]
+    table = table[list(dict.fromkeys(columns))].dropna()
+    return _format_recommendations(
+        table.index,
+        req_cpu=table[f"cpu_{request}"].to_numpy(),
+        lim_cpu=table[f"cpu_{limit}"].to_numpy() * headroom,
+        req_mem=table[f"memory_{request}"].to_numpy(),
+        lim_mem=table[f"memory_{limit}"].to_numpy() * headroom,
+        min_millicores_cpu=min_millicores_cpu,
+    )
+
+
+def build_lim_req_actions(recommendations: pd.DataFrame, targets=None) -> list:
+    """
+    Turn recommendations into one batched action set for ActionHandler.fetch_update_push_batch.
+
+    Parameters
+    ----------
+        recommendations : pandas.DataFrame
+            Recommendations as returned by recommend_lim_reqs.
+        targets : iterable of str
+            Targets to include (None includes every target).
 
-    return dict_lim_req
+    Returns
+    -------
+        batched_actions : list of dict
+            One lim_req change per target.
+    """
+    if targets is not None:
+        recommendations = recommendations[recommendations.index.isin(list(targets))]
+    return [
+        {
+            "action_type": "lim_req",
+            "requested_actions": {
+                "target_pod": target,
+                "requests": {"memory": req_mem, "cpu": req_cpu},
+                "limits": {"memory": lim_mem, "cpu": lim_cpu},
+            },
+        }
+        for target, req_cpu, req_mem, lim_cpu, lim_mem in recommendations[
+            ["req_cpu", "req_mem", "lim_cpu", "lim_mem"]
+        ].itertuples()
+    ]
 
 
-def execute_agent_cycle(prom_endpoint, gh_url, dir_name) -> None:
+def execute_agent_cycle(
+    prom_endpoint,
+    gh_url,
+    dir_name,
+    hndl=None,
+    shadow_journal=None,
+    actuator="gitops",
+    targets=None,
+    recommender="max_avg",
+    request_quantile=0.9,
+    limit_quantile=0.99,
+    headroom=1.1,
+    sketch_store=None,
+    cancel=None,
+    stabilizer=None,
+) -> ActionHandler:
     """
     Executes data ingestion via an advisor, executes logic to output a dictionary
     of requested actions based on the advisor outputs, and updates the controlling
     document in its remote repo using the action handler.
 
+    Requests and limits are recommended for every pod at once, and every
+    target found in the value file is updated in a single batched push.
+
     Parameters
     ----------
         prom_endpoint : str
@@ -86,48 +399,223 @@ def execute_agent_cycle(prom_endpoint, gh_url, dir_name) -> None:
             URL pointing to the target value.yaml file in GitHub (e.g. 'https://github.com/DISHDevEx/openverso-charts/blob/matt/gh_api_test/charts/respons/test.yaml')
         dir_name : str
             Name of first directory in path to the yaml file (empty string if the file is at the root of the repo)
+        hndl : ActionHandler
+            Action handler returned by a previous cycle, reused so that its cached
+            value file is revalidated instead of downloaded (None creates a new one)
+        shadow_journal : str
+            Path of a local journal the updates are written to instead of being pushed
+            (shadow mode; only used when a new action handler is created)
+        actuator : str
+            'gitops' to push the requested values to the yaml file, or 'k8s' to apply them
+            through the Kubernetes API and reconcile the yaml file in the background
+            (only used when a new action handler is created)
+        targets : iterable of str
+            Targets to update (e.g. ['amf', 'smf']); None updates every target
+            that has an entry in the value file.
+        recommender : str
+            'max_avg' sets requests from the average and limits from the maximum usage
+            over the last 3h; 'quantile' sets them from client side usage quantiles;
+            'sketch' reads the quantiles from sketch_store, fed with new samples only.
+        request_quantile : float
+            Usage quantile the requests are set to ('quantile' recommender).
+        limit_quantile : float
+            Usage quantile the limits are set to, before headroom ('quantile' recommender).
+        headroom : float
+            Factor applied to the limit quantile to set the limits ('quantile' recommender).
+        sketch_store : SketchStore
+            Sketches kept across cycles, updated in place ('sketch' recommender).
+        cancel : threading.Event
+            Set when the cycle ran past its deadline; a cancelled cycle does not
+            push its now stale recommendations.
+        stabilizer : ActionStabilizer
+            Kept across cycles; drops changes within its dead-bands, dwell time
+            or change budget before they are pushed (None pushes every change).
+
+    Returns
+    -------
+        hndl : ActionHandler
+            Action handler used for this cycle, to be passed to the next one.
     """
 
-    # Retrieve logs and metrics from the cluster using an advisor
-    if prom_endpoint != "Default":
-        lim_reqs = collect_lim_reqs(prom_endpoint)
+    # Retrieve logs and metrics from the cluster using an advisor,
+    # and process advisor output down to specific value update requests
+    endpoint = {} if prom_endpoint == "Default" else {"prom_endpoint": prom_endpoint}
+    quantiles = sorted({0.5, 0.9, 0.99, request_quantile, limit_quantile})
+    if recommender in ("quantile", "sketch"):
+        if recommender == "sketch":
+            table = collect_sketch_table(sketch_store, **endpoint, quantiles=quantiles)
+        else:
+            table = collect_quantile_table(**endpoint, quantiles=quantiles)
+        recommendations = recommend_lim_reqs_quantile(
+            table, request_quantile, limit_quantile, headroom
+        )
     else:
-        lim_reqs = collect_lim_reqs()
-
-    # Process advisor output down to specific value update requests
-    targets = [pod_name for pod_name in lim_reqs.keys() if "amf" in pod_name]
-    target_output = list(map(float, lim_reqs[targets[0]]))
-    # print(f'{target_output=}')
+        table = collect_usage_table(**endpoint)
+        recommendations = recommend_lim_reqs(table)
 
-    min_milicores_cpu = 100
+    if hndl is None:
+        hndl = ActionHandler(get_token(), gh_url, dir_name, shadow_journal=shadow_journal)
+        if actuator == "k8s":
+            hndl = KubernetesActuator(reconcile=ActuationQueue(hndl))
 
-    req_mem = f"{int(target_output[3] / 1_000_000)}Mi"
+    # Only targets with an entry in the value file can be updated. With the 'k8s'
+    # actuator the handler belongs to the reconcile queue, whose worker may be pushing.
+    value_reader = hndl.reconcile if isinstance(hndl, KubernetesActuator) else hndl
+    known_targets = set(value_reader.get_value_file_contents())
+    if targets is not None:
+        known_targets &= set(targets)
 
-    if milicores := int(target_output[0] * 1000) > min_milicores_cpu:
-        req_cpu = f"{milicores}m"
+    batched_actions = build_lim_req_actions(recommendations, known_targets)
+    if not batched_actions:
+        logging.warning("No recommendation matches a target in the value file.")
+    elif cancel is not None and cancel.is_set():
+        logging.warning("Agent cycle cancelled; recommendations not pushed.")
     else:
-        req_cpu = f"{min_milicores_cpu}m"
+        if stabilizer is not None:
+            # Only push changes worth a rollout.
+            batched_actions = stabilizer.filter_batch(batched_actions, record=False)
+        if batched_actions:
+            # Update remote repository with requested values, in one push.
+            hndl.fetch_update_push_batch(batched_actions)
+            if stabilizer is not None:
+                stabilizer.record_batch(batched_actions)
+        else:
+            logging.info("No recommendation is worth a rollout this cycle.")
+    logging.info("Agent cycle complete!")
+    return hndl
 
-    # Including 5% 'headroom' for the limit so it doesn't squash over time.
-    lim_mem = f"{int((target_output[2] / 1_000_000) * 1.05)}Mi"
 
-    if milicores := int(target_output[0] * 1000) > min_milicores_cpu:
-        lim_cpu = f"{int(milicores * 1.05)}m"
-    else:
-        lim_cpu = f"{min_milicores_cpu}m"
+def load_clusters(path: str) -> list:
+    """
+    Read the clusters a single agent covers from a yaml file holding a list of
+    mappings, one per cluster, e.g.
 
-    requested_actions = {
-        "target_pod": "amf",
-        "requests": {"memory": req_mem, "cpu": req_cpu},
-        "limits": {"memory": lim_mem, "cpu": lim_cpu},
-    }
+        - name: edge-1
+          prom_endpoint: http://10.0.114.131:9090
+          gh_url: https://github.com/DISHDevEx/napp/blob/main/napp/open5gs_values/edge-1.yaml
+          dir_name: napp
+          targets: [amf, smf]
 
-    # print(requested_actions)
+    Besides name, prom_endpoint, gh_url and dir_name, an entry may set any other
+    keyword argument of execute_agent_cycle (e.g. shadow_journal, targets,
+    recommender), overriding the agent wide value for that cluster.
 
-    # Update remote repository with requested values
-    hndl = ActionHandler(get_token(), gh_url, dir_name, requested_actions)
-    hndl.fetch_update_push_lim_req()
-    logging.info("Agent cycle complete!")
+    Parameters
+    ----------
+        path : str
+            Path of the yaml file.
+
+    Returns
+    -------
+        clusters : list of dict
+            Cluster entries, each with a unique name.
+    """
+    with open(path) as file:
+        clusters = yaml.safe_load(file) or []
+    names = [cluster.get("name") for cluster in clusters]
+    for key in ("name", "prom_endpoint", "gh_url", "dir_name"):
+        missing = [cluster.get("name", i) for i, cluster in enumerate(clusters) if key not in cluster]
+        if missing:
+            raise ValueError(f"Cluster entries {missing} have no '{key}'.")
+    if len(set(names)) != len(names):
+        raise ValueError("Cluster names must be unique.")
+    return clusters
+
+
+def execute_fleet_cycle(
+    clusters: list, handlers: dict, executor, cancel=None, in_flight=None, timeout=None, **options
+) -> dict:
+    """
+    Run execute_agent_cycle for every cluster in parallel on an executor.
+
+    Clusters are isolated from each other: each keeps its own action handler
+    (and sketch store) across cycles, and a cluster whose cycle fails is logged
+    and reported without affecting the others. The fleet cycle waits for the
+    clusters until they are all done, cancel is set or timeout expires,
+    whichever comes first; clusters still running then are left in flight and
+    skipped by the next fleet cycles until they finish, so one slow Prometheus
+    server or repo does not hold back the rest of the fleet.
+
+    Parameters
+    ----------
+        clusters : list of dict
+            Cluster entries, as returned by load_clusters.
+        handlers : dict
+            Action handler of each cluster name, updated in place.
+        executor : concurrent.futures.Executor
+            Executor the cluster cycles run on.
+        cancel : threading.Event
+            Passed on to every cluster cycle; stops the wait once set.
+        in_flight : dict
+            Future of each cluster cycle still running, kept across fleet
+            cycles and updated in place (None to not carry any over).
+        timeout : float
+            Maximum time in seconds to wait for the clusters (None for no limit).
+        **options
+            Keyword arguments of execute_agent_cycle shared by every cluster;
+            sketch_store and stabilizer may be dictionaries keyed by cluster name.
+
+    Returns
+    -------
+        errors : dict
+            Exception raised by the cycle of each failed cluster name, or a
+            TimeoutError for each cluster still running.
+    """
+    in_flight = {} if in_flight is None else in_flight
+    futures, errors = {}, {}
+    for cluster in clusters:
+        name = cluster["name"]
+        previous = in_flight.pop(name, None)
+        if previous is not None:
+            if not previous.done():
+                in_flight[name] = previous
+                errors[name] = TimeoutError(f"The previous cycle of cluster {name} is still running.")
+                logging.warning(f"{errors[name]} Skipping it.")
+                continue
+            # A late cycle ran with a cancelled event: only its handler is of use.
+            _collect_cluster_cycle(name, previous, handlers)
+
+        kwargs = dict(options)
+        kwargs.update({key: value for key, value in cluster.items() if key != "name"})
+        for key in ("sketch_store", "stabilizer"):
+            if isinstance(kwargs.get(key), dict):
+                kwargs[key] = kwargs[key].get(name)
+        futures[name] = executor.submit(
+            execute_agent_cycle, hndl=handlers.get(name), cancel=cancel, **kwargs
+        )
+
+    # Poll, so that cancel is noticed while clusters are running.
+    end = None if timeout is None else time.monotonic() + timeout
+    pending = set(futures.values())
+    while pending and not (cancel is not None and cancel.is_set()):
+        remaining = _FLEET_POLL_INTERVAL if end is None else min(_FLEET_POLL_INTERVAL, end - time.monotonic())
+        if remaining <= 0:
+            break
+        _, pending = wait(pending, timeout=remaining)
+
+    for name, future in futures.items():
+        if future.done():
+            error = _collect_cluster_cycle(name, future, handlers)
+            if error is not None:
+                errors[name] = error
+        else:
+            in_flight[name] = future
+            errors[name] = TimeoutError(f"The cycle of cluster {name} is still running.")
+            logging.warning(f"{errors[name]} Leaving it in flight.")
+    logging.info(f"Fleet cycle complete: {len(clusters) - len(errors)}/{len(clusters)} clusters updated.")
+    return errors
+
+
+def _collect_cluster_cycle(name, future, handlers):
+    """
+    Store the handler of a finished cluster cycle, or log and return its exception.
+    """
+    try:
+        handlers[name] = future.result()
+    except Exception as excp:
+        logging.error(f"Agent cycle failed for cluster {name} with the following exception: {excp}")
+        return excp
+    return None
 
 
 if __name__ == "__main__":
@@ -172,13 +660,186 @@ if __name__ == "__main__":
         required=False,
         help="Specify root directory of value.yaml path in repo.",
     )
+    parser.add_argument(
+        "--shadow_journal",
+        type=str,
+        default=None,
+        required=False,
+        help="Journal value.yaml updates to this local file instead of pushing them (shadow mode).",
+    )
+    parser.add_argument(
+        "--targets",
+        type=str,
+        default=None,
+        required=False,
+        help="Comma separated targets to update (e.g. 'amf,smf'); defaults to every target in the value.yaml file.",
+    )
+    parser.add_argument(
+        "--recommender",
+        type=str,
+        choices=["max_avg", "quantile", "sketch"],
+        default="max_avg",
+        required=False,
+        help="Set requests/limits from the 3h average/maximum usage (max_avg), from client side usage quantiles (quantile), or from streaming quantile sketches updated with new samples only (sketch).",
+    )
+    parser.add_argument(
+        "--sketch_checkpoint",
+        type=str,
+        default=None,
+        required=False,
+        help="File the sketches of the sketch recommender are restored from and saved to after every cycle.",
+    )
+    parser.add_argument(
+        "--request_quantile",
+        type=float,
+        default=0.9,
+        required=False,
+        help="Usage quantile the requests are set to with the quantile recommender.",
+    )
+    parser.add_argument(
+        "--limit_quantile",
+        type=float,
+        default=0.99,
+        required=False,
+        help="Usage quantile the limits are set to, before headroom, with the quantile recommender.",
+    )
+    parser.add_argument(
+        "--headroom",
+        type=float,
+        default=1.1,
+        required=False,
+        help="Factor applied to the limit quantile with the quantile recommender.",
+    )
+    parser.add_argument(
+        "--actuator",
+        type=str,
+        choices=["gitops", "k8s"],
+        default="gitops",
+        required=False,
+        help="Push actions to the value.yaml file (gitops), or apply them through the Kubernetes API and reconcile the file afterwards (k8s).",
+    )
+
+    parser.add_argument(
+        "--clusters",
+        type=str,
+        default=None,
+        required=False,
+        help="Yaml file listing the clusters to update in parallel (name, prom_endpoint, gh_url, dir_name and optional overrides); replaces --prom_endpoint, --gh_url and --dir_name.",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=32,
+        required=False,
+        help="Maximum number of clusters updated concurrently.",
+    )
+    parser.add_argument(
+        "--relative_band",
+        type=float,
+        default=0.1,
+        required=False,
+        help="Relative change of a request or limit below which it is not pushed.",
+    )
+    parser.add_argument(
+        "--min_dwell",
+        type=float,
+        default=30,
+        required=False,
+        help="Minimum time in minutes between two changes of the same target, unless the change is larger than 50%%.",
+    )
+    parser.add_argument(
+        "--max_changes_per_hour",
+        type=int,
+        default=None,
+        required=False,
+        help="Budget of target changes pushed per hour, for each cluster; defaults to no budget.",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        required=False,
+        help="Maximum random delay in seconds added to each cycle start.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        required=False,
+        help="Time in seconds after which a running cycle is cancelled; defaults to the interval.",
+    )
 
     args = parser.parse_args()
 
     logging.info(f"Update interval set to {args.interval}.")
-    logging.info(f"Prometheus server endpoint: {args.prom_endpoint}")
-    logging.info(f"Yaml file to be updated: {args.gh_url}")
-    while True:
+    if args.clusters:
+        clusters = load_clusters(args.clusters)
+    else:
+        clusters = [
+            {
+                "name": "default",
+                "prom_endpoint": args.prom_endpoint,
+                "gh_url": args.gh_url,
+                "dir_name": args.dir_name,
+            }
+        ]
+    for cluster in clusters:
+        logging.info(
+            f"Cluster {cluster['name']}: Prometheus server endpoint {cluster['prom_endpoint']}, "
+            f"yaml file to be updated {cluster['gh_url']}"
+        )
+
+    def checkpoint_path(name):
+        return args.sketch_checkpoint if len(clusters) == 1 else f"{args.sketch_checkpoint}.{name}"
+
+    sketch_stores = None
+    if args.recommender == "sketch":
+        sketch_stores = {}
+        for cluster in clusters:
+            path = checkpoint_path(cluster["name"]) if args.sketch_checkpoint else None
+            if path and os.path.exists(path):
+                sketch_stores[cluster["name"]] = SketchStore.load(path)
+            else:
+                sketch_stores[cluster["name"]] = SketchStore()
+
+    # Changes are stabilized per cluster, across cycles.
+    stabilizers = {
+        cluster["name"]: ActionStabilizer(
+            relative_band=args.relative_band,
+            min_dwell=args.min_dwell * 60,
+            max_changes_per_hour=args.max_changes_per_hour,
+        )
+        for cluster in clusters
+    }
+
+    handlers = {}
+    # Cluster cycles still running past their fleet cycle, skipped until they finish.
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=min(args.max_workers, len(clusters)))
+
+    def cycle(cancel):
         logging.info("Executing update cycle.")
-        execute_agent_cycle(args.prom_endpoint, args.gh_url, args.dir_name)
-        time.sleep(args.interval * 60)
+        execute_fleet_cycle(
+            clusters,
+            handlers,
+            executor,
+            cancel,
+            in_flight,
+            shadow_journal=args.shadow_journal,
+            actuator=args.actuator,
+            targets=args.targets.split(",") if args.targets else None,
+            recommender=args.recommender,
+            request_quantile=args.request_quantile,
+            limit_quantile=args.limit_quantile,
+            headroom=args.headroom,
+            sketch_store=sketch_stores,
+            stabilizer=stabilizers,
+        )
+        if sketch_stores is not None and args.sketch_checkpoint:
+            for name, sketch_store in sketch_stores.items():
+                sketch_store.save(checkpoint_path(name))
+
+    # Cycles start on fixed-rate ticks, however long each one takes; a cycle
+    # still running when the next tick is due is cancelled.
+    deadline = args.deadline if args.deadline is not None else args.interval * 60
+    CycleScheduler(args.interval * 60, jitter=args.jitter, deadline=deadline).run(cycle)
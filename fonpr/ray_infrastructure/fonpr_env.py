@@ -8,12 +8,12 @@ import numpy as np
 import logging
 import datetime
 from gymnasium import spaces, Env
-from time import sleep
 from typing import Tuple, Any, Optional
+from concurrent.futures import Future
 
 from advisors import PromClient
-from utilities import prom_query_rl_upf_throughput_pods, ec2_cost_calculator
-from action_handler import ActionHandler, get_token
+from utilities import prom_query_rl_upf_throughput_pods, ec2_cost_calculator, CycleScheduler
+from action_handler import ActionHandler, ActionStabilizer, ActuationQueue, KubernetesActuator, get_token
 
 
 class FONPR_Env(Env):
@@ -99,6 +99,19 @@ class FONPR_Env(Env):
             The AWS EC2 instance type in the Small instance Node Group.
         prom_endpoint: str
             The target endpoint for the on cluster prometheus server.
+        shadow_journal: str
+            Optional path of a local journal; when set ('shadow_journal' key of
+            env_config), updates are journaled there instead of pushed.
+        actuator: str
+            'gitops' (default) pushes actions to the value file; 'k8s' applies them
+            directly to the Deployments through the Kubernetes API and reconciles
+            the value file in the background.
+        stabilizer: ActionStabilizer
+            Set when env_config has a 'min_dwell' (minutes) or 'max_changes_per_hour'
+            key; sizing changes it suppresses are not actuated.
+        cycle_scheduler: CycleScheduler
+            Fixed-rate ticks, one every obs_period, that steps observe on; the
+            cadence holds however long pushes and queries take.
 
     Methods
     -------
@@ -106,6 +119,10 @@ class FONPR_Env(Env):
             Internal class method that queries the Prometheus server for state
             information, returning a processed array of state values.
             
+        _update_upf_sizing(size: str) -> Future:
+            Internal class method that queues a push of the requested UPF sizing
+            to the controlling values.yaml file, returning a future for the push.
+            
         _get_info() -> dict:
             Return a dictionary of agent / environment information (currently empty)
             
@@ -131,10 +148,9 @@ class FONPR_Env(Env):
             Used for visualizing training.
             
         close():
-            Not currently implemented.
-            
             Used to close the environment and terminate external software that
-            may have been invoked during environment use.
+            may have been invoked during environment use. Pushes any queued
+            action and stops the actuation queue.
     """
     logging.basicConfig(level=logging.INFO)
     metadata = {"render_modes": []}
@@ -161,6 +177,8 @@ class FONPR_Env(Env):
         self.obs_period = env_config['obs_period'] # How frequently does a new observation occur, in minutes
         self.gh_url = env_config['gh_url'] # Path to remote controlling value.yaml file
         self.dir_name = env_config['dir_name'] # Repo name that hosts the value.yaml file
+        self.shadow_journal = env_config.get('shadow_journal') # Journal updates locally instead of pushing them, if set
+        self.actuator = env_config.get('actuator', 'gitops') # 'k8s' applies actions through the Kubernetes API, reconciling git afterwards
         
         # States we are observing consist of "Throughput", "Large instance On", "Small instance On".
         low=np.tile(np.array([0., 0., 0.]), (self.samples,1))
@@ -179,6 +197,15 @@ class FONPR_Env(Env):
         self.render_mode = env_config['render_mode']
         
         self.step_counter = 0
+        self.actuation_queue = None # Pushes actions in the background, reusing one action handler
+        self.k8s_actuator = None # Applies actions directly when the 'k8s' actuator is selected
+        self.stabilizer = None # Suppresses resize churn, if configured
+        if env_config.get('min_dwell') or env_config.get('max_changes_per_hour'):
+            self.stabilizer = ActionStabilizer(
+                min_dwell=(env_config.get('min_dwell') or 0) * 60,
+                max_changes_per_hour=env_config.get('max_changes_per_hour'),
+                )
+        self.cycle_scheduler = CycleScheduler(self.obs_period * 60) # Observation ticks, anchored at reset
         self.large_instance_type = 'm4.xlarge' # Hardcoded to begin
         self.small_instance_type = 't3.medium' # Hardcoded to begin
 
@@ -239,6 +266,36 @@ class FONPR_Env(Env):
         
         return df.values
 
+    def _update_upf_sizing(self, size) -> Future:
+        requested_actions = {"target_pod": "upf", "values": size}
+        if self.stabilizer is not None and not self.stabilizer.allow("upf_sizing", requested_actions, record=False):
+            update = Future()
+            update.set_result(None)
+            return update
+
+        # Reuse one queue and handler so repeated fetches of the value file are conditional requests.
+        if self.actuation_queue is None:
+            self.actuation_queue = ActuationQueue(
+                ActionHandler(get_token(), self.gh_url, self.dir_name, shadow_journal=self.shadow_journal)
+            )
+        if self.actuator == 'k8s':
+            # Apply right away; the queue only reconciles the value file.
+            if self.k8s_actuator is None:
+                self.k8s_actuator = KubernetesActuator(reconcile=self.actuation_queue)
+            self.k8s_actuator.set_requested_actions(requested_actions)
+            update = Future()
+            update.set_result(self.k8s_actuator.fetch_update_push("upf_sizing"))
+        else:
+            update = self.actuation_queue.submit(requested_actions, "upf_sizing")
+
+        if self.stabilizer is not None:
+            # Only count the change once it is actuated.
+            def record(done):
+                if done.exception() is None:
+                    self.stabilizer.record("upf_sizing", requested_actions)
+            update.add_done_callback(record)
+        return update
+
     def _get_info(self) -> dict:
         # Provide information on state, action, and reward?
         return {}
@@ -246,6 +303,7 @@ class FONPR_Env(Env):
     def reset(self, *, seed=None, options=None) -> Tuple[np.array, dict]:
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
+        self.cycle_scheduler.wait_for_tick() # First tick is due now; steps observe on the following ones
 
         observation = self._get_obs()
         info = self._get_info()
@@ -254,19 +312,21 @@ class FONPR_Env(Env):
 
     def step(self, action) -> Tuple[np.array, float, bool, bool, dict]:
         
+        update = None
         if action == 0: # No-Op; do nothing
             logging.info('No action taken for this cycle.')
             pass
         elif action == 1: # Transition to Large instance
             logging.info('Transitioning to Large instance type.')
-            hndl = ActionHandler(get_token(), self.gh_url, self.dir_name, {"target_pod": "upf", "values": "Large"})
-            hndl.fetch_update_push_upf_sizing()
+            update = self._update_upf_sizing("Large")
         elif action == 2: # Transition to Small instance
             logging.info('Transitioning to Small instance type.')
-            hndl = ActionHandler(get_token(), self.gh_url, self.dir_name, {"target_pod": "upf", "values": "Small"})
-            hndl.fetch_update_push_upf_sizing()
+            update = self._update_upf_sizing("Small")
             
-        sleep(self.obs_period * 60) # Sleep for observation period before retrieving next observation
+        lag = self.cycle_scheduler.wait_for_tick() # Wait for the next observation tick; the push runs meanwhile
+        logging.info(f'Observation tick reached {lag:.1f}s late.')
+        if update is not None:
+            update.result() # Surface any failure of the push before observing its effect
         
         rxtx_value = 3.33e-9 # Rough estimate of dollars per byte over the network
         large_cost = ec2_cost_calculator(self.large_instance_type) # Cost of large instance in dollars per hour
@@ -289,4 +349,5 @@ class FONPR_Env(Env):
         ...
 
     def close(self):
-        ...
+        if self.actuation_queue is not None:
+            self.actuation_queue.close()
@@ -0,0 +1,92 @@
+"""
+Module to warm-start the BBO study with historical data, before the BBO agent runs.
+
+Past windows during which a single upf size was active are read from
+Prometheus (or from a csv file of logged or backfilled windows) and added to
+the study in the agent's Vizier datastore as completed trials.
+"""
+import argparse
+import csv
+import logging
+
+import sys
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from agent_bbo import build_study, history_windows, seed_study, start_datastore
+
+
+def read_windows(path: str) -> list:
+    """
+    Reads logged windows from a csv file with a 'start,size,throughput' header
+    (epoch seconds, 'Small' or 'Large', average bytes/second).
+
+    Parameters
+    ----------
+        path : str
+            Path of the csv file.
+
+    Returns
+    -------
+        windows : list of dict
+            Windows with 'start', 'size' and 'throughput' entries.
+    """
+    with open(path, newline="") as file:
+        return [
+            {"start": float(row["start"]), "size": row["size"], "throughput": float(row["throughput"])}
+            for row in csv.DictReader(file)
+        ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        prog="FONPR_BBO_Seeder",
+        description="Seeds the BBO study with completed trials built from past metrics.",
+    )
+    parser.add_argument(
+        "--prom_endpoint",
+        type=str,
+        default="http://10.0.114.131:9090",
+        required=False,
+        help="Prometheus server to read the upf history from.",
+    )
+    parser.add_argument(
+        "--lookback",
+        type=str,
+        default="30d",
+        required=False,
+        help="How far back to read the upf history from Prometheus.",
+    )
+    parser.add_argument(
+        "--windows_csv",
+        type=str,
+        default=None,
+        required=False,
+        help="Read the windows from this csv file (start,size,throughput) instead of Prometheus.",
+    )
+    parser.add_argument(
+        "--datastore",
+        type=str,
+        default="/data/vizier.db",
+        required=False,
+        help="SQLite file of the Vizier datastore the BBO agent uses.",
+    )
+    parser.add_argument(
+        "--study_id",
+        type=str,
+        default="smallProblemUPFSizing",
+        required=False,
+        help="Study to seed.",
+    )
+    args = parser.parse_args()
+
+    vizier_server = start_datastore(args.datastore)
+    if args.windows_csv:
+        windows = read_windows(args.windows_csv)
+    else:
+        windows = history_windows(args.prom_endpoint, args.lookback)
+    seed_study(build_study(args.study_id), windows)
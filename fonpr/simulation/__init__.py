@@ -0,0 +1,6 @@
+"""
+Simulation
+Replay recorded cluster traces in simulated time to screen agent configurations offline
+"""
+
+from .upf_simulator import UpfSimulator, SIZE_MODEL, load_trace, trace_from_prometheus
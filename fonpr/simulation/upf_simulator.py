@@ -0,0 +1,258 @@
+"""
+Module to contain a trace-driven simulator of the UPF sizing problem.
+
+Live BBO trials wait an hour each for a sizing to show its effect. The
+simulator instead replays a recorded UPF throughput trace as the offered load,
+serves it according to a model of each size, and keeps its own clock, so a
+whole study runs in seconds. It answers the same questions as the live agent
+(apply a size, observe the throughput over a window, price a size), so the
+agent's study loop can be pointed at it to screen configurations before any
+live trial.
+"""
+
+import csv
+from concurrent.futures import Future
+
+import numpy as np
+
+from utilities import ec2_cost_calculator
+
+# How each size serves the offered load: the instance it runs on (priced with
+# ec2_cost_calculator), the maximum throughput it serves in bytes per second,
+# and the fraction of the offered load it serves below that. Illustrative
+# defaults; calibrate them from live measurements.
+SIZE_MODEL = {
+    "Small": {"instance_type": "t3.medium", "capacity": 5e7, "efficiency": 0.98},
+    "Large": {"instance_type": "m4.large", "capacity": 2e8, "efficiency": 1.0},
+}
+
+
+def load_trace(path: str) -> tuple:
+    """
+    Read a throughput trace from a csv file of (epoch time, bytes per second) rows;
+    a header row is skipped.
+
+    Parameters
+    ----------
+        path : str
+            Path of the csv file.
+
+    Returns
+    -------
+        times : np.ndarray
+            Sample times in seconds.
+        throughput : np.ndarray
+            Offered load at each sample time, in bytes per second.
+    """
+    rows = []
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            try:
+                rows.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue
+    trace = np.array(sorted(rows), dtype=float).reshape(-1, 2)
+    return trace[:, 0], trace[:, 1]
+
+
+def trace_from_prometheus(query_result: list) -> tuple:
+    """
+    Build a throughput trace from a Prometheus range query result (e.g. a
+    rate of container_network_transmit_bytes_total for the upf pod over a day),
+    summing the series at each timestamp.
+
+    Parameters
+    ----------
+        query_result : list
+            Result of a range query, as returned by PromClient.run_queries.
+
+    Returns
+    -------
+        times : np.ndarray
+            Sample times in seconds.
+        throughput : np.ndarray
+            Offered load at each sample time, in bytes per second.
+    """
+    samples = np.array(
+        [(float(t), float(v)) for series in query_result for t, v in series["values"]],
+        dtype=float,
+    ).reshape(-1, 2)
+    times, inverse = np.unique(samples[:, 0], return_inverse=True)
+    return times, np.bincount(inverse, weights=samples[:, 1])
+
+
+class UpfSimulator:
+    """
+    Simulated UPF serving a recorded throughput trace, with a simulated clock.
+
+    The trace is replayed as the offered load, looping when the clock runs past
+    its end. At any time the UPF serves min(efficiency * load, capacity) for its
+    current size, and nothing for transition_time seconds after a resize (the
+    pod restarting on its new node). Optional relative noise makes repeated
+    measurements of the same size differ, as they do live.
+
+    Attributes
+    ----------
+        times : np.ndarray
+            Sample times of the trace, in seconds from its start.
+        load : np.ndarray
+            Offered load at each sample time, in bytes per second.
+        size_model : dict
+            Model of each size (see SIZE_MODEL).
+        size : str
+            Current size of the UPF.
+        now : float
+            Simulated time, in seconds from the start of the trace.
+        transition_time : float
+            Time in seconds a resize takes, during which nothing is served.
+        noise : float
+            Standard deviation of the relative measurement noise.
+
+    Methods
+    -------
+        time() -> float:
+            Current simulated time.
+
+        sleep(seconds:float):
+            Advance the simulated clock.
+
+        set_size(size:str) -> Future:
+            Resize the UPF now, returning an already resolved future.
+
+        get_throughput(window=3600) -> float:
+            Average throughput served over the last window seconds.
+
+        get_infra_cost(size=None) -> float:
+            Hourly cost of a size (the current one by default).
+    """
+
+    def __init__(
+        self,
+        times,
+        load,
+        size_model=SIZE_MODEL,
+        size="Large",
+        start=0.0,
+        transition_time=120.0,
+        noise=0.0,
+        seed=None,
+    ):
+        """
+        Parameters
+        ----------
+            times : array-like
+                Sample times of the trace, in seconds.
+            load : array-like
+                Offered load at each sample time, in bytes per second.
+            size_model : dict
+                Model of each size (see SIZE_MODEL).
+            size : str
+                Size of the UPF at the start.
+            start : float
+                Simulated time the clock starts at, in seconds from the start of the trace.
+            transition_time : float
+                Time in seconds a resize takes, during which nothing is served.
+            noise : float
+                Standard deviation of the relative measurement noise.
+            seed : int
+                Seed of the noise.
+        """
+        times = np.asarray(times, dtype=float)
+        if len(times) < 2:
+            raise ValueError("A trace needs at least two samples.")
+        self.times = times - times[0]
+        self.load = np.asarray(load, dtype=float)
+        self.size_model = size_model
+        self.size = size
+        self.now = float(start)
+        self.transition_time = transition_time
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        # Resolution the served throughput is integrated at, and length of one replay of the trace.
+        self.resolution = float(np.median(np.diff(self.times)))
+        self.duration = self.times[-1] + self.resolution
+        # Sizes over time: size k applies from change_times[k] on.
+        self.change_times = np.array([-np.inf])
+        self.sizes = [size]
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+    def set_size(self, size: str) -> Future:
+        """
+        Resize the UPF now.
+
+        Parameters
+        ----------
+            size : str
+                New size (a key of size_model).
+
+        Returns
+        -------
+            future : concurrent.futures.Future
+                Already resolved future, like those of a live actuation queue.
+        """
+        if size not in self.size_model:
+            raise ValueError(f"Size {size} has no model.")
+        if size != self.size:
+            self.change_times = np.append(self.change_times, self.now)
+            self.sizes.append(size)
+            self.size = size
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def served(self, times) -> np.ndarray:
+        """
+        Throughput served at the given simulated times, in bytes per second.
+        """
+        times = np.asarray(times, dtype=float)
+        load = np.interp(np.mod(times, self.duration), self.times, self.load)
+        index = np.searchsorted(self.change_times, times, side="right") - 1
+        capacity = np.array([self.size_model[size]["capacity"] for size in self.sizes])[index]
+        efficiency = np.array([self.size_model[size]["efficiency"] for size in self.sizes])[index]
+        served = np.minimum(load * efficiency, capacity)
+        # Nothing is served while a resize rolls out (the initial size needs none).
+        in_transition = (times - self.change_times[index] < self.transition_time) & (index > 0)
+        return np.where(in_transition, 0.0, served)
+
+    def get_throughput(self, window=3600) -> float:
+        """
+        Average throughput served over the last window seconds of simulated time,
+        as get_throughput reports it for the live UPF.
+
+        Parameters
+        ----------
+            window : float
+                Length in seconds of the averaging window.
+
+        Returns
+        -------
+            throughput : float
+                Average throughput in bytes per second.
+        """
+        samples = max(2, int(np.ceil(window / self.resolution)) + 1)
+        throughput = float(np.mean(self.served(np.linspace(self.now - window, self.now, samples))))
+        if self.noise:
+            throughput *= max(0.0, 1.0 + self.noise * self.rng.standard_normal())
+        return throughput
+
+    def get_infra_cost(self, size=None) -> float:
+        """
+        Hourly cost of a size, in dollars.
+
+        Parameters
+        ----------
+            size : str
+                Size to price (defaults to the current size).
+
+        Returns
+        -------
+            cost : float
+                Hourly cost of the instance the size runs on.
+        """
+        return ec2_cost_calculator(self.size_model[size or self.size]["instance_type"])
@@ -3,3 +3,5 @@ from .fonpr_dqn import FonprDqn
 from .replay_buffer import ReplayBuffer
 
 from .driver import Driver
+
+from .batched_driver import BatchedDriver
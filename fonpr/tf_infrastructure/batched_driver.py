@@ -0,0 +1,160 @@
+"""
+Module to contain the batched driver for tensorflow agents to interact with several napp deployments at once.
+The batched driver runs one policy over K drivers, each controlling its own cluster or nodegroup.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import tensorflow as tf
+import tf_agents
+from tf_agents.trajectories import trajectory
+
+TimeStep = tf_agents.trajectories.TimeStep
+
+
+def stack_nest(structures):
+    """Stack matching nests of tensors along a new outer (batch) dimension."""
+    return tf.nest.map_structure(lambda *tensors: tf.stack(tensors), *structures)
+
+
+def unstack_nest(structure, index):
+    """Select one entry of the outer (batch) dimension of a nest of tensors."""
+    return tf.nest.map_structure(lambda tensor: tensor[index], structure)
+
+
+class BatchedDriver:
+    """
+    BatchedDriver interacts with K NAPP deployments (clusters or nodegroups) at once using a tf agent policy.
+    Every step, the K observations are fetched concurrently, the policy is called once on the
+    batch of K timesteps, and the K actions are taken, waited for and observed concurrently; a step
+    then costs about as long as a single driver step, so collection grows about linearly with K.
+    The learner is unchanged: every cluster adds its own trajectories to the replay buffer.
+
+    Attributes
+    ----------
+        drivers: list[Driver]
+            One driver per deployment, each with its own prometheus endpoint and yml file.
+
+        executor: concurrent.futures.ThreadPoolExecutor
+            Runs the K observations and actions of a step concurrently.
+
+        writer: concurrent.futures.ThreadPoolExecutor
+            Writes the trajectories of a step to the observers, in order, while the next step runs.
+
+    Methods
+    -------
+        get_timesteps() -> List[TimeStep]:
+            Fetches the first timestep of every deployment concurrently.
+
+        take_actions_get_next_timesteps(action_step) -> List[TimeStep]:
+            Takes the k-th action of the batched action step on the k-th deployment, concurrently.
+
+        drive(max_steps, policy, observers):
+            Uses the batched tf agents policy to interact with the K deployments, placing the
+            experience of the k-th deployment in the k-th observer.
+    """
+
+    def __init__(self, drivers):
+        if not drivers:
+            excp = ValueError("A batched driver needs at least one driver.")
+            logging.error(excp)
+            raise excp
+        self.drivers = list(drivers)
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(self.drivers), thread_name_prefix="batched-driver"
+        )
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batched-observer")
+
+    def get_timesteps(self) -> list:
+        """
+        Fetches the observations of every deployment concurrently and builds their first timesteps.
+
+        Returns
+        ---------
+            time_steps: List[tf_agents.trajectories.TimeStep]
+                First timestep (step type 0) of each deployment.
+        """
+        return list(
+            self.executor.map(lambda driver: driver.build_timestep(driver.observe(), 0), self.drivers)
+        )
+
+    def take_actions_get_next_timesteps(self, action_step) -> list:
+        """
+        Takes the actions of a batched action step, the k-th on the k-th deployment, concurrently;
+        the waits for the actions to take effect overlap.
+
+        Parameters
+        ----------
+            action_step :  PolicyStep(action, state, info) named tuple
+                Batched action step, with an outer dimension of size K.
+        Returns
+        ---------
+            next_time_steps: List[tf_agents.trajectories.TimeStep]
+                The timestep of each deployment after its action.
+        """
+        return list(
+            self.executor.map(
+                lambda driver, index: driver.take_action_get_next_timestep(
+                    unstack_nest(action_step, index)
+                ),
+                self.drivers,
+                range(len(self.drivers)),
+            )
+        )
+
+    def drive(self, max_steps=10, policy=-1, observers=-1) -> TimeStep:
+        """
+        Uses the policy to interact with the K deployments for max_steps steps, calling the policy once per step.
+
+        Parameters
+        ----------
+            max_steps :  int
+                Number of steps to take per episode.
+
+            policy: tf_agents.policies.TFPolicy
+                Policy taking batched timesteps (e.g. a PyTFEagerPolicy built with batch_time_steps=False).
+
+            observers: list[reverb_utils.ReverbAddTrajectoryObserver]
+                One observer per deployment (see ReplayBuffer.create_observer), so that the
+                sequences written to the replay buffer never mix deployments.
+
+        Returns
+        ---------
+            current_timestep: tf_agents.trajectories.TimeStep(discount, observation, reward, step_type)
+                The last batched timestep seen by the driver.
+        """
+        if len(observers) != len(self.drivers):
+            excp = ValueError(f"Expected {len(self.drivers)} observers, got {len(observers)}.")
+            logging.error(excp)
+            raise excp
+
+        def write(trajectories):
+            for observer, traj in zip(observers, trajectories):
+                observer(traj)
+
+        current_timesteps = self.get_timesteps()
+        policy_state = policy.get_initial_state(len(self.drivers))
+        writes = []
+
+        for step in range(max_steps):
+            # One batched policy call for the K deployments.
+            action_step = policy.action(stack_nest(current_timesteps), policy_state)
+
+            next_timesteps = self.take_actions_get_next_timesteps(action_step)
+            action_step_with_previous_state = action_step._replace(state=policy_state)
+            trajectories = [
+                trajectory.from_transition(
+                    current_timesteps[index],
+                    unstack_nest(action_step_with_previous_state, index),
+                    next_timesteps[index],
+                )
+                for index in range(len(self.drivers))
+            ]
+            writes.append(self.writer.submit(write, trajectories))
+            current_timesteps = next_timesteps
+            policy_state = action_step.state
+
+        # Surface write failures, and let the learner sample every trajectory of the episode.
+        for future in writes:
+            future.result()
+
+        return stack_nest(current_timesteps)
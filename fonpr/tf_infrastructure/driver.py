@@ -5,15 +5,17 @@ The driver utilizes the policy of an agent to interact with the environment.
 import time
 import logging
 from fonpr.action_handler.action_handler import ActionHandler, get_token
+from fonpr.action_handler.actuation_queue import ActuationQueue
+from fonpr.action_handler.k8s_actuator import KubernetesActuator
 from fonpr.utilities.prom_queries import prom_network_upf_interfaces_query
 from fonpr.utilities.cost_function import ec2_cost_calculator
+from fonpr.utilities.observations import upf_observations
 from fonpr.advisors.prometheus_client_advisor import PromClient
 import tensorflow as tf
 import numpy as np
 import tf_agents
 from tf_agents.trajectories import trajectory
-from collections import defaultdict
-from typing import List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 
 TimeStep = tf_agents.trajectories.TimeStep
 
@@ -32,20 +34,54 @@ class Driver:
         wait_period = int
             The time interval driver should wait for in seconds to retrive the observations after taking an action.
 
+        shadow_journal = str
+            Path of a local journal; when set, value file updates are journaled there instead of pushed (shadow mode).
+
+        actuator = str
+            'gitops' to push actions to the value file, or 'k8s' to apply them directly to the
+            Deployments through the Kubernetes API (the value file is then reconciled in the background).
+
+        stabilizer = ActionStabilizer
+            Optional; sizing changes it suppresses (repeated sizes, changes within its
+            dwell time or beyond its hourly budget) are not actuated.
+
+        pipelined = bool
+            When set, steps overlap their work: the push runs in the background, the
+            observation query starts before the wait ends (early by the moving average of
+            its latency), and the trajectory of a step is built and written while the next
+            step waits. A step then costs wait_period, plus the policy call and whatever
+            part of the query the latency estimate did not hide, instead of wait_period
+            plus the push, the query, the trajectory and the write.
+
+        latency_smoothing = float
+            Weight of the latest query time in the moving average of the observation latency.
+
     Methods
     -------
         reward_function(throughput, infra_cost) -> float:
             Calculates and returns the reward(maximizing profit).
             Uses throughput and infra_cost to calculate reward.
 
-        get_observations() -> List[float]:
+        get_observations() -> np.ndarray:
             Queries the prometheus server (ip:port) to receive observations.
 
         get_infra_cost(size) -> float:
             Uses ec2_cost_calculator to get the hourly pricing of the EC2 sizes specified (as a list).
 
-        update_yml(size,gh_url,dir_name)-> None:
-            Updates the yml file to modify NAPP upf sizing.
+        update_yml(size,gh_url,dir_name)-> Future:
+            Queues an update of the yml file to modify NAPP upf sizing.
+
+        observe() -> np.ndarray:
+            Gets the observations, keeping a moving average of the query latency.
+
+        prefetch_observations(due, update) -> Future:
+            Starts the observation query so that it completes about when the wait ends.
+
+        build_timestep(observations, step_type) -> TimeStep:
+            Builds the timestep rewarded for a set of observations.
+
+        take_action(action_step) -> Future:
+            Takes an action and starts observing its effect in the background.
 
         take_action_get_next_timestep(action_step):
             Takes an action, waits some time, and finds the next state + reward pair.
@@ -61,10 +97,28 @@ class Driver:
         prom_endpoint="http://10.0.104.52:9090",
         wait_period=2,
         gh_url="https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml",
+        shadow_journal=None,
+        actuator="gitops",
+        stabilizer=None,
+        pipelined=False,
+        latency_smoothing=0.2,
     ):
         self.prom_endpoint = prom_endpoint
         self.wait_period = wait_period
         self.gh_url = gh_url
+        self.shadow_journal = shadow_journal
+        self.actuator = actuator
+        self.k8s_actuator = None
+        self.stabilizer = stabilizer
+        # Actuation queue (and its action handler) reused across steps so pushes run
+        # in the background and the cached value file can be revalidated.
+        self.actuation_queue = None
+        self.pipelined = pipelined
+        self.latency_smoothing = latency_smoothing
+        # Moving average of the observation query time, used to start prefetches early enough.
+        self.observation_latency = None
+        self.prefetch_executor = None
+        self.observer_executor = None
 
     def reward_function(self, throughput, infra_cost) -> float:
         """
@@ -104,14 +158,14 @@ class Driver:
 
         return reward
 
-    def get_observations(self) -> List[float]:
+    def get_observations(self) -> np.ndarray:
         """
-        Calculates the average rx and tx for eth0 and ogstun interfaces summed across all pod_idxs. Also calculates the hourly cost for all nodes running UPF's.
+        Calculates the average rx and tx for eth0 and ogstun interfaces summed across all upf pods. Also calculates the hourly cost for all nodes running UPF's.
 
         Returns
         -------
-            observations: List
-                [Rx_eth0,Rx_ogstun,Tx_eth0,Tx_ogstun,cost]
+            observations: np.ndarray
+                [Rx_eth0,Rx_ogstun,Tx_eth0,Tx_ogstun,cost] (see utilities.OBSERVATION_FEATURES)
         """
 
         prom_client_advisor = PromClient(self.prom_endpoint)
@@ -122,50 +176,7 @@ class Driver:
             node_sizing,
         ) = prom_client_advisor.run_queries()
 
-        dict_interface_network_tx = defaultdict(list)
-        dict_interface_network_rx = defaultdict(list)
-        nodes_used_list = []
-        dict_node_sizing = {}
-
-        for pod_idx in range(len(avg_upf_network_tx)):
-            dict_interface_network_tx[
-                avg_upf_network_tx[pod_idx]["metric"]["interface"]
-            ].append(float(avg_upf_network_tx[pod_idx]["value"][1]))
-            if avg_upf_network_tx[pod_idx]["metric"]["node"] not in nodes_used_list:
-                nodes_used_list.append(avg_upf_network_tx[pod_idx]["metric"]["node"])
-
-            dict_interface_network_rx[
-                avg_upf_network_rx[pod_idx]["metric"]["interface"]
-            ].append(float(avg_upf_network_rx[pod_idx]["value"][1]))
-            if avg_upf_network_rx[pod_idx]["metric"]["node"] not in nodes_used_list:
-                nodes_used_list.append(avg_upf_network_rx[pod_idx]["metric"]["node"])
-
-        for node in range(len(node_sizing)):
-            if node_sizing[node]["metric"]["node"] in nodes_used_list:
-                dict_node_sizing[node_sizing[node]["metric"]["node"]] = node_sizing[
-                    node
-                ]["metric"]["label_beta_kubernetes_io_instance_type"]
-
-        # Sum all the metrics on a per rx interface basis
-        dict_interface_network_rx_sum = dict(
-            map(lambda x: (x[0], sum(x[1])), dict_interface_network_rx.items())
-        )
-        # Sum all the metrics on a per tx interface basis
-        dict_interface_network_tx_sum = dict(
-            map(lambda x: (x[0], sum(x[1])), dict_interface_network_tx.items())
-        )
-
-        # Observations to build: rx per interface, tx per interface, total cost
-
-        observations = list(dict_interface_network_rx_sum.values()) + list(
-            dict_interface_network_tx_sum.values()
-        )
-
-        cost = self.get_infra_cost(list(dict_node_sizing.values()))
-
-        observations = observations + [cost]
-
-        return observations
+        return upf_observations(avg_upf_network_tx, avg_upf_network_rx, node_sizing)
 
     def get_infra_cost(self, list_of_sizes) -> float:
         """
@@ -192,9 +203,12 @@ class Driver:
         size,
         gh_url="https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml",
         dir_name="napp",
-    ) -> None:
+    ) -> Future:
         """
-        Updates the controlling document in its remote repo using the action handler.
+        Queues an update of the controlling document in its remote repo using the action handler.
+        The push runs in the background; the returned future resolves once it is complete.
+        With the 'k8s' actuator the update is applied to the upf Deployment right away
+        and the push only reconciles the controlling document.
 
         Parameters
         ----------
@@ -204,15 +218,150 @@ class Driver:
                 URL pointing to the target value.yaml file in GitHub (e.g. 'https://github.com/DISHDevEx/openverso-charts/blob/matt/gh_api_test/charts/respons/test.yaml')
             dir_name : str
                 Name of first directory in path to the yaml file (empty string if the file is at the root of the repo)
+
+        Returns
+        -------
+            future: concurrent.futures.Future
+                Resolves with the hash of the commit carrying the update
+                (the Deployment's resourceVersion with the 'k8s' actuator),
+                or with None if the stabilizer suppressed the update.
         """
 
         # Requested actions is a dictionary specifying the pod to modify, and the sizing for that pod.
         requested_actions = {"target_pod": "upf", "values": size}
 
+        if self.stabilizer is not None and not self.stabilizer.allow(
+            "upf_sizing", requested_actions, gh_url, record=False
+        ):
+            future = Future()
+            future.set_result(None)
+            return future
+
         # Update remote repository with requested values.
-        hndl = ActionHandler(get_token(), gh_url, dir_name, requested_actions)
-        hndl.fetch_update_push_upf_sizing()
-        logging.info("Agent update complete!")
+        if self.actuation_queue is None or self.actuation_queue.hndl.value_file_url != gh_url:
+            if self.actuation_queue is not None:
+                self.actuation_queue.close()
+            self.actuation_queue = ActuationQueue(
+                ActionHandler(get_token(), gh_url, dir_name, shadow_journal=self.shadow_journal)
+            )
+            self.k8s_actuator = None
+
+        if self.actuator == "k8s":
+            if self.k8s_actuator is None:
+                self.k8s_actuator = KubernetesActuator(reconcile=self.actuation_queue)
+            self.k8s_actuator.set_requested_actions(requested_actions)
+            future = Future()
+            future.set_result(self.k8s_actuator.fetch_update_push("upf_sizing"))
+            logging.info("Agent update applied!")
+        else:
+            future = self.actuation_queue.submit(requested_actions, "upf_sizing")
+            logging.info("Agent update queued!")
+
+        if self.stabilizer is not None:
+            # Only count the change once it is actuated.
+            def record(done):
+                if done.exception() is None:
+                    self.stabilizer.record("upf_sizing", requested_actions, gh_url)
+
+            future.add_done_callback(record)
+        return future
+
+    def observe(self) -> np.ndarray:
+        """
+        Gets the observations, keeping a moving average of how long the query takes.
+
+        Returns
+        -------
+            observations: np.ndarray
+                As returned by get_observations.
+        """
+        start = time.monotonic()
+        observations = self.get_observations()
+        latency = time.monotonic() - start
+        if self.observation_latency is None:
+            self.observation_latency = latency
+        else:
+            self.observation_latency += self.latency_smoothing * (latency - self.observation_latency)
+        return observations
+
+    def prefetch_observations(self, due, update) -> Future:
+        """
+        Starts the observation query in the background so that it completes about when
+        the wait for an action ends, rather than starting only once it has ended.
+
+        Parameters
+        ----------
+            due : float
+                time.monotonic() time at which the wait for the action ends.
+            update : concurrent.futures.Future
+                Pending update carrying the action; the query never starts before it is actuated.
+
+        Returns
+        -------
+            future: concurrent.futures.Future
+                Resolves with the observations.
+        """
+        if self.prefetch_executor is None:
+            self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="observation-prefetch")
+
+        def prefetch():
+            update.result()
+            delay = due - (self.observation_latency or 0.0) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            return self.observe()
+
+        return self.prefetch_executor.submit(prefetch)
+
+    def build_timestep(self, observations, step_type) -> TimeStep:
+        """
+        Builds the timestep (discount, observation, reward, step_type) for a set of observations.
+
+        Parameters
+        ----------
+            observations: np.ndarray
+                As returned by get_observations.
+            step_type: int
+                0:First, 1:MID, or 2:Final.
+
+        Returns
+        ---------
+            time_step: tf_agents.trajectories.TimeStep(discount, observation, reward, step_type)
+                The timestep rewarded with reward_function.
+        """
+        throughput = sum(observations[:-1])
+        infra_cost = observations[-1]
+        reward = self.reward_function(throughput, infra_cost)
+
+        return tf_agents.trajectories.TimeStep(
+            discount=tf.convert_to_tensor(np.array(1, np.float32)),
+            observation=tf.convert_to_tensor(np.array(observations, np.float64)),
+            reward=tf.convert_to_tensor(np.array(reward, np.float32)),
+            step_type=tf.convert_to_tensor(np.array(step_type, np.int64)),
+        )
+
+    def take_action(self, action_step) -> Future:
+        """
+        Takes an action and starts observing its effect in the background: the push is
+        queued, and the observation query is started so that it completes about when the
+        wait for the action ends (see prefetch_observations).
+
+        Parameters
+        ----------
+            action_step :  PolicyStep(action, state, info) named tuple
+                This is the action suggested by the policy utilizing the driver.
+        Returns
+        ---------
+            future: concurrent.futures.Future
+                Resolves with the observations after the action.
+        """
+        if action_step.action == 0:
+            update = self.update_yml(size="Small", gh_url=self.gh_url)
+
+        if action_step.action == 1:
+            update = self.update_yml(size="Large", gh_url=self.gh_url)
+
+        return self.prefetch_observations(time.monotonic() + self.wait_period, update)
 
     def take_action_get_next_timestep(self, action_step) -> TimeStep:
         """
@@ -228,38 +377,34 @@ class Driver:
             next_time_step: tf_agents.trajectories.TimeStep(discount, observation, reward, step_type)
                 The timestep trajectory that is created from taking an action.
         """
-        if action_step.action == 0:
-            self.update_yml(size="Small", gh_url=self.gh_url)
+        if self.pipelined:
+            observations = self.take_action(action_step).result()
+        else:
+            if action_step.action == 0:
+                update = self.update_yml(size="Small", gh_url=self.gh_url)
 
-        if action_step.action == 1:
-            self.update_yml(size="Large", gh_url=self.gh_url)
+            if action_step.action == 1:
+                update = self.update_yml(size="Large", gh_url=self.gh_url)
 
-        time.sleep(self.wait_period)
+            # The push runs in the background while we wait for the action to take effect.
+            time.sleep(self.wait_period)
+            update.result()
+            observations = self.get_observations()
 
-        observations = self.get_observations()
-        throughput = sum(observations[:-1])
-        infra_cost = observations[-1]
-        reward = self.reward_function(throughput, infra_cost)
-
-        discount = tf.convert_to_tensor(np.array(1, np.float32))
-        observation = tf.convert_to_tensor(np.array(observations, np.float64))
-        reward = tf.convert_to_tensor(np.array(reward, np.float32))
         # Step type can be of 0:First, 1:MID, or 2:Final
-        step_type = tf.convert_to_tensor(np.array(1, np.int64))
-
-        next_time_step = tf_agents.trajectories.TimeStep(
-            discount=discount,
-            observation=observation,
-            reward=reward,
-            step_type=step_type,
-        )
-        return next_time_step
+        return self.build_timestep(observations, 1)
 
     def drive(self, max_steps=10, policy=-1, observer=-1) -> TimeStep:
         """
         Allows drive method to take an action and build the trajectory object for the next (discount, observation, reward, step_type).
         This is the method that allows driver to interact with the environment after time 0.
 
+        In pipelined mode, the action of step t+1 is taken as soon as its timestep is
+        known, and the trajectory of step t is then built and written to the observer (in
+        a background thread, in order) while step t+1 waits; drive returns once all are
+        written. The policy needs the observation of step t+1 to act, so that wait and
+        what the query takes beyond the latency estimate remain on the critical path.
+
         Parameters
         ----------
             max_steps :  int
@@ -280,28 +425,14 @@ class Driver:
                 This is the stat of the policy at the end of all episodes.
         """
 
-        observations = self.get_observations()
-        throughput = sum(observations[:-1])
-        infra_cost = observations[-1]
-        reward = self.reward_function(throughput, infra_cost)
-
-        discount = tf.convert_to_tensor(np.array(1, np.float32))
-        observation = tf.convert_to_tensor(np.array(observations, np.float64))
-        reward = tf.convert_to_tensor(np.array(reward, np.float32))
         # Step type can be of 0:First, 1:MID, or 2:Final
-        step_type = tf.convert_to_tensor(np.array(0, np.int64))
+        current_timestep = self.build_timestep(self.observe(), 0)
+        policy_state = policy.get_initial_state(1)
 
-        current_timestep = tf_agents.trajectories.TimeStep(
-            discount=discount,
-            observation=observation,
-            reward=reward,
-            step_type=step_type,
-        )
+        if self.pipelined:
+            return self._drive_pipelined(max_steps, policy, observer, current_timestep, policy_state)
 
         for step in range(max_steps):
-            if step == 0:
-                policy_state = policy.get_initial_state(1)
-
             # Action_step is a PolicyStep(action, state, info) object.
             action_step = policy.action(current_timestep, policy_state)
 
@@ -315,3 +446,38 @@ class Driver:
             policy_state = action_step.state
 
         return current_timestep
+
+    def _drive_pipelined(self, max_steps, policy, observer, current_timestep, policy_state) -> TimeStep:
+        """
+        Loop of drive in pipelined mode (see drive).
+        """
+        if self.observer_executor is None:
+            self.observer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="observer")
+        writes = []
+
+        if max_steps > 0:
+            action_step = policy.action(current_timestep, policy_state)
+            observations = self.take_action(action_step)
+
+        for step in range(max_steps):
+            next_time_step = self.build_timestep(observations.result(), 1)
+
+            # Start step t+1 before writing step t, so the write runs during its wait.
+            if step + 1 < max_steps:
+                next_action_step = policy.action(next_time_step, action_step.state)
+                observations = self.take_action(next_action_step)
+
+            traj = trajectory.from_transition(
+                current_timestep, action_step._replace(state=policy_state), next_time_step
+            )
+            writes.append(self.observer_executor.submit(observer, traj))
+            current_timestep = next_time_step
+            policy_state = action_step.state
+            if step + 1 < max_steps:
+                action_step = next_action_step
+
+        # Surface write failures, and let the learner sample every trajectory of the episode.
+        for write in writes:
+            write.result()
+
+        return current_timestep
@@ -49,6 +49,9 @@ class ReplayBuffer:
             Private function autocalled during constructor __init__.
             Creates replay_buffer_signature,table,reverb_server,replay_buffer,rb_observer.
 
+        create_observer():
+            Returns another observer writing to the replay buffer, e.g. one per deployment of a batched driver.
+
         get_replay_buffer_as_dataset():
             Returns replay buffer as dataset.
 
@@ -126,6 +129,21 @@ class ReplayBuffer:
 
         return replay_buffer_signature, table, reverb_server, replay_buffer, rb_observer
 
+    def create_observer(self):
+        """
+        Returns another observer writing to the replay buffer. Each observer builds its own
+        sequences, so interleaved experience from several deployments needs one observer each.
+
+        Returns
+        ---------
+        rb_observer: reverb_utils.ReverbAddTrajectoryObserver
+        """
+        return reverb_utils.ReverbAddTrajectoryObserver(
+            self.replay_buffer.py_client,
+            self.table_name,
+            sequence_length=self.sequence_length,
+        )
+
     def get_replay_buffer_as_dataset(self, num_parallel_calls=3, batch_size=10):
         """
         Returns replay buffer as dataset.
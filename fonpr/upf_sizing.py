@@ -0,0 +1,201 @@
+"""
+Module to contain the observations, reward and action of the upf sizing problem,
+and the slots (live or simulated UPFs) they apply to, shared by the agents
+sizing the upf (agent_bbo, agent_bandit).
+
+It imports neither Vizier nor any ML framework, so agents using it start fast.
+"""
+import logging
+
+import sys
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from advisors import PromClient
+from utilities import prom_network_upf_query, ec2_cost_calculator
+from action_handler import ActionHandler, ActuationQueue, get_token
+
+
+def reward_function(throughput, infra_cost) -> float:
+    """
+    Calculates the reward for the agent to receive based off of throughput and infrastructure cost.
+
+    Parameters
+    ----------
+        throughput : float
+            The average network transmitted for the last hour from UPF pod.
+        infra_cost : float
+            The cost of running the ec2 sizing for the UPF pod.
+
+    Returns
+    -------
+        avg_upf_network: float
+            The average network transmitted for the last hour from UPF pod.
+
+    Notes
+    -------
+    How the math works:
+    (1) Throughput is in bytes/second.
+    (2) Cost conversion translates dollars to bytes.
+    (3) Multiplying 1 and 2: Bytes/Second * Dollars/Bytes --> Dollars/Second.
+    (4) Now we have to convert the Dollers/Second to Dollars/Hour by using a seconds_to_hours_conversion variable.
+    (5) Subtract the result of (4) (which is revenue) by the infra cost (Dollars/Hour) to yield profit.
+    """
+
+    # All cost is calculated on an hourly basis
+    # Throughput must be in bytes per second.
+    # The cost conversion converts 1 gigabyte to 3.33$(https://newsdirect.com/news/mobile-phone-data-costs-7x-more-in-the-us-than-the-uk-158885004?category=Communications).
+    cost_conversion = 3.33 / (10**9)  # 3.33 dollars per 10^9 bytes
+    seconds_to_hours_conversion = 3600 / 1  # 3600 seconds per
+
+    revenue = throughput * cost_conversion * seconds_to_hours_conversion
+
+    reward = revenue - infra_cost
+
+    return reward
+
+
+def get_throughput(prom_endpoint="http://10.0.104.52:9090", pod_regex="open5gs-upf.*", window=3600):
+    """
+    Calculates the average network bytes transmitted from the UPF pod for the last hour.
+
+    Parameters
+    ----------
+        prom_endpoint : str
+            IP and port for the Prometheus server.
+        pod_regex : str
+            Regular expression matching the name of the UPF pod.
+        window : float
+            Time in seconds to average over (the last hour by default).
+
+    Returns
+    -------
+        avg_upf_network: float
+            The average network transmitted for the last window from UPF pod.
+    """
+
+    # Set the prometheus client endpoint for the prometheus server in Respons-Nuances.
+    prom_client_advisor = PromClient(prom_endpoint)
+    prom_client_advisor.set_queries_by_list(prom_network_upf_query(pod_regex, f"{int(window)}s"))
+    avg_upf_network = prom_client_advisor.run_queries()
+    avg_upf_network = float(avg_upf_network[0][0]["value"][1])
+    return avg_upf_network
+
+
+def get_infra_cost(size="Large"):
+    """
+    Calculates the hourly cost of the infrastructure based off the categorical value of size.
+
+    Parameters
+    ----------
+        size : str
+            Specify the nodegroup sizing for upf.
+    Returns
+    -------
+        cost: int
+            The hourly cost of running the ec2 sizing for the UPF pod.
+    """
+
+    if size == "Small":
+        return ec2_cost_calculator("t3.medium")
+    if size == "Large":
+        return ec2_cost_calculator("m4.large")
+
+
+def update_yml(
+    size="Large",
+    gh_url="https://github.com/DISHDevEx/napp/blob/aakash/hpa-nodegroups/napp/open5gs_values/5gSA_no_ues_values_with_nodegroups.yaml",
+    dir_name="napp",
+) -> None:
+    """
+    Updates the controlling document in its remote repo using the action handler.
+
+    Parameters
+    ----------
+        size : str
+            Specify the nodegroup sizing for upf.
+        gh_url : str
+            URL pointing to the target value.yaml file in GitHub (e.g. 'https://github.com/DISHDevEx/openverso-charts/blob/matt/gh_api_test/charts/respons/test.yaml')
+        dir_name : str
+            Name of first directory in path to the yaml file (empty string if the file is at the root of the repo)
+    """
+
+    # Requested actions is a dictionary specifying the pod to modify, and the sizing for that pod.
+    requested_actions = {"target_pod": "upf", "values": size}
+
+    # Update remote repository with requested values.
+    hndl = ActionHandler(get_token(), gh_url, dir_name, requested_actions)
+    hndl.fetch_update_push_upf_sizing()
+    logging.info("Agent update complete!")
+
+
+def live_slot(
+    prom_endpoint,
+    gh_url,
+    dir_name="napp",
+    target_pod="upf",
+    pod_regex="open5gs-upf.*",
+    name=None,
+) -> dict:
+    """
+    Builds a trial slot acting on a live UPF: its sizing is pushed to a value
+    file and its throughput read from Prometheus. Slots running trials in
+    parallel must not share a UPF (e.g. separate clusters, or separate UPF
+    deployments and nodegroups told apart by target_pod and pod_regex).
+
+    Parameters
+    ----------
+        prom_endpoint : str
+            IP and port for the Prometheus server measuring the UPF.
+        gh_url : str
+            URL pointing to the value.yaml file controlling the UPF.
+        dir_name : str
+            Name of first directory in path to the yaml file.
+        target_pod : str
+            Target of the upf_sizing action in the value file.
+        pod_regex : str
+            Regular expression matching the name of the UPF pod.
+        name : str
+            Name of the slot, for logging (defaults to the target pod).
+
+    Returns
+    -------
+        slot : dict
+            Slot with 'name', 'apply_size', 'observe_throughput' and 'observe_cost' entries.
+    """
+    # Pushes run in the background, overlapping the wait for the new sizing to take effect.
+    actuation_queue = ActuationQueue(ActionHandler(get_token(), gh_url, dir_name))
+    return {
+        "name": name or target_pod,
+        "apply_size": lambda size: actuation_queue.submit(
+            {"target_pod": target_pod, "values": size}, "upf_sizing"
+        ),
+        "observe_throughput": lambda window: get_throughput(prom_endpoint, pod_regex, window),
+        "observe_cost": get_infra_cost,
+    }
+
+
+def simulator_slot(simulator, name="simulated") -> dict:
+    """
+    Builds a trial slot acting on a simulation.UpfSimulator.
+
+    Parameters
+    ----------
+        simulator : UpfSimulator
+            Simulated UPF.
+        name : str
+            Name of the slot, for logging.
+
+    Returns
+    -------
+        slot : dict
+            Slot with 'name', 'apply_size', 'observe_throughput' and 'observe_cost' entries.
+    """
+    return {
+        "name": name,
+        "apply_size": simulator.set_size,
+        "observe_throughput": simulator.get_throughput,
+        "observe_cost": simulator.get_infra_cost,
+    }
@@ -3,7 +3,14 @@ Utilites
 Aids the response ML framework to ingest, process, and output
 """
 from .prom_queries import prom_cpu_mem_queries
+from .prom_queries import prom_cpu_mem_range_queries
 from .prom_queries import prom_query_rl_upf_throughput_pods
 from .prom_queries import prom_network_upf_query
 from .prom_queries import prom_network_upf_interfaces_query
+from .prom_queries import prom_upf_history_queries
 from .cost_function import ec2_cost_calculator
+from .quantile_sketch import DDSketch, SketchStore
+from .scheduler import CycleScheduler
+from .trial_history import sizing_windows, INSTANCE_SIZES
+from .bandit import DiscountedBandit
+from .observations import upf_observations, interface_totals, nodes_cost, OBSERVATION_FEATURES, UPF_INTERFACES
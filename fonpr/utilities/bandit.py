@@ -0,0 +1,233 @@
+"""
+Module to contain a discounted multi-armed bandit for categorical sizing choices.
+
+For a handful of arms (e.g. 'Small' vs 'Large') a Gaussian process is more
+machinery than the problem needs. DiscountedBandit keeps, for each arm,
+discounted sums of its rewards, so a decision is a few NumPy operations and
+the whole state fits in a small JSON file. Discounting forgets old rewards
+geometrically, so that the bandit follows load patterns that change over time.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class DiscountedBandit:
+    """
+    Bandit over a few arms with real valued rewards, choosing arms by Gaussian
+    Thompson sampling or by discounted UCB.
+
+    Every update first multiplies the statistics of all arms by `discount`
+    (1.0 for a stationary problem), then adds the reward to the chosen arm, so
+    that a reward observed k updates ago weighs discount**k.
+
+    Arms are first each tried once. Then:
+        - 'thompson' draws a mean for every arm from N(mean, scale**2 / n) and
+          plays the largest draw;
+        - 'ucb' plays the largest mean + exploration * scale * sqrt(log(N) / n),
+    where n is the discounted number of plays of the arm, N the sum over arms,
+    and scale the pooled standard deviation of the rewards (at least min_scale).
+
+    Attributes
+    ----------
+        arms : list
+            Names of the arms.
+        strategy : str
+            'thompson' or 'ucb'.
+        discount : float
+            Weight kept by past rewards at every update.
+        exploration : float
+            Width of the UCB confidence bound, in standard deviations.
+        min_scale : float
+            Lower bound of the reward standard deviation.
+        counts : np.ndarray
+            Discounted number of plays of each arm.
+        sums : np.ndarray
+            Discounted sum of the rewards of each arm.
+        squares : np.ndarray
+            Discounted sum of the squared rewards of each arm.
+        pending : str
+            Arm played and not yet rewarded (set by the caller once the arm is
+            applied, cleared by update), so that a restarted agent credits the
+            reward of the running play to the right arm.
+
+    Methods
+    -------
+        select() -> str:
+            Arm to play next.
+
+        update(arm:str, reward:float):
+            Record the reward of a play.
+
+        means() -> dict:
+            Discounted mean reward of each arm.
+
+        save(path:str):
+            Checkpoint the state to a JSON file.
+
+        load(path:str) -> DiscountedBandit:
+            Restore a bandit from a checkpoint (class method).
+    """
+
+    def __init__(
+        self,
+        arms,
+        strategy="thompson",
+        discount=0.98,
+        exploration=2.0,
+        min_scale=1e-3,
+        seed=None,
+    ):
+        """
+        Parameters
+        ----------
+            arms : list
+                Names of the arms.
+            strategy : str
+                'thompson' or 'ucb'.
+            discount : float
+                Weight kept by past rewards at every update (1.0 never forgets).
+            exploration : float
+                Width of the UCB confidence bound, in standard deviations.
+            min_scale : float
+                Lower bound of the reward standard deviation.
+            seed : int
+                Seed of the Thompson sampling draws.
+        """
+        if strategy not in ("thompson", "ucb"):
+            raise ValueError("strategy must be 'thompson' or 'ucb'.")
+        if not 0 < discount <= 1:
+            raise ValueError("discount must be in (0, 1].")
+        self.arms = list(arms)
+        self.strategy = strategy
+        self.discount = discount
+        self.exploration = exploration
+        self.min_scale = min_scale
+        self.rng = np.random.default_rng(seed)
+        self.counts = np.zeros(len(self.arms))
+        self.sums = np.zeros(len(self.arms))
+        self.squares = np.zeros(len(self.arms))
+        self.pending = None
+
+    def means(self) -> dict:
+        """
+        Return the discounted mean reward of each arm (nan for arms never played).
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return dict(zip(self.arms, self.sums / self.counts))
+
+    def _scale(self) -> float:
+        """Pooled standard deviation of the rewards around their arm means."""
+        played = self.counts > 0
+        total = self.counts[played].sum()
+        if total <= played.sum():
+            return self.min_scale
+        residuals = self.squares[played] - self.sums[played] ** 2 / self.counts[played]
+        variance = max(residuals.sum(), 0.0) / (total - played.sum())
+        return max(np.sqrt(variance), self.min_scale)
+
+    def select(self) -> str:
+        """
+        Return the arm to play next.
+        """
+        untried = np.flatnonzero(self.counts == 0)
+        if untried.size:
+            return self.arms[untried[0]]
+
+        means = self.sums / self.counts
+        scale = self._scale()
+        if self.strategy == "thompson":
+            scores = self.rng.normal(means, scale / np.sqrt(self.counts))
+        else:
+            bonus = np.sqrt(max(np.log(self.counts.sum()), 0.0) / self.counts)
+            scores = means + self.exploration * scale * bonus
+        return self.arms[int(np.argmax(scores))]
+
+    def update(self, arm: str, reward: float) -> None:
+        """
+        Record the reward of a play of an arm.
+
+        Parameters
+        ----------
+            arm : str
+                Arm that was played.
+            reward : float
+                Reward observed for the play.
+
+        Returns
+        -------
+            None
+        """
+        index = self.arms.index(arm)
+        self.counts *= self.discount
+        self.sums *= self.discount
+        self.squares *= self.discount
+        self.counts[index] += 1.0
+        self.sums[index] += reward
+        self.squares[index] += reward**2
+        if arm == self.pending:
+            self.pending = None
+
+    def save(self, path: str) -> None:
+        """
+        Checkpoint the state to a JSON file. The file is replaced atomically, so
+        a crash while saving leaves the previous checkpoint intact.
+
+        Parameters
+        ----------
+            path : str
+                Path of the checkpoint file.
+
+        Returns
+        -------
+            None
+        """
+        state = {
+            "arms": self.arms,
+            "strategy": self.strategy,
+            "discount": self.discount,
+            "exploration": self.exploration,
+            "min_scale": self.min_scale,
+            "counts": self.counts.tolist(),
+            "sums": self.sums.tolist(),
+            "squares": self.squares.tolist(),
+            "pending": self.pending,
+        }
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(state, file)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str, seed=None):
+        """
+        Restore a bandit from a checkpoint written by save.
+
+        Parameters
+        ----------
+            path : str
+                Path of the checkpoint file.
+            seed : int
+                Seed of the Thompson sampling draws.
+
+        Returns
+        -------
+            bandit : DiscountedBandit
+                Bandit in the checkpointed state.
+        """
+        with open(path) as file:
+            state = json.load(file)
+        bandit = cls(
+            state["arms"],
+            state["strategy"],
+            state["discount"],
+            state["exploration"],
+            state["min_scale"],
+            seed,
+        )
+        bandit.counts = np.asarray(state["counts"], dtype=float)
+        bandit.sums = np.asarray(state["sums"], dtype=float)
+        bandit.squares = np.asarray(state["squares"], dtype=float)
+        bandit.pending = state.get("pending")
+        return bandit
@@ -0,0 +1,124 @@
+"""
+Module to build the observations of the upf sizing problem from Prometheus results.
+
+The results of prom_network_upf_interfaces_query are joined on their (pod,
+interface) labels rather than on the position of each series, and reduced with
+array operations into a fixed layout of named features (OBSERVATION_FEATURES),
+so the observation means the same thing whatever order Prometheus returns its
+series in and however many UPF pods there are.
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from .cost_function import ec2_cost_calculator
+
+# Interfaces of the upf pods the observations report, in layout order.
+UPF_INTERFACES = ("eth0", "ogstun")
+
+# Layout of an observation: rx then tx bytes/second per interface, then the hourly node cost.
+OBSERVATION_FEATURES = tuple(
+    [f"rx_{interface}" for interface in UPF_INTERFACES]
+    + [f"tx_{interface}" for interface in UPF_INTERFACES]
+    + ["cost"]
+)
+
+
+def interface_totals(query_result: list, interfaces=UPF_INTERFACES) -> np.ndarray:
+    """
+    Sum the values of a per pod and interface result on each interface.
+
+    Series are keyed by their (pod, interface) labels: the containers of a pod
+    share its network namespace, so a pod reported once per container is only
+    counted once. Interfaces not listed are left out.
+
+    Parameters
+    ----------
+        query_result : list
+            Instant query result with 'pod' and 'interface' labels.
+        interfaces : tuple
+            Interfaces to total, in output order.
+
+    Returns
+    -------
+        totals : np.ndarray
+            Sum of the values on each interface (0 for an interface with no series).
+    """
+    positions = {interface: position for position, interface in enumerate(interfaces)}
+    series = {
+        (sample["metric"].get("pod"), sample["metric"]["interface"]): sample["value"][1]
+        for sample in query_result
+        if sample["metric"].get("interface") in positions
+    }
+    indices = np.fromiter((positions[interface] for _, interface in series), np.intp, len(series))
+    values = np.fromiter(series.values(), float, len(series))
+    return np.bincount(indices, weights=values, minlength=len(interfaces))
+
+
+def nodes_cost(node_sizing_result: list, nodes: set, cost_function=ec2_cost_calculator) -> float:
+    """
+    Hourly cost of the given nodes, priced from their instance type label.
+
+    Parameters
+    ----------
+        node_sizing_result : list
+            kube_node_labels result with 'node' and 'label_beta_kubernetes_io_instance_type' labels.
+        nodes : set
+            Names of the nodes to price; other nodes are left out.
+        cost_function : callable
+            Hourly cost of an instance type.
+
+    Returns
+    -------
+        cost : float
+            Sum of the hourly cost of the nodes.
+    """
+    instance_types = {
+        sample["metric"]["node"]: sample["metric"]["label_beta_kubernetes_io_instance_type"]
+        for sample in node_sizing_result
+        if sample["metric"].get("node") in nodes
+    }
+    counts = Counter(instance_types.values())
+    return float(sum(count * cost_function(instance_type) for instance_type, count in counts.items()))
+
+
+def upf_observations(
+    tx_result: list,
+    rx_result: list,
+    node_sizing_result: list,
+    interfaces=UPF_INTERFACES,
+    cost_function=ec2_cost_calculator,
+) -> np.ndarray:
+    """
+    Build an observation from the results of prom_network_upf_interfaces_query.
+
+    Parameters
+    ----------
+        tx_result : list
+            Transmit rate of every upf pod and interface.
+        rx_result : list
+            Receive rate of every upf pod and interface.
+        node_sizing_result : list
+            Labels of the upf nodes.
+        interfaces : tuple
+            Interfaces to report, in layout order.
+        cost_function : callable
+            Hourly cost of an instance type.
+
+    Returns
+    -------
+        observation : np.ndarray
+            [rx per interface, tx per interface, cost] (OBSERVATION_FEATURES with
+            the default interfaces); cost covers the nodes running any upf pod.
+    """
+    nodes = {sample["metric"].get("node") for sample in tx_result} | {
+        sample["metric"].get("node") for sample in rx_result
+    }
+    return np.concatenate(
+        [
+            interface_totals(rx_result, interfaces),
+            interface_totals(tx_result, interfaces),
+            [nodes_cost(node_sizing_result, nodes, cost_function)],
+        ]
+    )
@@ -46,10 +46,47 @@ def prom_cpu_mem_queries():
 
     return [max_cpu_query, avg_cpu_query, max_memory_query, avg_memory_query]
 
-def prom_network_upf_query():
+
+def prom_cpu_mem_range_queries(window="3h", resolution="1m"):
+    """
+    Function to store and return queries that fetch the per pod cpu/memory usage
+    over a window as raw samples, so that statistics (e.g. quantiles) can be
+    computed client side instead of by the Prometheus server.
+
+    Parameters
+    ----------
+        window : str
+            How far back the samples go (e.g. '3h').
+        resolution : str
+            Time between two samples (e.g. '1m').
+
+    Returns
+    -------
+        queries: list[str]
+            [cpu_query, memory_query]; each returns a matrix with one series per pod.
+
+    Notes
+    -------
+        Each query is a single subquery evaluated once over the window, where
+        prom_cpu_mem_queries evaluates a max and an avg subquery per resource.
+        CPU is in CPUs (see prom_cpu_mem_queries) and memory in bytes.
+    """
+    cpu_query = f"sum by (pod) (rate(container_cpu_usage_seconds_total[2m]))[{window}:{resolution}]"
+    memory_query = f"sum by (pod) (container_memory_usage_bytes)[{window}:{resolution}]"
+
+    return [cpu_query, memory_query]
+
+def prom_network_upf_query(pod_regex="open5gs-upf.*", window="1h"):
     """
     Function to store and return queries that find network metrics in prometheus.This query is specific to only the upf function
 
+    Parameters
+    ----------
+        pod_regex : str
+            Regular expression matching the names of the upf pods to measure.
+        window : str
+            Prometheus duration the throughput is averaged over (e.g. '1h', '600s').
+
     Returns
     -------
         queries: list[str]
@@ -76,7 +113,7 @@ def prom_network_upf_query():
                      Thus, the width of the time window should be at least twice the scrape interval d.
             (4) Sum by pod implies that we will sum over all containers per pod. This will return metrics on a per pod basis.
     """
-    avg_upf_network_query = "sum by (pod) (rate(container_network_transmit_bytes_total {pod=~'open5gs-upf.*'}[1h]))"
+    avg_upf_network_query = f"sum by (pod) (rate(container_network_transmit_bytes_total {{pod=~'{pod_regex}'}}[{window}]))"
 
     return [avg_upf_network_query]
  
@@ -139,3 +176,41 @@ def prom_query_rl_upf_throughput_pods(window):
     active_pods = "kube_pod_info{pod=~'open5gs-upf.*'}[" + f"{window}m:]"
 
     return [throughput, active_pods]
+
+
+def prom_upf_history_queries(lookback="30d", window="1h", resolution="5m", pod_regex="open5gs-upf.*"):
+    """
+    Store and return queries replaying the history of the upf: its throughput
+    averaged over consecutive windows, and the instance types of the nodes it
+    ran on.
+
+    Parameters
+    ----------
+        lookback : str
+            How far back the history goes (e.g. '30d').
+        window : str
+            Length of the windows the throughput is averaged over (e.g. '1h').
+        resolution : str
+            Time between two samples of the instance types (e.g. '5m').
+        pod_regex : str
+            Regular expression matching the names of the upf pods.
+
+    Returns
+    -------
+        queries: list[str]
+            [throughput_query, sizing_query]; the throughput query returns one series
+            whose sample at time t is the average throughput (bytes/second) over the
+            window ending at t, the sizing query one series per instance type, with
+            samples whenever an upf pod ran on a node of that type.
+    """
+    throughput_query = (
+        f"sum(rate(container_network_transmit_bytes_total {{pod=~'{pod_regex}'}}[{window}]))"
+        f"[{lookback}:{window}]"
+    )
+    sizing_query = (
+        f"max by (label_node_kubernetes_io_instance_type) "
+        f"(kube_pod_info{{pod=~'{pod_regex}'}} * on(node) group_left(label_node_kubernetes_io_instance_type) kube_node_labels)"
+        f"[{lookback}:{resolution}]"
+    )
+
+    return [throughput_query, sizing_query]
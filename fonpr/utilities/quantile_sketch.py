@@ -0,0 +1,469 @@
+"""
+Streaming quantile sketches for resource usage.
+
+A DDSketch summarizes a stream of positive values in logarithmically sized
+bins, answering quantile queries within a fixed relative error while using
+memory bounded by its number of bins. Sketches of the same accuracy merge
+exactly, so a SketchStore keeps one sketch per pod, resource and time bucket,
+feeds it only the samples received since the last update, and answers
+quantiles over a sliding window by merging the buckets still inside it.
+"""
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Positive values are counted in bins i covering (gamma^(i-1), gamma^i],
+    where gamma = (1 + relative_accuracy) / (1 - relative_accuracy), so that
+    any quantile is returned within relative_accuracy of the true value.
+    Values at or below min_value are counted as zeros. When more than max_bins
+    bins are needed, the lowest bins are collapsed together, which only costs
+    accuracy on the lowest quantiles.
+
+    Attributes
+    ----------
+        relative_accuracy : float
+            Relative error of the quantiles returned.
+        max_bins : int
+            Maximum number of bins kept.
+        min_value : float
+            Values at or below min_value are counted as zeros.
+        count : int
+            Number of values added.
+
+    Methods
+    -------
+        add(values:array-like):
+            Add values to the sketch, in one vectorized pass.
+
+        merge(other:DDSketch):
+            Add the values summarized by another sketch of the same accuracy.
+
+        quantile(q:float or array-like) -> float or numpy.ndarray:
+            Estimate one or several quantiles of the values added.
+
+        to_dict() -> dict:
+            Return a JSON serializable representation of the sketch.
+
+        from_dict(state:dict) -> DDSketch:
+            Rebuild a sketch from its to_dict representation (class method).
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.offset = 0  # Bin index of counts[0]
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values) -> None:
+        """
+        Add values to the sketch, in one vectorized pass; NaNs are ignored.
+
+        Parameters
+        ----------
+            values : array-like of float
+                Values to add.
+
+        Returns
+        -------
+            None
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > self.min_value]
+        self.zero_count += values.size - positive.size
+        if positive.size:
+            indices = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            low = int(indices.min())
+            self._add_bins(low, np.bincount(indices - low))
+
+    def merge(self, other) -> None:
+        """
+        Add the values summarized by another sketch of the same accuracy.
+
+        Parameters
+        ----------
+            other : DDSketch
+                Sketch to merge into this one; left unchanged.
+
+        Returns
+        -------
+            None
+        """
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot merge sketches of different relative accuracy.")
+        if not other.count:
+            return
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.counts.size:
+            self._add_bins(other.offset, other.counts)
+
+    def quantile(self, q):
+        """
+        Estimate one or several quantiles of the values added.
+
+        Parameters
+        ----------
+            q : float or array-like of float
+                Quantiles to estimate, between 0 and 1.
+
+        Returns
+        -------
+            values : float or numpy.ndarray
+                Estimated quantiles (NaN for an empty sketch).
+        """
+        q = np.asarray(q, dtype=float)
+        if not self.count:
+            return np.full(q.shape, np.nan)[()]
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        # First bin whose cumulative count exceeds the rank.
+        bins = np.minimum(np.searchsorted(cumulative, rank, side="right"), max(self.counts.size - 1, 0))
+        values = 2 * self.gamma ** (bins + self.offset) / (self.gamma + 1)
+        values = np.where(rank < self.zero_count, 0.0, values)
+        return np.clip(values, self.min, self.max)[()]
+
+    def to_dict(self) -> dict:
+        """
+        Return a JSON serializable representation of the sketch.
+        """
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "min_value": self.min_value,
+            "offset": self.offset,
+            "counts": self.counts.tolist(),
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        """
+        Rebuild a sketch from its to_dict representation.
+        """
+        sketch = cls(state["relative_accuracy"], state["max_bins"], state["min_value"])
+        sketch.offset = state["offset"]
+        sketch.counts = np.asarray(state["counts"], dtype=np.int64)
+        sketch.zero_count = state["zero_count"]
+        sketch.count = state["count"]
+        if sketch.count:
+            sketch.min, sketch.max = state["min"], state["max"]
+        return sketch
+
+    def _add_bins(self, low: int, counts: np.ndarray) -> None:
+        """
+        Add counts for the consecutive bins starting at index low.
+        """
+        high = low + counts.size
+        if not self.counts.size:
+            self.offset, self.counts = low, counts.astype(np.int64)
+        else:
+            new_low = min(self.offset, low)
+            new_high = max(self.offset + self.counts.size, high)
+            if new_low != self.offset or new_high != self.offset + self.counts.size:
+                grown = np.zeros(new_high - new_low, dtype=np.int64)
+                grown[self.offset - new_low : self.offset - new_low + self.counts.size] = self.counts
+                self.offset, self.counts = new_low, grown
+            self.counts[low - self.offset : high - self.offset] += counts
+
+        if self.counts.size > self.max_bins:
+            # Collapse the lowest bins into the lowest one kept.
+            excess = self.counts.size - self.max_bins
+            self.counts[excess] += self.counts[:excess].sum()
+            self.counts = self.counts[excess:]
+            self.offset += excess
+
+
+class SketchStore:
+    """
+    Per pod, per resource usage sketches over a sliding time window.
+
+    Samples are added to a DDSketch per pod, resource and time bucket, and
+    buckets falling out of the window are dropped, so memory per pod is bounded
+    by (window / bucket) sketches of at most max_bins bins. Samples not newer
+    than the last one stored for their pod and resource are ignored, so that
+    overlapping range queries can be fed in as is.
+
+    Attributes
+    ----------
+        window : float
+            Length in seconds of the window quantiles are computed over.
+        bucket : float
+            Length in seconds of the time buckets the window is made of.
+        relative_accuracy : float
+            Relative error of the sketches.
+        max_bins : int
+            Maximum number of bins per sketch.
+        sketches : dict
+            Buckets of each (resource, pod), as {bucket_start : DDSketch}.
+        latest : dict
+            Timestamp of the last sample stored for each (resource, pod).
+
+    Methods
+    -------
+        add(resource:str, pod:str, timestamps:array-like, values:array-like):
+            Add the samples of one pod and resource.
+
+        update(resource:str, query_result:list):
+            Add the samples of a Prometheus range (matrix) query result.
+
+        evict(now:float):
+            Drop the buckets that fell out of the window.
+
+        pending_seconds(now:float) -> int:
+            Seconds of samples to query so that the store is up to date at now.
+
+        quantile_table(quantiles:tuple, resources:tuple, now=None) -> pandas.DataFrame:
+            Usage quantiles of every pod over the window.
+
+        save(path:str):
+            Checkpoint the store to a JSON file.
+
+        load(path:str) -> SketchStore:
+            Restore a store from a checkpoint (class method).
+    """
+
+    def __init__(self, window=3 * 3600, bucket=600, relative_accuracy=0.01, max_bins=2048):
+        self.window = window
+        self.bucket = bucket
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.sketches = {}
+        self.latest = {}
+
+    def add(self, resource: str, pod: str, timestamps, values) -> None:
+        """
+        Add the samples of one pod and resource.
+
+        Parameters
+        ----------
+            resource : str
+                Resource the samples measure (e.g. 'cpu').
+            pod : str
+                Pod the samples belong to.
+            timestamps : array-like of float
+                Epoch time of each sample.
+            values : array-like of float
+                Value of each sample.
+
+        Returns
+        -------
+            None
+        """
+        key = (resource, pod)
+        timestamps = np.asarray(timestamps, dtype=float)
+        values = np.asarray(values, dtype=float)
+        new = timestamps > self.latest.get(key, -math.inf)
+        if not new.any():
+            return
+        timestamps, values = timestamps[new], values[new]
+        self.latest[key] = float(timestamps.max())
+
+        buckets = self.sketches.setdefault(key, {})
+        starts = np.floor(timestamps / self.bucket) * self.bucket
+        unique_starts, inverse = np.unique(starts, return_inverse=True)
+        for position, start in enumerate(unique_starts):
+            sketch = buckets.get(float(start))
+            if sketch is None:
+                sketch = buckets[float(start)] = DDSketch(self.relative_accuracy, self.max_bins)
+            sketch.add(values[inverse == position])
+
+    def update(self, resource: str, query_result: list) -> None:
+        """
+        Add the samples of a Prometheus range (matrix) query result, with one
+        series per pod, then drop the buckets that fell out of the window.
+
+        Parameters
+        ----------
+            resource : str
+                Resource the query measures (e.g. 'cpu').
+            query_result : list
+                List of {'metric' : {'pod' : ...}, 'values' : [[timestamp, value], ...]} records.
+
+        Returns
+        -------
+            None
+        """
+        for record in query_result:
+            if "pod" not in record["metric"] or not record["values"]:
+                continue
+            samples = np.asarray(record["values"], dtype=float)
+            self.add(resource, record["metric"]["pod"], samples[:, 0], samples[:, 1])
+        if self.latest:
+            self.evict(max(self.latest.values()))
+
+    def evict(self, now: float) -> None:
+        """
+        Drop the buckets that fell out of the window ending at now, and the pods
+        left without any bucket.
+
+        Parameters
+        ----------
+            now : float
+                Epoch time the window ends at.
+
+        Returns
+        -------
+            None
+        """
+        oldest = now - self.window
+        for key in list(self.sketches):
+            buckets = self.sketches[key]
+            for start in [start for start in buckets if start + self.bucket <= oldest]:
+                del buckets[start]
+            if not buckets:
+                del self.sketches[key]
+                del self.latest[key]
+
+    def pending_seconds(self, now: float) -> int:
+        """
+        Return the number of seconds of samples to query so that the store is
+        up to date at now: the time since the oldest of the latest samples of
+        each resource, or the whole window for an empty store.
+
+        Parameters
+        ----------
+            now : float
+                Current epoch time.
+
+        Returns
+        -------
+            seconds : int
+                Seconds to query, at most the window.
+        """
+        latest = {}
+        for (resource, _), timestamp in self.latest.items():
+            latest[resource] = max(latest.get(resource, -math.inf), timestamp)
+        if not latest:
+            return int(self.window)
+        return int(min(self.window, max(1, math.ceil(now - min(latest.values())))))
+
+    def quantile_table(self, quantiles=(0.5, 0.9, 0.99), resources=("cpu", "memory"), now=None) -> pd.DataFrame:
+        """
+        Compute usage quantiles of every pod over the window, by merging its buckets.
+
+        Parameters
+        ----------
+            quantiles : tuple of float
+                Quantiles to compute, between 0 and 1.
+            resources : tuple of str
+                Resources to include.
+            now : float
+                Epoch time the window ends at (defaults to the latest sample).
+
+        Returns
+        -------
+            table : pandas.DataFrame
+                One row per pod, one column per resource and quantile (e.g. 'cpu_p90'),
+                in the format of agent_v0.quantile_table.
+        """
+        if now is None:
+            now = max(self.latest.values(), default=0.0)
+        oldest = now - self.window
+        columns = []
+        for resource in resources:
+            pods, rows = [], []
+            for (key_resource, pod), buckets in self.sketches.items():
+                if key_resource != resource:
+                    continue
+                merged = DDSketch(self.relative_accuracy, self.max_bins)
+                for start, sketch in buckets.items():
+                    if start + self.bucket > oldest:
+                        merged.merge(sketch)
+                if merged.count:
+                    pods.append(pod)
+                    rows.append(merged.quantile(quantiles))
+            columns.append(
+                pd.DataFrame(
+                    np.reshape(rows, (len(rows), len(quantiles))),
+                    index=pods,
+                    columns=[f"{resource}_p{q * 100:g}" for q in quantiles],
+                )
+            )
+        table = pd.concat(columns, axis=1, join="outer")
+        table.index.name = "pod"
+        return table
+
+    def save(self, path: str) -> None:
+        """
+        Checkpoint the store to a JSON file.
+
+        Parameters
+        ----------
+            path : str
+                Path of the checkpoint file.
+
+        Returns
+        -------
+            None
+        """
+        state = {
+            "window": self.window,
+            "bucket": self.bucket,
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "series": [
+                {
+                    "resource": resource,
+                    "pod": pod,
+                    "latest": self.latest[(resource, pod)],
+                    "buckets": [[start, sketch.to_dict()] for start, sketch in buckets.items()],
+                }
+                for (resource, pod), buckets in self.sketches.items()
+            ],
+        }
+        with open(path, "w") as file:
+            json.dump(state, file)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Restore a store from a checkpoint written by save.
+
+        Parameters
+        ----------
+            path : str
+                Path of the checkpoint file.
+
+        Returns
+        -------
+            store : SketchStore
+                Restored store.
+        """
+        with open(path) as file:
+            state = json.load(file)
+        store = cls(state["window"], state["bucket"], state["relative_accuracy"], state["max_bins"])
+        for series in state["series"]:
+            key = (series["resource"], series["pod"])
+            store.latest[key] = series["latest"]
+            store.sketches[key] = {
+                start: DDSketch.from_dict(sketch) for start, sketch in series["buckets"]
+            }
+        return store
@@ -0,0 +1,229 @@
+"""
+Fixed-rate scheduler for agent cycles.
+
+Sleeping for the interval after each cycle lets the cadence drift by the cycle
+duration, and a hung cycle stalls the loop forever. CycleScheduler instead
+starts cycles on ticks at fixed multiples of the interval from the start time,
+runs each cycle in a worker thread with an optional deadline, skips ticks that
+come while a cycle is still running, and records how late each tick started.
+
+A deadline only unblocks the schedule if the cancelled cycle actually returns:
+a cycle must check its cancel event between steps, and put timeouts on the I/O
+it waits on (e.g. PromClient, ActionHandler and KubernetesActuator requests).
+A cycle that ignores the event while blocked on I/O without a timeout still
+stalls the schedule, since the next cycle waits for it to exit.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+
+
+class CycleScheduler:
+    """
+    Run a cycle function on fixed-rate ticks.
+
+    Tick k is due at start + k * interval, plus a random jitter of up to
+    `jitter` seconds drawn per tick (so that several agents started together
+    spread their load). A tick that comes while the previous cycle is still
+    running is skipped. A cycle that is still running after `deadline`
+    seconds is cancelled: the cancel event passed to it is set and run stops
+    waiting for it, but ticks keep being skipped until its thread has exited,
+    so two cycles never run at once. Cancellation is cooperative; cycles are
+    expected to check the event before acting, and to return soon after it is
+    set, which requires timeouts on their I/O: a cycle blocked on a request
+    without a timeout keeps every later tick skipped until the request returns.
+
+    Attributes
+    ----------
+        interval : float
+            Time in seconds between two ticks.
+        jitter : float
+            Maximum random delay in seconds added to each tick.
+        deadline : float
+            Time in seconds after which a running cycle is cancelled (None for no deadline).
+        clock : callable
+            Returns the current time in seconds (monotonic).
+        sleep : callable
+            Waits for the given number of seconds.
+        ticks : collections.deque
+            Record of the latest ticks, as dictionaries with keys 'scheduled'
+            (due time), 'started' (start time, None if skipped), 'lag' (start
+            delay in seconds), 'duration' (cycle run time) and 'status'
+            ('ok', 'error', 'skipped', 'cancelled' or 'running').
+
+    Methods
+    -------
+        run(cycle:callable, max_cycles=None):
+            Call cycle(cancel_event) on every tick until stopped.
+
+        wait_for_tick() -> float:
+            Sleep until the next tick and return its lag, for loops that run
+            their cycles inline.
+
+        stop():
+            Make run return after the current tick.
+
+        lags() -> list:
+            Lag of each recorded tick that started a cycle.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        jitter=0.0,
+        deadline=None,
+        clock=time.monotonic,
+        sleep=None,
+        history=1000,
+    ):
+        """
+        Parameters
+        ----------
+            interval : float
+                Time in seconds between two ticks.
+            jitter : float
+                Maximum random delay in seconds added to each tick.
+            deadline : float
+                Time in seconds after which a running cycle is cancelled (None for no deadline).
+            clock : callable
+                Returns the current time in seconds (monotonic).
+            sleep : callable
+                Waits for the given number of seconds (defaults to a wait that stop interrupts).
+            history : int
+                Number of ticks kept in the record.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+        self.interval = interval
+        self.jitter = jitter
+        self.deadline = deadline
+        self.clock = clock
+        self._stop = threading.Event()
+        self.sleep = sleep if sleep is not None else self._stop.wait
+        self.ticks = deque(maxlen=history)
+        self._start = None
+        self._index = 0
+
+    def stop(self) -> None:
+        """
+        Make run return after the current tick.
+        """
+        self._stop.set()
+
+    def lags(self) -> list:
+        """
+        Return the lag of each recorded tick that started a cycle.
+        """
+        return [tick["lag"] for tick in self.ticks if tick["started"] is not None]
+
+    def _next_tick(self) -> float:
+        """
+        Return the due time of the next tick not yet in the past, recording the
+        ticks that were missed while a cycle overran as skipped.
+        """
+        now = self.clock()
+        if self._start is None:
+            self._start = now
+        due_index = max(self._index, math.ceil((now - self._start) / self.interval - 1e-9))
+        for missed in range(self._index, due_index):
+            self._record(self._start + missed * self.interval, None, "skipped")
+        self._index = due_index + 1
+        return self._start + due_index * self.interval + random.uniform(0, self.jitter)
+
+    def _sleep_until(self, due: float) -> None:
+        delay = due - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def _record(self, scheduled, started, status, duration=None) -> dict:
+        tick = {
+            "scheduled": scheduled,
+            "started": started,
+            "lag": None if started is None else started - scheduled,
+            "duration": duration,
+            "status": status,
+        }
+        self.ticks.append(tick)
+        if status == "skipped":
+            logging.warning("Skipping a tick: the previous cycle is still running.")
+        return tick
+
+    def wait_for_tick(self) -> float:
+        """
+        Sleep until the next tick and return how late it was reached, in seconds.
+        Ticks that passed since the previous call are recorded as skipped.
+
+        Returns
+        -------
+            lag : float
+                Time between the due time of the tick and the return of the call.
+        """
+        due = self._next_tick()
+        self._sleep_until(due)
+        return self._record(due, self.clock(), "ok")["lag"]
+
+    def run(self, cycle, max_cycles=None) -> None:
+        """
+        Call cycle(cancel_event) on every tick, each in a worker thread, until
+        stop is called or max_cycles cycles were started. Exceptions raised by
+        a cycle are logged and do not stop the schedule.
+
+        Parameters
+        ----------
+            cycle : callable
+                Function of a threading.Event that is set when the cycle is cancelled.
+            max_cycles : int
+                Number of cycles to start (None runs until stop is called).
+
+        Returns
+        -------
+            None
+        """
+        self._stop.clear()
+        started = 0
+        # Done event of a cancelled cycle that may still be running.
+        abandoned = None
+        while not self._stop.is_set() and (max_cycles is None or started < max_cycles):
+            due = self._next_tick()
+            self._sleep_until(due)
+            if self._stop.is_set():
+                break
+            if abandoned is not None:
+                if not abandoned.is_set():
+                    self._record(due, None, "skipped")
+                    continue
+                abandoned = None
+
+            tick = self._record(due, self.clock(), "running")
+            cancel, done = threading.Event(), threading.Event()
+            worker = threading.Thread(
+                target=self._run_cycle, args=(cycle, cancel, done, tick), daemon=True
+            )
+            worker.start()
+            started += 1
+
+            # Wait for the cycle, at most until its deadline.
+            if self.deadline is None:
+                done.wait()
+            elif not done.wait(timeout=max(0.0, tick["started"] + self.deadline - self.clock())):
+                cancel.set()
+                abandoned = done
+                tick["status"] = "cancelled"
+                logging.error(f"Cycle exceeded its {self.deadline}s deadline; cancelled.")
+
+    def _run_cycle(self, cycle, cancel, done, tick) -> None:
+        try:
+            cycle(cancel)
+            status = "ok"
+        except Exception as excp:
+            logging.error(f"Cycle failed with the following exception: {excp}")
+            status = "error"
+        finally:
+            done.set()
+        if tick["status"] == "running":
+            tick["status"] = status
+            tick["duration"] = self.clock() - tick["started"]
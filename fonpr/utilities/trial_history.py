@@ -0,0 +1,83 @@
+"""
+Module to reconstruct past sizing trials from the metrics history of the upf.
+
+Months of metrics already show how each upf size performed. sizing_windows
+cuts that history into windows during which a single size was active, with
+the throughput observed over each, so that they can seed a BBO study as
+completed trials (see agent_bbo.seed_study).
+"""
+
+import numpy as np
+
+# Size each upf node instance type corresponds to (see upf_sizing.get_infra_cost).
+INSTANCE_SIZES = {"t3.medium": "Small", "m4.large": "Large"}
+
+
+def sizing_windows(
+    throughput_result: list,
+    sizing_result: list,
+    window=3600,
+    resolution=300,
+    coverage=0.9,
+    instance_sizes=INSTANCE_SIZES,
+) -> list:
+    """
+    Build the windows during which the upf ran on a single size from the
+    results of prom_upf_history_queries.
+
+    A window qualifies when every instance type sample taken during it is of
+    one known type (a resize in the middle of a window disqualifies it), and
+    samples cover at least `coverage` of it (so that windows where the upf was
+    down or unobserved are left out).
+
+    Parameters
+    ----------
+        throughput_result : list
+            Result of the throughput query: one series of window averages.
+        sizing_result : list
+            Result of the sizing query: one series per instance type.
+        window : float
+            Length in seconds of the windows the throughput is averaged over.
+        resolution : float
+            Time in seconds between two instance type samples.
+        coverage : float
+            Fraction of a window the instance type samples must cover.
+        instance_sizes : dict
+            Size of each instance type; other instance types disqualify a window.
+
+    Returns
+    -------
+        windows : list of dict
+            Windows in time order, with 'start' and 'end' (epoch seconds), 'size'
+            and 'throughput' (average bytes/second) entries.
+    """
+    if not throughput_result:
+        return []
+    throughput = np.array(throughput_result[0]["values"], dtype=float).reshape(-1, 2)
+
+    # Instance type samples, as (time, type index); unknown types get index -1.
+    types = list(instance_sizes)
+    samples = [
+        (float(t), types.index(instance_type) if instance_type in types else -1)
+        for series in sizing_result
+        for instance_type in [series["metric"].get("label_node_kubernetes_io_instance_type")]
+        for t, _ in series["values"]
+    ]
+    samples = np.array(sorted(samples), dtype=float).reshape(-1, 2)
+
+    # Samples in (end - window, end] for each window end.
+    ends = throughput[:, 0]
+    first = np.searchsorted(samples[:, 0], ends - window, side="right")
+    last = np.searchsorted(samples[:, 0], ends, side="right")
+    needed = coverage * window / resolution
+
+    windows = []
+    for end, value, i, j in zip(ends, throughput[:, 1], first, last):
+        observed = samples[i:j, 1]
+        # Distinct sample times: several pods on the same type share a time.
+        if len(np.unique(samples[i:j, 0])) < needed or np.any(observed < 0):
+            continue
+        if np.all(observed == observed[0]) and np.isfinite(value):
+            size = instance_sizes[types[int(observed[0])]]
+            windows.append({"start": end - window, "end": end, "size": size, "throughput": value})
+    return windows
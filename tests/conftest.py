@@ -26,3 +26,35 @@ def sample_response():
         }
     ]
     return sample_response
+
+
+@pytest.fixture(scope="module")
+def sample_values_yaml():
+    """
+    Return a sample value.yaml file in the same layout as the Open5GS charts
+    targeted by the action handler.
+    """
+    sample_values_yaml = """\
+# Open5GS values used by the FONPR agents.
+amf:
+  # Resources are managed by the V0 agent.
+  resources:
+    requests:
+      cpu: 100m
+      memory: 64Mi
+    limits:
+      cpu: 200m
+      memory: 128Mi
+  replicaCount: 1
+upf:
+  affinity:
+    nodeAffinity:
+      requiredDuringSchedulingIgnoredDuringExecution:
+        nodeSelectorTerms:
+        - matchExpressions:
+          - key: size
+            operator: In
+            values:
+            - Large  # Managed by the sizing agents.
+"""
+    return sample_values_yaml
@@ -0,0 +1,377 @@
+"""
+Test all functions related to the action handler.
+"""
+
+import sys
+import os
+import json
+import subprocess
+import time
+from unittest.mock import MagicMock
+import pytest
+import yaml
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/action_handler'])))
+from action_handler import ActionHandler, ActuationQueue, ACTION_SPECS, PushConflictError, RateLimitScheduler
+
+GH_URL = "https://github.com/DISHDevEx/napp/blob/main/napp/open5gs_values/test.yaml"
+
+
+def mock_session(repo, remaining=4999, limit=5000):
+    """
+    Return a mocked GitHub session serving repo and reporting a rate limit budget.
+    """
+    session = MagicMock()
+    session.get_repo.return_value = repo
+    session.rate_limiting = (remaining, limit)
+    session.rate_limiting_resettime = time.time() + 3600
+    return session
+
+
+def init_git_repo(work, values_yaml):
+    """
+    Create a git repository at work whose main branch holds napp/open5gs_values/test.yaml.
+    """
+    (work / "napp" / "open5gs_values").mkdir(parents=True)
+    (work / "napp" / "open5gs_values" / "test.yaml").write_text(values_yaml)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+    subprocess.run(git + ["init", "-q", "-b", "main", str(work)], check=True)
+    subprocess.run(git + ["-C", str(work), "add", "."], check=True)
+    subprocess.run(git + ["-C", str(work), "commit", "-q", "-m", "init"], check=True)
+    return work
+
+
+def test_fetch_update_push_batch(sample_values_yaml):
+    """
+    This is a unit test.
+    It ensures that a batch of changes across pods and value files is pushed as a single commit.
+    Expected behavior is one blob per file, one tree, one commit, and one reference update.
+    """
+    hndl = ActionHandler("token", GH_URL, "napp")
+    repo = MagicMock()
+    repo.get_contents.return_value.decoded_content = sample_values_yaml.encode()
+    repo.create_git_blob.return_value.sha = "0" * 40
+    hndl.backend.session = mock_session(repo)
+
+    hndl.fetch_update_push_batch(
+        [
+            {
+                "action_type": "lim_req",
+                "requested_actions": {
+                    "target_pod": "amf",
+                    "requests": {"memory": "32Mi", "cpu": "100m"},
+                    "limits": {"memory": "64Mi", "cpu": "100m"},
+                },
+            },
+            {
+                "action_type": "upf_sizing",
+                "requested_actions": {"target_pod": "upf", "values": "Small"},
+            },
+            {
+                "value_file": "napp/open5gs_values/other.yaml",
+                "action_type": "upf_sizing",
+                "requested_actions": {"target_pod": "upf", "values": "Small"},
+            },
+        ]
+    )
+
+    assert repo.create_git_blob.call_count == 2
+    repo.create_git_tree.assert_called_once()
+    repo.create_git_commit.assert_called_once()
+    repo.get_git_ref.return_value.edit.assert_called_once()
+
+    pushed = yaml.safe_load(repo.create_git_blob.call_args_list[0].args[0])
+    assert pushed["amf"]["resources"]["requests"]["memory"] == "32Mi"
+    assert pushed["upf"]["affinity"]["nodeAffinity"][
+        "requiredDuringSchedulingIgnoredDuringExecution"
+    ]["nodeSelectorTerms"][0]["matchExpressions"][0]["values"] == ["Small"]
+
+
+def test_get_value_file_contents_conditional(sample_values_yaml):
+    """
+    This is a unit test.
+    It ensures that repeated fetches of an unchanged value file revalidate the cached copy.
+    Expected behavior is one full download, then conditional requests that reuse the cached contents.
+    """
+    hndl = ActionHandler("token", GH_URL, "napp")
+    repo = MagicMock()
+    repo.full_name = "DISHDevEx/napp"
+    content_file = repo.get_contents.return_value
+    content_file.sha = "a" * 40
+    content_file.decoded_content = sample_values_yaml.encode()
+    content_file.update.return_value = False
+    hndl.backend.session = mock_session(repo)
+
+    first = hndl.get_value_file_contents()
+    second = hndl.get_value_file_contents()
+
+    assert first is second
+    assert hndl.response_sha == "a" * 40
+    hndl.backend.session.get_repo.assert_called_once()
+    repo.get_contents.assert_called_once()
+    content_file.update.assert_called_once()
+
+
+def test_generate_updated_value_file_preserves_layout(sample_values_yaml):
+    """
+    This is a unit test.
+    It ensures that updating a fetched value file only rewrites the target nodes.
+    Expected behavior is that comments and key order survive, and only the changed values differ.
+    """
+    hndl = ActionHandler(
+        "token",
+        GH_URL,
+        "napp",
+        {
+            "target_pod": "amf",
+            "requests": {"cpu": "150m", "memory": "64Mi"},
+            "limits": {"cpu": "300m", "memory": "128Mi"},
+        },
+    )
+    repo = MagicMock()
+    repo.full_name = "DISHDevEx/napp"
+    repo.get_contents.return_value.sha = "a" * 40
+    repo.get_contents.return_value.decoded_content = sample_values_yaml.encode()
+    hndl.backend.session = mock_session(repo)
+
+    current_values = hndl.get_value_file_contents()
+    updated_file = hndl.generate__updated_value_file_lim_req(current_values)
+
+    changed_lines = [
+        (old, new)
+        for old, new in zip(sample_values_yaml.splitlines(), updated_file.splitlines())
+        if old != new
+    ]
+    assert changed_lines == [("      cpu: 100m", "      cpu: 150m"), ("      cpu: 200m", "      cpu: 300m")]
+    assert len(updated_file.splitlines()) == len(sample_values_yaml.splitlines())
+    assert current_values["amf"]["resources"]["requests"]["cpu"] == "100m"
+
+
+def test_action_spec_replicas(sample_values_yaml):
+    """
+    This is a unit test.
+    It ensures that a declarative action spec builds patches and checks its paths against a fetched file.
+    Expected behavior is a single replicaCount patch, and a KeyError for a pod missing from the file.
+    """
+    values = yaml.safe_load(sample_values_yaml)
+    spec = ACTION_SPECS["replicas"]
+
+    spec.check(values, {"target_pod": "amf", "replicas": 3})
+    assert spec.patches({"target_pod": "amf", "replicas": 3}) == [(("amf", "replicaCount"), 3)]
+    with pytest.raises(KeyError):
+        spec.check(values, {"target_pod": "smf", "replicas": 3})
+
+
+def test_actuation_queue_coalesces():
+    """
+    This is a unit test.
+    It ensures that changes submitted while a push is pending are merged into one push.
+    Expected behavior is a single batched push carrying only the latest change per target.
+    """
+    hndl = MagicMock()
+    hndl.value_file_dir = "napp/open5gs_values"
+    hndl.value_file_name = "test.yaml"
+    hndl.fetch_update_push_batch.return_value = "c" * 40
+    queue = ActuationQueue(hndl, coalesce_window=0.2)
+
+    futures = [
+        queue.submit({"target_pod": "upf", "values": size}, "upf_sizing")
+        for size in ("Small", "Large", "Small")
+    ]
+    futures.append(queue.submit({"target_pod": "amf", "replicas": 2}, "replicas"))
+    queue.close()
+
+    assert [future.result() for future in futures] == ["c" * 40] * 4
+    hndl.fetch_update_push_batch.assert_called_once()
+    changes = hndl.fetch_update_push_batch.call_args.args[0]
+    assert [change["requested_actions"] for change in changes] == [
+        {"target_pod": "upf", "values": "Small"},
+        {"target_pod": "amf", "replicas": 2},
+    ]
+
+
+def test_rate_limit_scheduler():
+    """
+    This is a unit test.
+    It ensures that requests are paced to the budget reported by GitHub.
+    Expected behavior is a burst, then waits at the sustainable rate, low priority refusals
+    within the reserve, and a hold for the time given by Retry-After.
+    """
+    now = [1000.0]
+    scheduler = RateLimitScheduler(
+        burst=2, reserve=0.2, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds)
+    )
+    scheduler.update(remaining=100, limit=100, reset_time=now[0] + 100)
+
+    assert scheduler.acquire() and scheduler.acquire()
+    assert scheduler.delay() == pytest.approx(100 / 98)
+    assert scheduler.acquire()
+    assert now[0] == pytest.approx(1000 + 100 / 98)
+
+    scheduler.update(remaining=20, limit=100, reset_time=now[0] + 100)
+    assert not scheduler.acquire(priority="low", block=False)
+    assert scheduler.delay(priority="high") == pytest.approx(100 / 20, rel=0.02)
+
+    scheduler.update_from_headers({"Retry-After": "30", "X-RateLimit-Remaining": "90"})
+    assert scheduler.delay() == pytest.approx(30)
+
+
+def test_actuation_queue_defers_low_priority():
+    """
+    This is a unit test.
+    It ensures that low priority changes wait for the rate limit budget while high priority ones do not.
+    Expected behavior is no push while the scheduler defers, then one push once a high priority change arrives.
+    """
+    hndl = MagicMock()
+    hndl.value_file_dir = "napp/open5gs_values"
+    hndl.value_file_name = "test.yaml"
+    hndl.fetch_update_push_batch.return_value = "c" * 40
+    scheduler = MagicMock()
+    scheduler.delay.return_value = 60.0
+    queue = ActuationQueue(hndl, coalesce_window=0.05, scheduler=scheduler)
+
+    low = queue.submit({"target_pod": "upf", "values": "Small"}, "upf_sizing", priority="low")
+    time.sleep(0.3)
+    assert not low.done()
+    hndl.fetch_update_push_batch.assert_not_called()
+
+    high = queue.submit({"target_pod": "amf", "replicas": 2}, "replicas", priority="high")
+    assert high.result(timeout=5) == low.result(timeout=5) == "c" * 40
+    hndl.fetch_update_push_batch.assert_called_once()
+    queue.close()
+
+
+def test_local_git_backend(tmp_path, sample_values_yaml):
+    """
+    This is an integration test.
+    It ensures that a 'file://' url commits straight into a git repository on disk.
+    Expected behavior is one new commit per push in the working tree and in a bare clone of it.
+    """
+    work = init_git_repo(tmp_path / "napp", sample_values_yaml)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+    subprocess.run(git + ["clone", "-q", "--bare", str(work), str(tmp_path / "napp.git")], check=True)
+
+    for repo in (work, tmp_path / "napp.git"):
+        hndl = ActionHandler(
+            "token",
+            f"file://{repo}/blob/main/napp/open5gs_values/test.yaml",
+            "napp",
+            {"target_pod": "upf", "values": "Small"},
+        )
+        hndl.fetch_update_push("upf_sizing")
+
+        log = subprocess.run(
+            ["git", "-C", str(repo), "log", "--format=%s", "main"],
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        assert log == ["auto-update", "init"]
+        values = hndl.get_value_file_contents()
+        assert values["upf"]["affinity"]["nodeAffinity"][
+            "requiredDuringSchedulingIgnoredDuringExecution"
+        ]["nodeSelectorTerms"][0]["matchExpressions"][0]["values"] == ["Small"]
+
+    assert "- Small  # Managed" in (work / "napp" / "open5gs_values" / "test.yaml").read_text()
+
+
+def test_shadow_mode(tmp_path, sample_values_yaml):
+    """
+    This is an integration test.
+    It ensures that shadow mode journals the diff a push would make without committing it.
+    Expected behavior is an unchanged repository, one journal entry per cycle, and recorded phase timings.
+    """
+    work = init_git_repo(tmp_path / "napp", sample_values_yaml)
+    journal = tmp_path / "shadow.jsonl"
+    hndl = ActionHandler(
+        "token",
+        f"file://{work}/blob/main/napp/open5gs_values/test.yaml",
+        "napp",
+        {"target_pod": "upf", "values": "Small"},
+        shadow_journal=str(journal),
+    )
+    hndl.fetch_update_push("upf_sizing")
+    hndl.fetch_update_push("upf_sizing")
+
+    log = subprocess.run(
+        ["git", "-C", str(work), "log", "--format=%s", "main"],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    assert log == ["init"]
+    assert (work / "napp" / "open5gs_values" / "test.yaml").read_text() == sample_values_yaml
+
+    entries = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert len(entries) == 2
+    diff = entries[1]["files"][0]["diff"]
+    assert "-            - Large  # Managed by the sizing agents." in diff
+    assert "+            - Small  # Managed by the sizing agents." in diff
+    assert set(entries[1]["timings"]) == {"fetch", "patch", "serialize", "push"}
+    assert set(hndl.timings) == {"fetch", "patch", "serialize", "push"}
+
+
+def test_push_conflict_retry(tmp_path, sample_values_yaml):
+    """
+    This is an integration test.
+    It ensures that a push rejected because another agent changed the value file is re-applied on the new contents.
+    Expected behavior is both agents' changes in the file, and a PushConflictError once retries are exhausted.
+    """
+    work = init_git_repo(tmp_path / "napp", sample_values_yaml)
+    url = f"file://{work}/blob/main/napp/open5gs_values/test.yaml"
+    other = ActionHandler("token", url, "napp", {"target_pod": "amf", "replicas": 3})
+
+    def racing(hndl):
+        # The other agent pushes right after the first fetch of hndl.
+        fetch_file = hndl.backend.fetch_file
+
+        def fetch_then_race(*args):
+            result = fetch_file(*args)
+            other.fetch_update_push("replicas")
+            hndl.backend.fetch_file = fetch_file
+            return result
+
+        hndl.backend.fetch_file = fetch_then_race
+        return hndl
+
+    hndl = racing(ActionHandler("token", url, "napp", {"target_pod": "upf", "values": "Small"}, retry_backoff=0))
+    hndl.fetch_update_push("upf_sizing")
+
+    values = yaml.safe_load((work / "napp" / "open5gs_values" / "test.yaml").read_text())
+    assert values["amf"]["replicaCount"] == 3
+    assert values["upf"]["affinity"]["nodeAffinity"][
+        "requiredDuringSchedulingIgnoredDuringExecution"
+    ]["nodeSelectorTerms"][0]["matchExpressions"][0]["values"] == ["Small"]
+
+    other.set_requested_actions({"target_pod": "amf", "replicas": 4})
+    hndl = racing(ActionHandler("token", url, "napp", {"target_pod": "upf", "values": "Large"}, max_push_retries=0))
+    with pytest.raises(PushConflictError):
+        hndl.fetch_update_push("upf_sizing")
+
+
+def test_actuation_queue_reads_between_pushes():
+    """
+    This is a unit test.
+    It ensures that reading the value file through the queue never overlaps a push by its worker.
+    Expected behavior is the read waiting for the push in flight to finish.
+    """
+    events = []
+
+    def push(changes, message):
+        events.append("push start")
+        time.sleep(0.3)
+        events.append("push end")
+        return "c" * 40
+
+    hndl = MagicMock()
+    hndl.value_file_dir = "napp/open5gs_values"
+    hndl.value_file_name = "test.yaml"
+    hndl.fetch_update_push_batch.side_effect = push
+    hndl.get_value_file_contents.side_effect = lambda: events.append("read") or {"upf": {}}
+    queue = ActuationQueue(hndl, coalesce_window=0)
+
+    future = queue.submit({"target_pod": "upf", "values": "Small"}, "upf_sizing")
+    while not events:
+        time.sleep(0.01)
+    assert queue.get_value_file_contents() == {"upf": {}}
+    assert events == ["push start", "push end", "read"]
+    assert future.result(timeout=5) == "c" * 40
+    queue.close()
@@ -4,7 +4,12 @@ Test all functions related to agent advisors.
 
 import sys
 import os
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
+import pytest
+import requests
 from nose.tools import assert_is_not_none
 
 # # Set path for local imports
@@ -33,3 +38,32 @@ def test_prometheus_advisor(prom_memory_query, sample_response):
         results = prom_client_advisor.run_queries()
 
         assert_is_not_none(results)
+
+
+def test_prometheus_advisor_timeout():
+    """
+    This is a unit test.
+    It ensures that a query to a Prometheus server that stops answering is abandoned after the timeout.
+    Expected behavior is the request failing once its few retries have timed out, long before the server answers.
+    """
+    release = threading.Event()
+
+    class SlowServer(BaseHTTPRequestHandler):
+        def do_GET(self):
+            release.wait(timeout=60)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        prom_client_advisor = PromClient(f"http://127.0.0.1:{server.server_port}", timeout=0.2)
+        prom_client_advisor.set_queries_by_list(["up"])
+        start = time.monotonic()
+        with pytest.raises(requests.RequestException):
+            prom_client_advisor.run_queries()
+        assert time.monotonic() - start < 30
+    finally:
+        release.set()
+        server.shutdown()
@@ -0,0 +1,167 @@
+"""
+Test the BBO agent study loop against simulated UPFs and a stub study.
+"""
+
+import sys
+import os
+import itertools
+import numpy as np
+import pytest
+
+pytest.importorskip("vizier")
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/agent_bbo.py'])))
+from vizier.service import pyvizier as vz
+import agent_bbo
+from agent_bbo import build_study, resume_trials, run_study
+from simulation import UpfSimulator
+from upf_sizing import simulator_slot
+from utilities import CycleScheduler
+
+
+class StubTrial:
+    """Trial of a StubStudy, recording what the agent reports to it."""
+
+    def __init__(self, trial_id, size, status=vz.TrialStatus.ACTIVE, fonpr_metadata=None, stop=False):
+        self.id = trial_id
+        self.parameters = {"size": size}
+        self.status = status
+        self.metadata = vz.Metadata()
+        self.metadata.ns("fonpr").update(fonpr_metadata or {})
+        self.stop = stop
+        self.measurements = []
+        self.final = None
+        self.infeasible_reason = None
+
+    def materialize(self):
+        return self
+
+    def add_measurement(self, measurement):
+        self.measurements.append(measurement)
+
+    def check_early_stopping(self):
+        return self.stop
+
+    def update_metadata(self, metadata):
+        self.metadata.ns("fonpr").update(dict(metadata.ns("fonpr")))
+
+    def complete(self, measurement=None, infeasible_reason=None):
+        self.final = measurement
+        self.infeasible_reason = infeasible_reason
+        self.status = vz.TrialStatus.COMPLETED
+
+
+class StubStudy:
+    """Study suggesting sizes in a fixed order; stops early the trials whose ids are in stop."""
+
+    def __init__(self, sizes=("Large", "Small"), trials=(), stop=()):
+        self.sizes = itertools.cycle(sizes)
+        self.all_trials = list(trials)
+        self.stop = set(stop)
+        self.suggested = 0
+
+    def trials(self):
+        return list(self.all_trials)
+
+    def suggest(self, count=1):
+        suggestions = []
+        for _ in range(count):
+            trial_id = len(self.all_trials) + 1
+            suggestions.append(StubTrial(trial_id, next(self.sizes), stop=trial_id in self.stop))
+            self.all_trials.append(suggestions[-1])
+        self.suggested += count
+        return suggestions
+
+
+def simulated_slots(loads):
+    """Slots on simulated UPFs with constant loads sharing one clock, and a scheduler advancing it."""
+    times = np.arange(0, 86400, 60.0)
+    simulators = [UpfSimulator(times, np.full(len(times), load)) for load in loads]
+
+    def sleep(seconds):
+        for simulator in simulators:
+            simulator.sleep(seconds)
+
+    slots = [simulator_slot(simulator, f"simulated-{index}") for index, simulator in enumerate(simulators)]
+    scheduler = CycleScheduler(600, clock=simulators[0].time, sleep=sleep)
+    return simulators, slots, scheduler
+
+
+def test_run_study_parallel_slots():
+    """
+    This is a unit test.
+    It ensures that parallel slots run distinct trials and that each reward is credited to the trial that ran on the slot.
+    Expected behavior is two trials per slot, every trial run once, and the rewards of each slot reflecting its own load.
+    """
+    simulators, slots, scheduler = simulated_slots([1e8, 1e7])
+    study = StubStudy()
+
+    results = run_study(study, slots, num_trials=4, scheduler=scheduler, wait_time=3600, clock=simulators[0].time)
+
+    assert len(results) == 4 and len(study.all_trials) == 4
+    assert [result["slot"] for result in results].count("simulated-0") == 2
+    for trial in study.all_trials:
+        slot = trial.metadata.ns("fonpr")["slot"]
+        assert trial.final is not None and trial.final.elapsed_secs == pytest.approx(3600)
+        reward = trial.final.metrics["reward"].value
+        matches = [result for result in results if result["slot"] == slot and result["reward"] == reward]
+        assert matches and all(result["size"] == trial.parameters["size"] for result in matches)
+        # Slot 0 serves ten times the load of slot 1.
+        assert (reward > 500) == (slot == "simulated-0")
+
+
+def test_run_study_resumes():
+    """
+    This is a unit test.
+    It ensures that a restarted study carries on its trials instead of running them again.
+    Expected behavior is the applied trial measured from its original start, the unapplied one applied
+    before any new suggestion, seeded and completed trials counted as such, and no trial paid for twice.
+    """
+    simulators, slots, scheduler = simulated_slots([1e8, 1e8])
+    seeded = StubTrial(1, "Small", vz.TrialStatus.COMPLETED, {"seed_window": "1690000000:Small"})
+    completed = StubTrial(2, "Large", vz.TrialStatus.COMPLETED, {"slot": "simulated-0", "applied_at": "-7200.0"})
+    applied = StubTrial(3, "Large", fonpr_metadata={"slot": "simulated-0", "applied_at": "-1800.0"})
+    unapplied = StubTrial(4, "Small")
+    study = StubStudy(trials=[seeded, completed, applied, unapplied])
+
+    pending, unapplied_trials, started = resume_trials(study, slots)
+    assert list(pending) == [0] and pending[0][0] is applied and pending[0][3] == -1800.0
+    assert unapplied_trials == [unapplied]
+    assert started == 2
+
+    results = run_study(study, slots, num_trials=3, scheduler=scheduler, wait_time=3600, clock=simulators[0].time)
+
+    assert study.suggested == 0
+    assert [(result["slot"], result["size"]) for result in results] == [("simulated-0", "Large"), ("simulated-1", "Small")]
+    # Measured an hour after it was first applied, half an hour into this run.
+    assert applied.final.elapsed_secs == pytest.approx(3600) and len(applied.measurements) == 3
+    assert unapplied.metadata.ns("fonpr")["slot"] == "simulated-1" and unapplied.final.elapsed_secs == pytest.approx(3600)
+    assert simulators[0].now == pytest.approx(3600)
+
+
+def test_run_study_stops_early(monkeypatch):
+    """
+    This is a unit test.
+    It ensures that the study enables automated stopping, and that a trial Vizier stops is completed early, freeing its slot.
+    Expected behavior is the stopped trial completed with its first intermediate measurement and the next trial applied on the same tick.
+    """
+    monkeypatch.setattr(
+        agent_bbo.clients.Study, "from_study_config", lambda config, owner, study_id: config
+    )
+    config = build_study("test")
+    assert config.automated_stopping_config is not None
+    assert config.algorithm == "GAUSSIAN_PROCESS_BANDIT"
+
+    simulators, slots, scheduler = simulated_slots([1e8])
+    study = StubStudy(stop={1})
+
+    results = run_study(study, slots, num_trials=2, scheduler=scheduler, wait_time=3600, clock=simulators[0].time)
+
+    first, second = study.all_trials
+    assert first.final.elapsed_secs == pytest.approx(600) and len(first.measurements) == 1
+    assert float(second.metadata.ns("fonpr")["applied_at"]) == pytest.approx(600)
+    assert second.final.elapsed_secs == pytest.approx(3600) and len(second.measurements) == 5
+    assert [result["elapsed"] for result in results] == pytest.approx([600, 3600])
+    assert simulators[0].now == pytest.approx(4200)
@@ -0,0 +1,213 @@
+"""
+Test the V0 agent's resource recommendation logic.
+"""
+
+import sys
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/action_handler'])))
+from agent_v0 import (
+    usage_table,
+    recommend_lim_reqs,
+    pod_to_target,
+    build_lim_req_actions,
+    quantile_table,
+    recommend_lim_reqs_quantile,
+    load_clusters,
+    execute_fleet_cycle,
+)
+import agent_v0
+from utilities import CycleScheduler
+
+
+def instant_result(values: dict) -> list:
+    """
+    Build a Prometheus instant query result from a {pod : value} dictionary.
+    """
+    return [
+        {"metric": {"pod": pod}, "value": [1690000000.0, str(value)]}
+        for pod, value in values.items()
+    ]
+
+
+def range_result(series: dict) -> list:
+    """
+    Build a Prometheus range (matrix) result from a {pod : [value, ...]} dictionary.
+    """
+    return [
+        {
+            "metric": {"pod": pod},
+            "values": [[1690000000.0 + 60 * step, str(value)] for step, value in enumerate(values)],
+        }
+        for pod, values in series.items()
+    ]
+
+
+def test_usage_table_joins_by_pod():
+    """
+    This is a unit test.
+    It ensures that query results are matched by pod label rather than by position.
+    Expected behavior is aligned rows for shuffled results, and NaN for a pod missing from one result.
+    """
+    pods = ["open5gs-amf-5f8d9c7b6-x2x7z", "open5gs-smf-6c4b8d7f9-kq2lp", "open5gs-upf-7d9f6c5b4-zz9wm"]
+    max_cpu = dict(zip(pods, [0.3, 0.02, 1.5]))
+    avg_cpu = dict(zip(pods, [0.2, 0.01, 1.0]))
+    max_memory = dict(zip(pods, [128e6, 64e6, 512e6]))
+    avg_memory = {pods[0]: 96e6, pods[2]: 256e6}
+
+    results = [instant_result(values) for values in (max_cpu, avg_cpu, max_memory, avg_memory)]
+    for result in results:
+        random.shuffle(result)
+    table = usage_table(results)
+
+    assert table.loc[pods[2]].tolist() == [1.5, 1.0, 512e6, 256e6]
+    assert pd.isna(table.loc[pods[1], "avg_memory"])
+
+
+def test_recommend_lim_reqs():
+    """
+    This is a unit test.
+    It ensures that requests follow average usage and limits follow maximum usage with headroom, for every pod.
+    Expected behavior is one recommendation per target, floored CPU values, and one batched lim_req action each.
+    """
+    table = pd.DataFrame(
+        {
+            "max_cpu": [0.3, 0.02, 0.25],
+            "avg_cpu": [0.2, 0.01, 0.15],
+            "max_memory": [128e6, 64e6, 100e6],
+            "avg_memory": [96e6, 32e6, 80e6],
+        },
+        index=["open5gs-amf-5f8d9c7b6-x2x7z", "open5gs-smf-6c4b8d7f9-kq2lp", "open5gs-amf-5f8d9c7b6-b2c4d"],
+    )
+
+    recommendations = recommend_lim_reqs(table)
+
+    assert list(pod_to_target(table.index)) == ["amf", "smf", "amf"]
+    assert recommendations.loc["amf"].tolist() == ["200m", "96Mi", "315m", "134Mi"]
+    assert recommendations.loc["smf"].tolist() == ["100m", "32Mi", "100m", "67Mi"]
+
+    batched_actions = build_lim_req_actions(recommendations, targets={"smf"})
+    assert batched_actions == [
+        {
+            "action_type": "lim_req",
+            "requested_actions": {
+                "target_pod": "smf",
+                "requests": {"memory": "32Mi", "cpu": "100m"},
+                "limits": {"memory": "67Mi", "cpu": "100m"},
+            },
+        }
+    ]
+
+
+def test_recommend_lim_reqs_quantile():
+    """
+    This is a unit test.
+    It ensures that quantile based requests and limits are computed from raw usage samples of every pod.
+    Expected behavior is limits unaffected by a single spike, and NaN padding for shorter series.
+    """
+    cpu = [0.1] * 98 + [0.2, 5.0]  # One spike
+    memory = [100e6] * 100
+    results = [
+        range_result({"open5gs-amf-5f8d9c7b6-x2x7z": cpu, "open5gs-smf-6c4b8d7f9-kq2lp": cpu[:50]}),
+        range_result({"open5gs-amf-5f8d9c7b6-x2x7z": memory, "open5gs-smf-6c4b8d7f9-kq2lp": memory[:50]}),
+    ]
+
+    table = quantile_table(results)
+    assert list(table.columns) == [
+        "cpu_p50", "cpu_p90", "cpu_p99", "memory_p50", "memory_p90", "memory_p99"
+    ]
+    assert table.loc["open5gs-smf-6c4b8d7f9-kq2lp", "cpu_p99"] == pytest.approx(0.1)
+
+    recommendations = recommend_lim_reqs_quantile(table, request_quantile=0.9, limit_quantile=0.9, headroom=1.1)
+    assert recommendations.loc["amf"].tolist() == ["100m", "100Mi", "110m", "110Mi"]
+
+
+def test_execute_fleet_cycle(tmp_path, monkeypatch):
+    """
+    This is a unit test.
+    It ensures that the clusters of a fleet are updated concurrently, with per-cluster options and isolated failures.
+    Expected behavior is all cycles running at once, handlers kept for healthy clusters, and the failure reported for its cluster only.
+    """
+    clusters_file = tmp_path / "clusters.yaml"
+    clusters_file.write_text(
+        "".join(
+            f"- name: {name}\n  prom_endpoint: http://{name}:9090\n  gh_url: https://github.com/o/r/blob/main/{name}.yaml\n  dir_name: ''\n"
+            for name in ["a", "b", "c"]
+        )
+        + "  targets: [amf]\n"
+    )
+    clusters = load_clusters(clusters_file)
+    assert [cluster["name"] for cluster in clusters] == ["a", "b", "c"]
+
+    barrier = threading.Barrier(3, timeout=5)
+    calls = {}
+
+    def fake_cycle(prom_endpoint, gh_url, dir_name, hndl=None, cancel=None, **kwargs):
+        calls[prom_endpoint] = (hndl, kwargs["targets"])
+        barrier.wait()  # Only passes if the three clusters run concurrently.
+        if prom_endpoint == "http://b:9090":
+            raise RuntimeError("prometheus unreachable")
+        return f"handler-{prom_endpoint}"
+
+    monkeypatch.setattr(agent_v0, "execute_agent_cycle", fake_cycle)
+    handlers = {"a": "previous-a"}
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        errors = execute_fleet_cycle(clusters, handlers, executor, targets=None)
+
+    assert list(errors) == ["b"]
+    assert handlers == {"a": "handler-http://a:9090", "c": "handler-http://c:9090"}
+    assert calls["http://a:9090"] == ("previous-a", None)
+    assert calls["http://c:9090"] == (None, ["amf"])
+
+    clusters_file.write_text("- name: a\n  prom_endpoint: x\n")
+    with pytest.raises(ValueError):
+        load_clusters(clusters_file)
+
+
+def test_execute_fleet_cycle_hung_cluster(monkeypatch):
+    """
+    This is a unit test.
+    It ensures that a cluster whose cycle hangs does not hold back the rest of the fleet.
+    Expected behavior is the healthy cluster updated on every tick, the hung one left in flight and skipped
+    until it returns, no tick skipped by the scheduler, and the hung cluster's handler kept once it returns.
+    """
+    clusters = [
+        {"name": name, "prom_endpoint": name, "gh_url": f"https://github.com/o/r/blob/main/{name}.yaml", "dir_name": ""}
+        for name in ("a", "b")
+    ]
+    release = threading.Event()
+    calls = {"a": 0, "b": 0}
+
+    def fake_cycle(prom_endpoint, gh_url, dir_name, hndl=None, cancel=None, **kwargs):
+        calls[prom_endpoint] += 1
+        if prom_endpoint == "a":
+            release.wait(timeout=10)  # Slow, not failing.
+        return f"handler-{prom_endpoint}-{calls[prom_endpoint]}"
+
+    monkeypatch.setattr(agent_v0, "execute_agent_cycle", fake_cycle)
+    handlers, in_flight, errors = {}, {}, []
+    scheduler = CycleScheduler(0.2, deadline=0.1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        scheduler.run(
+            lambda cancel: errors.append(execute_fleet_cycle(clusters, handlers, executor, cancel, in_flight)),
+            max_cycles=5,
+        )
+        assert calls == {"a": 1, "b": 5}
+        assert handlers == {"b": "handler-b-5"}
+        assert all(tick["status"] != "skipped" for tick in scheduler.ticks)
+        assert [list(cycle_errors) for cycle_errors in errors] == [["a"]] * 5
+        assert list(in_flight) == ["a"]
+
+        release.set()
+        in_flight["a"].result(timeout=5)
+        assert execute_fleet_cycle(clusters, handlers, executor, in_flight=in_flight, timeout=5) == {}
+
+    assert calls == {"a": 2, "b": 6}
+    assert handlers == {"a": "handler-a-2", "b": "handler-b-6"} and in_flight == {}
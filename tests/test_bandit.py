@@ -0,0 +1,109 @@
+"""
+Test the discounted bandit and the bandit agent cycle.
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/agent_bandit.py'])))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/utilities'])))
+from utilities import DiscountedBandit
+from simulation import UpfSimulator
+from upf_sizing import simulator_slot
+from agent_bandit import execute_bandit_cycle, load_bandit
+
+
+@pytest.mark.parametrize("strategy", ["thompson", "ucb"])
+def test_bandit_follows_best_arm(strategy):
+    """
+    This is a unit test.
+    It ensures that the bandit tries every arm, settles on the best one, and follows a change of the best arm.
+    Expected behavior is each arm tried first, then the better arm played most, and again after the rewards swap.
+    """
+    bandit = DiscountedBandit(["Small", "Large"], strategy=strategy, discount=0.9, seed=0)
+    rng = np.random.default_rng(0)
+    rewards = {"Small": 1.0, "Large": 0.0}
+
+    played = []
+    for _ in range(100):
+        arm = bandit.select()
+        bandit.update(arm, rewards[arm] + 0.1 * rng.standard_normal())
+        played.append(arm)
+    assert set(played[:2]) == {"Small", "Large"}
+    assert played[50:].count("Small") > 40
+
+    rewards = {"Small": 0.0, "Large": 1.0}
+    played = []
+    for _ in range(100):
+        arm = bandit.select()
+        bandit.update(arm, rewards[arm] + 0.1 * rng.standard_normal())
+        played.append(arm)
+    assert played[50:].count("Large") > 40
+
+
+def test_bandit_save_load(tmp_path):
+    """
+    This is a unit test.
+    It ensures that the bandit state survives a save and load.
+    Expected behavior is the same statistics, settings and pending arm after loading.
+    """
+    bandit = DiscountedBandit(["Small", "Large"], strategy="ucb", discount=0.95)
+    bandit.update("Small", 2.0)
+    bandit.update("Large", 1.0)
+    bandit.pending = "Small"
+    bandit.save(tmp_path / "bandit.json")
+
+    loaded = DiscountedBandit.load(tmp_path / "bandit.json")
+    assert loaded.strategy == "ucb" and loaded.discount == 0.95 and loaded.pending == "Small"
+    assert loaded.means() == pytest.approx(bandit.means())
+    np.testing.assert_allclose(loaded.counts, [0.95, 1.0])
+    assert loaded.select() == bandit.select()
+
+
+def test_execute_bandit_cycle(tmp_path):
+    """
+    This is a unit test.
+    It ensures that a cycle rewards the size applied on the previous cycle, then applies the next size, saving the state.
+    Expected behavior is the pending size applied to the simulator, rewarded on the next cycle, and restored from the state file.
+    """
+    times = np.arange(0, 86400, 60.0)
+    simulator = UpfSimulator(times, np.full(len(times), 1e8))
+    slot = simulator_slot(simulator)
+    state = tmp_path / "bandit.json"
+
+    bandit = load_bandit(state, seed=0)
+    size = execute_bandit_cycle(bandit, slot, 3600, state)
+    assert simulator.size == size and bandit.pending == size
+    assert bandit.counts.sum() == 0
+
+    simulator.sleep(3600)
+    restored = load_bandit(state)
+    assert restored.pending == size
+    throughput = simulator.get_throughput(3600)
+    next_size = execute_bandit_cycle(restored, slot, 3600, state)
+    assert restored.means()[size] == pytest.approx(throughput * 3.33e-9 * 3600 - simulator.get_infra_cost(size))
+    assert restored.pending == next_size and simulator.size == next_size
+
+
+def test_load_bandit_settings(tmp_path):
+    """
+    This is a unit test.
+    It ensures that restoring a bandit keeps its statistics but applies the settings given, and rejects other arms.
+    Expected behavior is the given strategy and discount with the saved statistics, and a ValueError for different arms.
+    """
+    state = tmp_path / "bandit.json"
+    saved = DiscountedBandit(["Small", "Large"], strategy="thompson", discount=0.98)
+    saved.update("Large", 3.0)
+    saved.pending = "Small"
+    saved.save(state)
+
+    bandit = load_bandit(state, strategy="ucb", discount=0.9)
+    assert bandit.strategy == "ucb" and bandit.discount == 0.9
+    assert bandit.means()["Large"] == pytest.approx(3.0) and bandit.pending == "Small"
+
+    with pytest.raises(ValueError):
+        load_bandit(state, arms=("Small", "Medium", "Large"))
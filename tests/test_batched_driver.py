@@ -0,0 +1,111 @@
+"""
+Test the batched driver with fake drivers and a fake policy.
+"""
+
+import sys
+import os
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("tf_agents")
+pytest.importorskip("reverb")
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+from fonpr.tf_infrastructure import BatchedDriver
+from fonpr.tf_infrastructure.batched_driver import stack_nest, unstack_nest
+import tensorflow as tf
+import tf_agents
+from tf_agents.trajectories import policy_step
+
+
+def timestep(observation, step_type):
+    return tf_agents.trajectories.TimeStep(
+        discount=tf.constant(1.0, tf.float32),
+        observation=tf.constant(observation, tf.float64),
+        reward=tf.constant(observation[0], tf.float32),
+        step_type=tf.constant(step_type, tf.int64),
+    )
+
+
+class FakeDriver:
+    """Deployment whose observations start at base and grow by one per step, recording the actions it takes."""
+
+    def __init__(self, base, barrier):
+        self.base = base
+        self.step = 0
+        self.actions = []
+        self.barrier = barrier
+
+    def observe(self):
+        return np.array([self.base + self.step, 0, 0, 0, 0.1])
+
+    def build_timestep(self, observations, step_type):
+        return timestep(observations, step_type)
+
+    def take_action_get_next_timestep(self, action_step):
+        # Every deployment acts at once: the waits overlap.
+        self.barrier.wait(timeout=5)
+        self.actions.append(int(action_step.action))
+        self.step += 1
+        return self.build_timestep(self.observe(), 1)
+
+
+class BatchedPolicy:
+    """Policy acting on a batch: Large (1) where the observation is odd, recording the batch shapes."""
+
+    def __init__(self):
+        self.batch_shapes = []
+
+    def get_initial_state(self, batch_size):
+        return ()
+
+    def action(self, time_step, policy_state):
+        observations = time_step.observation.numpy()
+        self.batch_shapes.append(observations.shape)
+        return policy_step.PolicyStep(
+            action=(observations[:, 0] % 2).astype(np.int64), state=(), info=()
+        )
+
+
+def test_stack_unstack_nest():
+    """
+    This is a unit test.
+    It ensures that stacking timesteps along a batch dimension and selecting one again round-trips.
+    Expected behavior is each selected timestep equal to the one stacked at its index.
+    """
+    steps = [timestep([float(k), 1, 2, 3, 4], k % 3) for k in range(3)]
+    stacked = stack_nest(steps)
+    assert stacked.observation.shape == (3, 5) and stacked.step_type.shape == (3,)
+    for index, step in enumerate(steps):
+        for selected, original in zip(tf.nest.flatten(unstack_nest(stacked, index)), tf.nest.flatten(step)):
+            np.testing.assert_array_equal(selected.numpy(), original.numpy())
+
+
+def test_batched_driver_routes_experience():
+    """
+    This is a unit test.
+    It ensures that the batched driver calls the policy once per step on all deployments, and writes each deployment's experience to its own observer.
+    Expected behavior is one batched call per step, each deployment acting on its own observation, and per-deployment trajectories in order.
+    """
+    barrier = threading.Barrier(3)
+    drivers = [FakeDriver(base, barrier) for base in (0, 100, 201)]
+    written = [[] for _ in drivers]
+    observers = [lambda traj, record=record: record.append((float(traj.observation[0]), int(traj.action), float(traj.reward))) for record in written]
+    policy = BatchedPolicy()
+
+    last = BatchedDriver(drivers).drive(max_steps=3, policy=policy, observers=observers)
+
+    assert policy.batch_shapes == [(3, 5)] * 3
+    for driver, record in zip(drivers, written):
+        expected_actions = [(driver.base + step) % 2 for step in range(3)]
+        assert driver.actions == expected_actions
+        assert record == [
+            (float(driver.base + step), expected_actions[step], float(driver.base + step + 1)) for step in range(3)
+        ]
+    np.testing.assert_array_equal(last.observation.numpy()[:, 0], [3, 103, 204])
+
+    with pytest.raises(ValueError):
+        BatchedDriver(drivers).drive(max_steps=1, policy=policy, observers=observers[:2])
@@ -0,0 +1,93 @@
+"""
+Test the tf agents driver with stubbed observations and actions.
+"""
+
+import sys
+import os
+import time
+from concurrent.futures import Future
+import numpy as np
+import pytest
+
+pytest.importorskip("tf_agents")
+pytest.importorskip("reverb")
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+from fonpr.tf_infrastructure import Driver
+from tf_agents.trajectories import policy_step
+
+
+class AlternatingPolicy:
+    """Policy alternating Small (0) and Large (1), recording the observations it acts on."""
+
+    def __init__(self):
+        self.seen = []
+
+    def get_initial_state(self, batch_size):
+        return ()
+
+    def action(self, time_step, policy_state):
+        self.seen.append(float(time_step.observation[0]))
+        return policy_step.PolicyStep(action=np.int64(len(self.seen) % 2), state=(), info=())
+
+
+def stub_driver(pipelined, wait_period=0.3, query_time=0.15, push_time=0.1):
+    """Driver whose queries return a counter after query_time and whose pushes take push_time."""
+    driver = Driver(wait_period=wait_period, pipelined=pipelined)
+    calls = {"queries": 0, "pushes": []}
+
+    def get_observations():
+        time.sleep(query_time)
+        calls["queries"] += 1
+        return np.array([calls["queries"] - 1, 0, 0, 0, 0.1], dtype=float)
+
+    def update_yml(size, gh_url=None):
+        calls["pushes"].append(size)
+        future = Future()
+        time.sleep(push_time)
+        future.set_result(None)
+        return future
+
+    driver.get_observations = get_observations
+    driver.update_yml = update_yml
+    return driver, calls
+
+
+def recording_observer(write_time=0.2):
+    written = []
+
+    def observer(traj):
+        time.sleep(write_time)
+        written.append((float(traj.observation[0]), int(traj.action), int(traj.step_type)))
+
+    return observer, written
+
+
+def test_drive_pipelined_matches_sequential_and_overlaps():
+    """
+    This is a unit test.
+    It ensures that pipelined driving records the same experience as sequential driving, in order, while overlapping its work.
+    Expected behavior is identical trajectories and actions, and steps costing about wait_period rather than wait_period plus push, query and write.
+    """
+    experience = {}
+    durations = {}
+    for pipelined in (False, True):
+        driver, calls = stub_driver(pipelined)
+        observer, written = recording_observer()
+        policy = AlternatingPolicy()
+        start = time.monotonic()
+        last = driver.drive(max_steps=4, policy=policy, observer=observer)
+        durations[pipelined] = time.monotonic() - start
+        experience[pipelined] = (written, calls["pushes"], policy.seen, float(last.observation[0]))
+
+    assert experience[True] == experience[False]
+    written, pushes, seen, last = experience[True]
+    assert written == [(0.0, 1, 0), (1.0, 0, 1), (2.0, 1, 1), (3.0, 0, 1)]
+    assert pushes == ["Large", "Small", "Large", "Small"] and seen == [0.0, 1.0, 2.0, 3.0] and last == 4.0
+
+    # Sequential: first query, then 4 x (push + wait + query + write) = 0.15 + 4 * 0.75 = 3.15s.
+    # Pipelined: first query, 4 x (push + wait), then the last write = 0.15 + 4 * 0.4 + 0.2 = 1.95s.
+    assert durations[False] > 3.0
+    assert durations[True] < 2.5
@@ -0,0 +1,143 @@
+"""
+Test the Kubernetes API actuator against a local fake API server.
+"""
+
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock
+import pytest
+import requests
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/action_handler'])))
+from action_handler import KubernetesActuator
+
+
+class FakeApiServer(BaseHTTPRequestHandler):
+    """
+    Record apply patches and answer them like the Kubernetes API server would.
+    """
+
+    requests = []
+
+    def do_PATCH(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeApiServer.requests.append((self.path, dict(self.headers), body))
+        if body["metadata"]["name"] in ("open5gs-missing", "open5gs-broken"):
+            self.send_response(404 if body["metadata"]["name"] == "open5gs-missing" else 500)
+            self.end_headers()
+            return
+        response = json.dumps({**body, "metadata": {**body["metadata"], "resourceVersion": "42"}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(response.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_server():
+    FakeApiServer.requests = []
+    server = HTTPServer(("127.0.0.1", 0), FakeApiServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_apply_upf_sizing(api_server):
+    """
+    This is an integration test.
+    It ensures that an action is sent as a server-side apply patch of the target Deployment.
+    Expected behavior is one forced apply holding only the node affinity, and a queued git reconcile.
+    """
+    reconcile = MagicMock()
+    actuator = KubernetesActuator(
+        api_server, "openverso", token="secret", reconcile=reconcile,
+        requested_actions={"target_pod": "upf", "values": "Small"},
+    )
+
+    assert actuator.fetch_update_push("upf_sizing") == "42"
+
+    (path, headers, body), = FakeApiServer.requests
+    assert path == (
+        "/apis/apps/v1/namespaces/openverso/deployments/open5gs-upf"
+        "?fieldManager=fonpr&force=true"
+    )
+    assert headers["Content-Type"] == "application/apply-patch+yaml"
+    assert headers["Authorization"] == "Bearer secret"
+    assert body["kind"] == "Deployment"
+    assert body["spec"]["template"]["spec"]["affinity"]["nodeAffinity"][
+        "requiredDuringSchedulingIgnoredDuringExecution"
+    ]["nodeSelectorTerms"][0]["matchExpressions"] == [
+        {"key": "size", "operator": "In", "values": ["Small"]}
+    ]
+    reconcile.submit.assert_called_once_with(
+        {"target_pod": "upf", "values": "Small"}, "upf_sizing", priority="low"
+    )
+
+
+def test_apply_batch(api_server):
+    """
+    This is an integration test.
+    It ensures that a batch of resources and replica changes is applied to each Deployment, and that failures surface.
+    Expected behavior is one apply per change, and an HTTPError for a missing Deployment.
+    """
+    actuator = KubernetesActuator(api_server, "openverso")
+    actuator.fetch_update_push_batch(
+        [
+            {
+                "action_type": "lim_req",
+                "requested_actions": {
+                    "target_pod": "amf",
+                    "requests": {"memory": "64Mi", "cpu": "100m"},
+                    "limits": {"memory": "128Mi", "cpu": "200m"},
+                },
+            },
+            {"action_type": "replicas", "requested_actions": {"target_pod": "smf", "replicas": 2}},
+        ]
+    )
+
+    lim_req, replicas = (body for _, _, body in FakeApiServer.requests)
+    assert lim_req["spec"]["template"]["spec"]["containers"] == [
+        {
+            "name": "amf",
+            "resources": {
+                "requests": {"memory": "64Mi", "cpu": "100m"},
+                "limits": {"memory": "128Mi", "cpu": "200m"},
+            },
+        }
+    ]
+    assert replicas["metadata"]["name"] == "open5gs-smf"
+    assert replicas["spec"] == {"replicas": 2}
+
+    with pytest.raises(requests.HTTPError):
+        actuator.apply("replicas", {"target_pod": "missing", "replicas": 1})
+
+
+def test_apply_batch_failure_reconciles_applied(api_server):
+    """
+    This is an integration test.
+    It ensures that when an apply of a batch fails, the changes already applied still reach git.
+    Expected behavior is the first change queued for reconciliation, the failing and later ones not applied nor queued, and the error raised.
+    """
+    reconcile = MagicMock()
+    actuator = KubernetesActuator(api_server, "openverso", reconcile=reconcile)
+    batched_actions = [
+        {"action_type": "replicas", "requested_actions": {"target_pod": target, "replicas": 2}}
+        for target in ("amf", "broken", "smf")
+    ]
+
+    with pytest.raises(requests.HTTPError):
+        actuator.fetch_update_push_batch(batched_actions)
+
+    assert [body["metadata"]["name"] for _, _, body in FakeApiServer.requests] == ["open5gs-amf", "open5gs-broken"]
+    reconcile.submit.assert_called_once_with(
+        {"target_pod": "amf", "replicas": 2}, "replicas", None, priority="low"
+    )
@@ -0,0 +1,58 @@
+"""
+Test building upf sizing observations from Prometheus results.
+"""
+
+import sys
+import os
+import random
+import numpy as np
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/utilities'])))
+from utilities import upf_observations, OBSERVATION_FEATURES
+
+
+def network_result(pods, value, containers=("",)):
+    return [
+        {"metric": {"pod": f"open5gs-upf-{pod}", "interface": interface, "node": f"node-{pod % 3}", "container": container}, "value": [1690000000, str(value(pod, interface))]}
+        for pod in range(pods)
+        for interface in ("eth0", "ogstun", "tunl0")
+        for container in containers
+    ]
+
+
+def sizing_result(nodes):
+    return [
+        {"metric": {"node": f"node-{node}", "label_beta_kubernetes_io_instance_type": "m4.large" if node % 2 else "t3.medium"}, "value": [1690000000, "1"]}
+        for node in range(nodes)
+    ]
+
+
+def test_upf_observations_layout():
+    """
+    This is a unit test.
+    It ensures that observations are joined on labels into the fixed feature layout.
+    Expected behavior is the same observation whatever the series order, each pod counted once,
+    unlisted interfaces left out, and only the nodes running upf pods priced.
+    """
+    rx = network_result(4, lambda pod, interface: 10.0 if interface == "eth0" else 1.0)
+    tx = network_result(4, lambda pod, interface: 20.0 if interface == "eth0" else 2.0, containers=("", "upf"))
+    expected = [40.0, 4.0, 80.0, 8.0, 0.0416 + 0.10 + 0.0416]
+
+    assert OBSERVATION_FEATURES == ("rx_eth0", "rx_ogstun", "tx_eth0", "tx_ogstun", "cost")
+    np.testing.assert_allclose(upf_observations(tx, rx, sizing_result(5)), expected)
+
+    random.seed(0)
+    random.shuffle(rx)
+    random.shuffle(tx)
+    np.testing.assert_allclose(upf_observations(tx, rx, sizing_result(5)), expected)
+
+
+def test_upf_observations_empty():
+    """
+    This is a unit test.
+    It ensures that an observation keeps its layout when there are no upf series.
+    Expected behavior is an observation of zeros.
+    """
+    np.testing.assert_array_equal(upf_observations([], [], sizing_result(2)), np.zeros(len(OBSERVATION_FEATURES)))
@@ -0,0 +1,69 @@
+"""
+Test the streaming quantile sketches.
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/utilities'])))
+from utilities import DDSketch, SketchStore
+
+
+def test_ddsketch_accuracy_and_merge():
+    """
+    This is a unit test.
+    It ensures that sketch quantiles stay within the relative accuracy, and that merged sketches match a single one.
+    Expected behavior is quantiles within 1% of NumPy's, identical merged results, and bounded bins.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=-2, sigma=1.5, size=20000)
+    quantiles = [0.5, 0.9, 0.99]
+
+    sketch = DDSketch(relative_accuracy=0.01)
+    sketch.add(values)
+    exact = np.quantile(values, quantiles, method="lower")
+    np.testing.assert_allclose(sketch.quantile(quantiles), exact, rtol=0.02)
+
+    first, second = DDSketch(), DDSketch()
+    first.add(values[:7000])
+    second.add(values[7000:])
+    first.merge(second)
+    np.testing.assert_array_equal(first.quantile(quantiles), sketch.quantile(quantiles))
+
+    bounded = DDSketch(max_bins=256)
+    bounded.add(values)
+    assert bounded.counts.size <= 256
+    assert bounded.quantile(0.99) == pytest.approx(sketch.quantile(0.99))
+    assert np.isnan(DDSketch().quantile(0.5))
+
+
+def test_sketch_store_window(tmp_path):
+    """
+    This is a unit test.
+    It ensures that the store ignores samples it already holds, forgets samples outside its window, and survives a checkpoint.
+    Expected behavior is quantiles of the last window only, and an identical table after save and load.
+    """
+    store = SketchStore(window=3600, bucket=600)
+    pod = "open5gs-amf-5f8d9c7b6-x2x7z"
+    timestamps = np.arange(0, 7200, 60.0)
+    cpu = np.where(timestamps < 3600, 5.0, 0.1)  # Busy first hour, idle second hour
+    result = [{"metric": {"pod": pod}, "values": [[t, str(v)] for t, v in zip(timestamps, cpu)]}]
+
+    store.update("cpu", result[:1])
+    store.update("cpu", result)  # Overlapping range: nothing is added twice
+    store.update("memory", [{"metric": {"pod": pod}, "values": [[t, "1e8"] for t in timestamps]}])
+
+    table = store.quantile_table()
+    assert table.loc[pod, "cpu_p50"] == pytest.approx(0.1, rel=0.01)
+    assert table.loc[pod, "memory_p99"] == pytest.approx(1e8, rel=0.01)
+    # The window is kept in whole buckets: the last hour plus the bucket it starts in.
+    assert sum(sketch.count for sketch in store.sketches[("cpu", pod)].values()) == 70
+    assert store.pending_seconds(7200) == 60
+
+    store.save(str(tmp_path / "sketches.json"))
+    restored = SketchStore.load(str(tmp_path / "sketches.json"))
+    assert restored.quantile_table().equals(table)
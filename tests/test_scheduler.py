@@ -0,0 +1,108 @@
+"""
+Test the fixed-rate cycle scheduler.
+"""
+
+import sys
+import os
+import threading
+import time
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/utilities'])))
+from utilities import CycleScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_cycle_scheduler_fixed_rate():
+    """
+    This is a unit test.
+    It ensures that cycles start on fixed-rate ticks regardless of their duration, and that ticks passing during an overrun are skipped.
+    Expected behavior is starts at 0, 10, 40 and 50 with no lag, and the ticks at 20 and 30 recorded as skipped.
+    """
+    clock = FakeClock()
+    durations = iter([3, 25, 3, 3])
+
+    def cycle(cancel):
+        clock.sleep(next(durations))
+
+    scheduler = CycleScheduler(10, clock=clock, sleep=clock.sleep)
+    scheduler.run(cycle, max_cycles=4)
+
+    started = [tick["scheduled"] for tick in scheduler.ticks if tick["status"] == "ok"]
+    skipped = [tick["scheduled"] for tick in scheduler.ticks if tick["status"] == "skipped"]
+    assert started == [0, 10, 40, 50]
+    assert skipped == [20, 30]
+    assert scheduler.lags() == [0, 0, 0, 0]
+    assert [tick["duration"] for tick in scheduler.ticks if tick["status"] == "ok"] == [3, 25, 3, 3]
+
+
+def test_cycle_scheduler_deadline():
+    """
+    This is a unit test.
+    It ensures that a cycle running past its deadline is cancelled and abandoned, and that a failing cycle does not stop the schedule.
+    Expected behavior is the first cycle cancelled, the second one still started, and the third one recorded as an error.
+    """
+    cancelled = threading.Event()
+    calls = []
+
+    def cycle(cancel):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            if cancel.wait(timeout=5):
+                cancelled.set()
+        elif len(calls) == 3:
+            raise RuntimeError("boom")
+
+    scheduler = CycleScheduler(0.05, deadline=0.02)
+    scheduler.run(cycle, max_cycles=3)
+
+    assert cancelled.wait(timeout=1)
+    assert calls == [0, 1, 2]
+    assert [tick["status"] for tick in scheduler.ticks if tick["started"] is not None] == [
+        "cancelled",
+        "ok",
+        "error",
+    ]
+
+    wait_scheduler = CycleScheduler(0.01)
+    assert wait_scheduler.wait_for_tick() < 0.01
+    assert wait_scheduler.wait_for_tick() >= 0
+
+
+def test_cycle_scheduler_waits_for_cancelled_cycle():
+    """
+    This is a unit test.
+    It ensures that a cancelled cycle that keeps running holds back the following ticks until it exits.
+    Expected behavior is no two cycles running at once, and the ticks during the overrun recorded as skipped.
+    """
+    running = []
+    overlaps = []
+
+    def cycle(cancel):
+        overlaps.append(len(running))
+        running.append(1)
+        try:
+            if len(overlaps) == 1:
+                # Ignores the cancellation for a few ticks.
+                time.sleep(0.2)
+        finally:
+            running.pop()
+
+    scheduler = CycleScheduler(0.05, deadline=0.02)
+    scheduler.run(cycle, max_cycles=2)
+
+    assert overlaps == [0, 0]
+    statuses = [tick["status"] for tick in scheduler.ticks]
+    assert statuses[0] == "cancelled" and statuses[-1] == "ok"
+    assert statuses.count("skipped") >= 2
@@ -0,0 +1,93 @@
+"""
+Test the action stabilizer.
+"""
+
+import sys
+import os
+import pytest
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/action_handler'])))
+from action_handler import ActionStabilizer, parse_quantity
+
+
+def lim_req(target_pod, cpu, memory) -> dict:
+    return {
+        "action_type": "lim_req",
+        "requested_actions": {
+            "target_pod": target_pod,
+            "requests": {"cpu": cpu, "memory": memory},
+            "limits": {"cpu": cpu, "memory": memory},
+        },
+    }
+
+
+def test_parse_quantity():
+    """
+    This is a unit test.
+    It ensures that Kubernetes quantities are converted to base units.
+    Expected behavior is cores and bytes, and None for non quantities.
+    """
+    assert parse_quantity("250m") == pytest.approx(0.25)
+    assert parse_quantity("512Mi") == 512 * 2**20
+    assert parse_quantity("1.5") == 1.5
+    assert parse_quantity(3) == 3.0
+    assert parse_quantity("Large") is None
+
+
+def test_stabilizer_dead_band_dwell_and_budget():
+    """
+    This is a unit test.
+    It ensures that the stabilizer drops small changes, early changes of a target unless urgent, and changes beyond the hourly budget.
+    Expected behavior is only the first, large, urgent and late changes allowed, up to the budget.
+    """
+    now = [0.0]
+    stabilizer = ActionStabilizer(min_dwell=1800, max_changes_per_hour=3, clock=lambda: now[0])
+
+    assert stabilizer.filter_batch([lim_req("amf", "200m", "128Mi")])
+    # 5% more cpu: within the relative dead-band.
+    now[0] = 3600
+    assert not stabilizer.filter_batch([lim_req("amf", "210m", "128Mi")])
+    # 20Mi more memory: beyond 10%, but within the absolute memory band.
+    assert not stabilizer.filter_batch([lim_req("amf", "200m", "148Mi")])
+    # 30% more cpu, after the dwell time.
+    assert stabilizer.filter_batch([lim_req("amf", "260m", "128Mi")])
+    # 30% more again, but too soon; doubling is urgent enough to skip the dwell time.
+    now[0] = 3700
+    assert not stabilizer.filter_batch([lim_req("amf", "338m", "128Mi")])
+    assert stabilizer.filter_batch([lim_req("amf", "520m", "128Mi")])
+    # Budget of 3 changes per hour: changes at 3600 and 3700 count, one left.
+    batch = [lim_req("smf", "100m", "128Mi"), lim_req("upf", "100m", "128Mi")]
+    assert [change["requested_actions"]["target_pod"] for change in stabilizer.filter_batch(batch)] == ["smf"]
+    now[0] = 7300
+    assert stabilizer.filter_batch(batch[1:])
+
+    # Categorical actions only change when the value does; nothing is recorded until actuated.
+    sizing = {"target_pod": "upf", "values": "Large"}
+    assert stabilizer.allow("upf_sizing", sizing, record=False)
+    assert stabilizer.allow("upf_sizing", sizing, record=False)
+    stabilizer.record("upf_sizing", sizing)
+    assert not stabilizer.allow("upf_sizing", sizing)
+    now[0] = 10000
+    assert stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Small"})
+
+
+def test_stabilizer_damps_categorical_flip_flop():
+    """
+    This is a unit test.
+    It ensures that categorical changes, which have no size, never skip the dwell time.
+    Expected behavior is a Small/Large flip-flop within the dwell time suppressed, and let through once it has passed.
+    """
+    now = [0.0]
+    stabilizer = ActionStabilizer(min_dwell=1800, clock=lambda: now[0])
+
+    assert stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Small"})
+    now[0] = 10
+    assert not stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Large"})
+    now[0] = 20
+    assert not stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Large"})
+    now[0] = 1800
+    assert stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Large"})
+    now[0] = 1810
+    assert not stabilizer.allow("upf_sizing", {"target_pod": "upf", "values": "Small"})
@@ -0,0 +1,48 @@
+"""
+Test the reconstruction of past sizing trials from metrics history.
+"""
+
+import sys
+import os
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/utilities'])))
+from utilities import sizing_windows, prom_upf_history_queries
+
+
+def sizing_series(instance_type, start, end, step=300) -> dict:
+    return {
+        "metric": {"label_node_kubernetes_io_instance_type": instance_type},
+        "values": [[t, "1"] for t in range(start, end, step)],
+    }
+
+
+def test_sizing_windows():
+    """
+    This is a unit test.
+    It ensures that past windows are kept only when a single known size was active and observed throughout.
+    Expected behavior is the Large and Small windows kept, and the resize, unobserved and unknown type windows dropped.
+    """
+    hour = 3600
+    throughput = [{"metric": {}, "values": [[hour * k, str(1e6 * k)] for k in range(1, 7)]}]
+    sizing = [
+        # Large for the first hour and a half, then Small.
+        sizing_series("m4.large", 300, 5400 + 300),
+        sizing_series("t3.medium", 5400 + 300, 3 * hour + 300),
+        # Hour 4 unobserved; hour 5 on an unknown type; hour 6 Small again.
+        sizing_series("m4.xlarge", 4 * hour + 300, 5 * hour + 300),
+        sizing_series("t3.medium", 5 * hour + 300, 6 * hour + 300),
+    ]
+
+    windows = sizing_windows(throughput, sizing)
+    assert [(w["end"], w["size"], w["throughput"]) for w in windows] == [
+        (hour, "Large", 1e6),
+        (3 * hour, "Small", 3e6),
+        (6 * hour, "Small", 6e6),
+    ]
+    assert windows[0]["start"] == 0
+
+    throughput_query, sizing_query = prom_upf_history_queries("7d")
+    assert throughput_query.endswith("[7d:1h]")
+    assert "label_node_kubernetes_io_instance_type" in sizing_query
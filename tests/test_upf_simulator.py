@@ -0,0 +1,53 @@
+"""
+Test the trace-driven UPF simulator.
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+# # Set path for local imports
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname('/'.join(SCRIPT_DIR.split('/')[:-1]+['fonpr/simulation'])))
+from simulation import UpfSimulator, load_trace, trace_from_prometheus
+from utilities import CycleScheduler
+
+
+def test_upf_simulator_sizes_and_clock(tmp_path):
+    """
+    This is a unit test.
+    It ensures that the simulator serves a replayed trace according to the size model, in simulated time.
+    Expected behavior is Large serving the load, Small capped at its capacity, no service during a resize, and no real waiting.
+    """
+    trace = tmp_path / "trace.csv"
+    trace.write_text("time,throughput\n" + "".join(f"{1690000000 + 60 * i},1e8\n" for i in range(60)))
+    times, load = load_trace(trace)
+    assert len(times) == 60 and load[0] == 1e8
+
+    simulator = UpfSimulator(times, load, transition_time=360)
+    simulator.sleep(3600)
+    assert simulator.get_throughput(3600) == pytest.approx(1e8)
+    assert simulator.get_infra_cost() == pytest.approx(0.10)
+
+    simulator.set_size("Small")
+    scheduler = CycleScheduler(3600, clock=simulator.time, sleep=simulator.sleep)
+    scheduler.wait_for_tick()
+    assert scheduler.wait_for_tick() == 0
+    # Small caps at 5e7 bytes/s, and serves nothing for the first 6 minutes of the hour.
+    assert simulator.get_throughput(3600) == pytest.approx(5e7 * 0.9, rel=0.01)
+    assert simulator.get_throughput(600) == pytest.approx(5e7)
+    assert simulator.get_infra_cost() == pytest.approx(0.0416)
+
+    # The trace loops past its end.
+    simulator.sleep(86400)
+    assert simulator.get_throughput(600) == pytest.approx(5e7)
+
+    times, load = trace_from_prometheus(
+        [
+            {"metric": {"pod": "upf-a"}, "values": [[0, "1"], [60, "2"]]},
+            {"metric": {"pod": "upf-b"}, "values": [[0, "3"], [60, "4"]]},
+        ]
+    )
+    np.testing.assert_array_equal(times, [0, 60])
+    np.testing.assert_array_equal(load, [4, 6])